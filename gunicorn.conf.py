@@ -24,7 +24,10 @@ module = "src.app:app"
 callable = "app"
 
 # Socket
-sendfile = False  # Fix for non-blocking socket error
+# os.sendfile for file responses (api.media_responder). Off by default —
+# it raised non-blocking socket errors under older eventlet builds;
+# set GUNICORN_SENDFILE=1 once verified on the deployed stack.
+sendfile = os.environ.get("GUNICORN_SENDFILE", "0").lower() in ("1", "true", "yes")
 
 # Logging
 accesslog = "-"
@@ -13,9 +13,9 @@ import requests
 import numpy as np
 import librosa
 from PIL import Image, ImageDraw, ImageFont
-from pydub import AudioSegment
 
 from .celery_app import celery
+from .audio_loader import load_audio, audio_session
 
 
 def _get_app():
@@ -67,28 +67,23 @@ def _check_job_control(job):
 
 
 def _extract_audio_levels(audio_path, fps=12):
-    audio = AudioSegment.from_file(audio_path)
-    samples = np.array(audio.get_array_of_samples()).astype(np.float32)
-    if audio.channels > 1:
-        samples = samples.reshape((-1, audio.channels)).mean(axis=1)
-    max_val = np.max(np.abs(samples)) if len(samples) else 1.0
+    decoded = load_audio(str(audio_path))
+    samples, sr = decoded.get(mono=True)
+    max_val = float(np.max(np.abs(samples))) if len(samples) else 1.0
     if max_val == 0:
         max_val = 1.0
-    samples = samples / max_val
-    sr = audio.frame_rate
     chunk = max(1, int(sr / fps))
-    levels = []
-    for i in range(0, len(samples), chunk):
-        seg = samples[i:i+chunk]
-        if len(seg) == 0:
-            continue
-        rms = float(np.sqrt(np.mean(np.square(seg))))
-        levels.append(max(0.0, min(1.0, rms * 2.2)))
-    return levels, max(1, int(round(len(audio) / 1000.0)))
+    if not len(samples):
+        return [], max(1, int(round(decoded.duration)))
+    starts = np.arange(0, len(samples), chunk)
+    sq = np.add.reduceat(np.square(samples / max_val, dtype=np.float64), starts)
+    counts = np.diff(np.append(starts, len(samples)))
+    levels = np.clip(np.sqrt(sq / counts) * 2.2, 0.0, 1.0)
+    return [float(v) for v in levels], max(1, int(round(decoded.duration)))
 
 
 def _extract_visemes(audio_path, fps=12):
-    y, sr = librosa.load(audio_path, sr=None, mono=True)
+    y, sr = load_audio(str(audio_path)).get(mono=True)
     hop_length = max(128, int(sr / fps))
     rms = librosa.feature.rms(y=y, hop_length=hop_length)[0]
     centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=hop_length)[0]
@@ -246,8 +241,9 @@ def process_avatar_clip_job(self, job_id):
                 if audio_url:
                     audio_path = td / "audio.mp3"
                     _download_to(audio_url, audio_path)
-                    visemes = _extract_visemes(audio_path, fps=12)
-                    levels, _ = _extract_audio_levels(audio_path, fps=12)
+                    with audio_session():
+                        visemes = _extract_visemes(audio_path, fps=12)
+                        levels, _ = _extract_audio_levels(audio_path, fps=12)
 
                     frames_dir = td / "frames"
                     frames_dir.mkdir(parents=True, exist_ok=True)
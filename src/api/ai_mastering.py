@@ -14,19 +14,22 @@
 # Register: app.register_blueprint(ai_mastering_bp)
 # =====================================================
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
+import uuid
 import tempfile
 import traceback
 import requests
 import numpy as np
 import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
 
 # Audio processing
-import librosa
 import soundfile as sf
 from pedalboard import (
     Pedalboard, NoiseGate, Compressor, Limiter, Gain,
@@ -43,7 +46,10 @@ except Exception:
     print("⚠️ Matchering not installed — Phase 2 disabled. Run: pip install matchering")
 
 # Internal imports
-from api.models import db, Audio
+from api.models import db, Audio, MasteringJob
+from api.reference_fingerprint import master_to_reference, get_reference_fingerprint
+from api.loudness import LoudnessMeter, measure as measure_loudness
+from api.audio_loader import load_audio, remember as remember_audio
 try:
     from api.r2_storage_setup import uploadFile
 except Exception:
@@ -763,27 +769,120 @@ def build_mastering_chain(preset_key: str) -> Pedalboard:
     ])
 
 
+
+# =====================================================
+# PRESET BOARD POOL
+# =====================================================
+# Pre-built boards per preset, reused across tracks so bulk
+# jobs don't re-allocate eight plugins per file. Boards are
+# reset() on checkout (clears filter/compressor state) and
+# only one caller holds a given board at a time.
+# =====================================================
+
+BOARD_POOL_MAX_IDLE = int(os.environ.get("MASTERING_BOARD_POOL_MAX_IDLE", "4"))
+
+
+class BoardPool:
+    """Per-process pool of reset-able mastering boards keyed by preset."""
+
+    def __init__(self, max_idle_per_preset=BOARD_POOL_MAX_IDLE):
+        self.max_idle_per_preset = max_idle_per_preset
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, preset_key: str) -> Pedalboard:
+        with self._lock:
+            idle = self._idle.get(preset_key)
+            if idle:
+                board = idle.pop()
+                self.hits += 1
+            else:
+                board = None
+                self.misses += 1
+        if board is None:
+            return build_mastering_chain(preset_key)
+        board.reset()
+        return board
+
+    def release(self, preset_key: str, board: Pedalboard):
+        with self._lock:
+            idle = self._idle.setdefault(preset_key, [])
+            if len(idle) < self.max_idle_per_preset:
+                idle.append(board)
+
+    @contextmanager
+    def borrow(self, preset_key: str):
+        board = self.acquire(preset_key)
+        try:
+            yield board
+        finally:
+            self.release(preset_key, board)
+
+    def warm_up(self, preset_keys=None):
+        """Pre-build one board per preset (doesn't count as a miss)."""
+        for key in preset_keys or MASTERING_PRESETS.keys():
+            try:
+                board = build_mastering_chain(key)
+            except Exception as e:
+                print(f"⚠️ Board warm-up failed for '{key}': {e}")
+                continue
+            self.release(key, board)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "presets_cached": len(self._idle),
+                "idle_boards": sum(len(v) for v in self._idle.values()),
+                "max_idle_per_preset": self.max_idle_per_preset,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+board_pool = BoardPool()
+
+if os.environ.get("MASTERING_BOARD_POOL_WARMUP", "1") != "0":
+    board_pool.warm_up()
+
+
 def _ensure_2d_channels_first(audio_data: np.ndarray) -> np.ndarray:
     """
     Ensure audio is float32 and shaped (channels, samples).
-    librosa.load(mono=False) returns (channels, samples) already.
+    load_audio(...).get() returns (channels, samples) already.
     """
     if audio_data.ndim == 1:
         audio_data = audio_data.reshape(1, -1)
     return audio_data.astype(np.float32, copy=False)
 
 
-def process_audio_file(input_path: str, output_path: str, preset_key: str):
-    """Process an audio file through the mastering chain."""
-    audio_data, sample_rate = librosa.load(input_path, sr=None, mono=False)
+def process_audio_file(input_path: str, output_path: str, preset_key: str, streaming=None):
+    """
+    Process an audio file through the mastering chain.
+
+    Files longer than STREAMING_THRESHOLD_SECONDS (or streaming=True)
+    go through the block-based engine so memory stays bounded.
+    """
+    if streaming is None:
+        duration = _probe_duration(input_path)
+        streaming = bool(duration and duration > STREAMING_THRESHOLD_SECONDS)
+    if streaming:
+        return process_audio_file_streaming(input_path, output_path, preset_key)
+
+    audio_data, sample_rate = load_audio(input_path).get()
     audio_data = _ensure_2d_channels_first(audio_data)
 
     peak_before = float(np.max(np.abs(audio_data))) if audio_data.size else 0.0
     rms_before = float(np.sqrt(np.mean(audio_data ** 2))) if audio_data.size else 0.0
     duration = (audio_data.shape[1] / sample_rate) if sample_rate else 0.0
 
-    board = build_mastering_chain(preset_key)
-    mastered_audio = board(audio_data, sample_rate)
+    loudness_before = measure_loudness(audio_data, sample_rate)
+
+    with board_pool.borrow(preset_key) as board:
+        mastered_audio = board(audio_data, sample_rate)
 
     peak_after = float(np.max(np.abs(mastered_audio))) if mastered_audio.size else 0.0
     rms_after = float(np.sqrt(np.mean(mastered_audio ** 2))) if mastered_audio.size else 0.0
@@ -793,6 +892,8 @@ def process_audio_file(input_path: str, output_path: str, preset_key: str):
         mastered_audio = mastered_audio / peak_after * 0.99
         peak_after = 0.99
 
+    loudness_after = measure_loudness(mastered_audio, sample_rate)
+
     # soundfile expects (samples, channels)
     sf.write(output_path, mastered_audio.T, sample_rate, subtype='PCM_24')
 
@@ -809,11 +910,158 @@ def process_audio_file(input_path: str, output_path: str, preset_key: str):
         "rms_before": round(rms_before, 6),
         "rms_after": round(rms_after, 6),
         "loudness_increase_db": loudness_increase_db,
+        "lufs_before": loudness_before["integrated_lufs"],
+        "lufs_after": loudness_after["integrated_lufs"],
+        "true_peak_after_dbtp": loudness_after["true_peak_dbtp"],
         "method": "dsp",
         "preset": preset_key,
     }
 
 
+# =====================================================
+# STREAMING ENGINE (long files)
+# =====================================================
+# Reads STREAM_BLOCK_FRAMES at a time with soundfile, pushes
+# each block through one stateful board (reset=False keeps
+# filter/compressor state across blocks) and writes as it
+# goes. Peak/RMS are accumulated on the fly. Output is staged
+# as float so the safety normalization can still be applied
+# in a second streamed pass without ever holding the track.
+# =====================================================
+
+STREAM_BLOCK_FRAMES = int(os.environ.get("MASTERING_BLOCK_FRAMES", "65536"))
+STREAMING_THRESHOLD_SECONDS = float(os.environ.get("MASTERING_STREAMING_THRESHOLD_SECONDS", "300"))
+
+
+def _probe_duration(input_path: str):
+    """Duration in seconds from headers only (no decode). None if unknown."""
+    try:
+        return float(sf.info(input_path).duration)
+    except Exception:
+        pass
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "quiet", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", input_path],
+            capture_output=True, text=True, timeout=30
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return float(result.stdout.strip())
+    except Exception:
+        pass
+    return None
+
+
+def _streamable_source(input_path: str, temp_dir: str) -> str:
+    """
+    Path soundfile can read block-by-block. Formats libsndfile can't
+    open are transcoded by ffmpeg (which streams) to a float WAV.
+    """
+    try:
+        sf.info(input_path)
+        return input_path
+    except Exception:
+        pass
+
+    wav_path = os.path.join(temp_dir, "stream_source.wav")
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-v", "error", "-i", input_path, "-c:a", "pcm_f32le", wav_path],
+        capture_output=True, text=True, timeout=600
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not decode input for streaming: {result.stderr[:300]}")
+    return wav_path
+
+
+def process_audio_file_streaming(input_path: str, output_path: str, preset_key: str,
+                                 block_frames: int = STREAM_BLOCK_FRAMES):
+    """Block-based version of process_audio_file. Same stats dict."""
+    board = board_pool.acquire(preset_key)
+
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_path)))
+    staged_path = os.path.join(work_dir, "mastered_float.wav")
+
+    frames = 0
+    sum_sq_before = 0.0
+    sum_sq_after = 0.0
+    peak_before = 0.0
+    peak_after = 0.0
+
+    try:
+        source_path = _streamable_source(input_path, work_dir)
+
+        with sf.SoundFile(source_path) as fin:
+            sample_rate = fin.samplerate
+            channels = fin.channels
+
+            meter_before = LoudnessMeter(sample_rate, channels)
+            meter_after = LoudnessMeter(sample_rate, channels)
+
+            with sf.SoundFile(staged_path, 'w', sample_rate, channels, subtype='FLOAT') as fout:
+                for block in fin.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                    # soundfile gives (samples, channels); pedalboard wants (channels, samples)
+                    chunk = np.ascontiguousarray(block.T)
+                    if chunk.size:
+                        peak_before = max(peak_before, float(np.max(np.abs(chunk))))
+                        sum_sq_before += float(np.sum(np.square(chunk, dtype=np.float64)))
+                        meter_before.add(chunk)
+
+                    mastered = board.process(chunk, sample_rate, reset=False)
+                    if mastered.size:
+                        peak_after = max(peak_after, float(np.max(np.abs(mastered))))
+                        sum_sq_after += float(np.sum(np.square(mastered, dtype=np.float64)))
+                        meter_after.add(mastered)
+
+                    fout.write(mastered.T)
+                    frames += chunk.shape[1]
+
+        # Safety normalization (prevent clipping) — second streamed pass to 24-bit
+        scale = 1.0
+        if peak_after > 1.0:
+            scale = 0.99 / peak_after
+            peak_after = 0.99
+
+        with sf.SoundFile(staged_path) as fin, \
+                sf.SoundFile(output_path, 'w', sample_rate, channels, subtype='PCM_24') as fout:
+            for block in fin.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                fout.write(block * scale if scale != 1.0 else block)
+
+    finally:
+        board_pool.release(preset_key, board)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # The safety scale is a pure gain, so it shifts loudness and true peak by the same dB
+    scale_db = float(20 * np.log10(scale))
+    loudness_before = meter_before.result()
+    loudness_after = meter_after.result()
+
+    count = frames * channels
+    rms_before = float(np.sqrt(sum_sq_before / count)) if count else 0.0
+    rms_after = float(np.sqrt(sum_sq_after / count)) if count else 0.0
+    duration = (frames / sample_rate) if sample_rate else 0.0
+
+    loudness_increase_db = 0.0
+    if rms_before > 1e-10 and rms_after > 1e-10:
+        loudness_increase_db = round(20 * np.log10(rms_after / rms_before), 2)
+
+    return {
+        "duration_seconds": round(duration, 2),
+        "sample_rate": int(sample_rate),
+        "channels": int(channels),
+        "peak_before": round(peak_before, 4),
+        "peak_after": round(peak_after, 4),
+        "rms_before": round(rms_before, 6),
+        "rms_after": round(rms_after, 6),
+        "loudness_increase_db": loudness_increase_db,
+        "lufs_before": loudness_before["integrated_lufs"],
+        "lufs_after": round(loudness_after["integrated_lufs"] + scale_db, 2),
+        "true_peak_after_dbtp": round(loudness_after["true_peak_dbtp"] + scale_db, 2),
+        "method": "dsp",
+        "preset": preset_key,
+        "streaming": True,
+    }
+
+
 def download_audio_from_url(url: str, output_path: str):
     """Download an audio file from a URL (e.g., Cloudinary/R2) to a local path."""
     response = requests.get(url, stream=True, timeout=120)
@@ -836,18 +1084,30 @@ def ensure_wav_format(input_path: str, temp_dir: str) -> str:
         return input_path
 
     wav_path = os.path.join(temp_dir, "converted_input.wav")
-    audio_data, sr = librosa.load(input_path, sr=None, mono=False)
-    audio_data = _ensure_2d_channels_first(audio_data)
-    sf.write(wav_path, audio_data.T, sr, subtype='PCM_24')
+    decoded = load_audio(input_path)
+    # Float WAV holds the decoded samples exactly, so later stages can
+    # reuse this decode for wav_path instead of reading it back
+    sf.write(wav_path, decoded.data.T, decoded.sample_rate, subtype='FLOAT')
+    remember_audio(wav_path, decoded)
     return wav_path
 
 
 def process_with_matchering(input_path: str, reference_path: str, output_path: str):
-    """Process audio using Matchering's adaptive algorithm."""
+    """
+    Adaptive reference matching. The reference is analyzed once into a
+    cached fingerprint (see reference_fingerprint.py) so repeat masters
+    only analyze the target; Matchering's full pipeline is the fallback.
+    """
+    stats = master_to_reference(input_path, reference_path, output_path)
+    if stats is not None:
+        stats["method"] = "reference_fingerprint"
+        stats["engine"] = "reference_fingerprint"
+        return stats
+
     if not MATCHERING_AVAILABLE:
         raise RuntimeError("Matchering is not installed. Run: pip install matchering")
 
-    audio_before, sr = librosa.load(input_path, sr=None, mono=False)
+    audio_before, sr = load_audio(input_path).get()
     audio_before = _ensure_2d_channels_first(audio_before)
 
     peak_before = float(np.max(np.abs(audio_before))) if audio_before.size else 0.0
@@ -865,7 +1125,7 @@ def process_with_matchering(input_path: str, reference_path: str, output_path: s
         results=[mg.pcm24(output_path)]
     )
 
-    audio_after, sr_after = librosa.load(output_path, sr=None, mono=False)
+    audio_after, sr_after = load_audio(output_path).get()
     audio_after = _ensure_2d_channels_first(audio_after)
 
     peak_after = float(np.max(np.abs(audio_after))) if audio_after.size else 0.0
@@ -885,6 +1145,7 @@ def process_with_matchering(input_path: str, reference_path: str, output_path: s
         "rms_after": round(rms_after, 6),
         "loudness_increase_db": loudness_increase_db,
         "method": "matchering",
+        "engine": "matchering",
     }
 
 
@@ -1255,6 +1516,7 @@ def get_mastering_capabilities():
         "total_references": len(REFERENCE_PROFILES),
         "references_with_files": sum(1 for k in REFERENCE_PROFILES if is_reference_available(k)),
         "reference_profiles": available_references,
+        "board_pool": board_pool.stats(),
     }), 200
 
 
@@ -1523,11 +1785,19 @@ def upload_reference_track():
         else:
             shutil.copy2(temp_path, filepath)
 
+        # Analyze once now so the first master against it only pays for the target
+        fingerprint = None
+        try:
+            fingerprint, _ = get_reference_fingerprint(filepath)
+        except Exception as e:
+            print(f"⚠️ Reference fingerprint failed: {e}")
+
         return jsonify({
             "message": f"✅ Reference track uploaded for {REFERENCE_PROFILES[profile_key]['name']}",
             "profile": profile_key,
             "filename": filename,
             "path": filepath,
+            "fingerprint_ready": fingerprint is not None,
         }), 200
 
     except Exception as e:
@@ -1541,6 +1811,284 @@ def upload_reference_track():
                 pass
 
 
+# =====================================================
+# BATCH MASTERING (albums / EPs)
+# =====================================================
+# Downloads and R2 uploads run on the shared I/O threads,
+# DSP runs on the shared process pool (one core per track).
+# A single coordinator owns every DB write and pushes
+# per-track progress to the "user_<id>" Socket.IO room as
+# "mastering_batch_update".
+# =====================================================
+
+MASTERING_BATCH_MAX_TRACKS = int(os.environ.get("MASTERING_BATCH_MAX_TRACKS", "50"))
+
+
+def master_file_job(input_path: str, output_path: str, plan: dict):
+    """
+    Process-pool entry point: master one local file according to a
+    plan dict ({"preset"} or {"reference", "mode", "polish_preset"}).
+    Returns (stats, actual_method).
+    """
+    reference_key = plan.get("reference")
+    if not reference_key:
+        return process_audio_file(input_path, output_path, plan["preset"]), "dsp"
+
+    temp_dir = os.path.dirname(output_path)
+    wav_input_path = ensure_wav_format(input_path, temp_dir)
+    reference_path = get_reference_path(reference_key)
+    polish_preset = plan.get("polish_preset") or REFERENCE_PROFILES[reference_key]["fallback_preset"]
+    mode = plan.get("mode", "hybrid")
+
+    if mode == "adaptive" and reference_path and MATCHERING_AVAILABLE:
+        return process_with_matchering(wav_input_path, reference_path, output_path), mode
+    if mode == "hybrid" and reference_path and MATCHERING_AVAILABLE:
+        return process_hybrid(wav_input_path, reference_path, output_path, polish_preset), mode
+    return process_audio_file(wav_input_path, output_path, polish_preset), "dsp_fallback"
+
+
+def _upload_mastered(output_path: str, filename: str):
+    with open(output_path, 'rb') as f:
+        return uploadFile(f, filename)
+
+
+def _emit_batch_event(app, user_id, payload):
+    try:
+        socketio = getattr(app, "socketio", None)
+        if socketio:
+            socketio.emit("mastering_batch_update", payload, room=f"user_{user_id}")
+    except Exception as e:
+        print(f"socket emit failed: {e}")
+
+
+def _batch_summary(jobs):
+    done = sum(1 for j in jobs if j.status == "completed")
+    failed = sum(1 for j in jobs if j.status == "error")
+    return {
+        "total": len(jobs),
+        "completed": done,
+        "failed": failed,
+        "finished": done + failed == len(jobs),
+    }
+
+
+def _run_mastering_batch(app, batch_id, user_id, plan):
+    """Coordinator: download → master → upload, all tracks overlapped."""
+    from concurrent.futures import wait, FIRST_COMPLETED
+    from api.audio_workers import submit_cpu, submit_io
+
+    with app.app_context():
+        jobs = MasteringJob.query.filter_by(batch_id=batch_id).order_by(MasteringJob.id).all()
+        job_by_id = {j.id: j for j in jobs}
+        temp_dir = tempfile.mkdtemp(prefix=f"master_batch_{batch_id[:8]}_")
+        label = plan.get("reference") or plan.get("preset")
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        pending = {}
+
+        def update(job, status, **extra):
+            job.status = status
+            for key, value in extra.items():
+                setattr(job, key, value)
+            db.session.commit()
+            _emit_batch_event(app, user_id, {
+                "batch_id": batch_id,
+                "job": job.serialize(),
+                "summary": _batch_summary(jobs),
+            })
+
+        def fail(job, error):
+            print(f"❌ Batch {batch_id} track {job.audio_id} failed: {error}")
+            audio = Audio.query.get(job.audio_id) if job.audio_id else None
+            if audio is not None:
+                audio.processing_status = 'error'
+            update(job, "error", error_message=str(error)[:1000])
+
+        try:
+            for job in jobs:
+                track_dir = os.path.join(temp_dir, str(job.id))
+                os.makedirs(track_dir, exist_ok=True)
+                url_path = (job.original_url or "").split('?')[0]
+                input_ext = os.path.splitext(url_path)[1] or '.wav'
+                input_path = os.path.join(track_dir, f"input{input_ext}")
+                output_path = os.path.join(track_dir, "mastered_output.wav")
+
+                future = submit_io(download_audio_from_url, job.original_url, input_path)
+                pending[future] = ("download", job.id, input_path, output_path)
+                update(job, "downloading")
+
+            while pending:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, job_id, input_path, output_path = pending.pop(future)
+                    job = job_by_id[job_id]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        fail(job, e)
+                        continue
+
+                    if stage == "download":
+                        nxt = submit_cpu(master_file_job, input_path, output_path, plan)
+                        pending[nxt] = ("master", job_id, input_path, output_path)
+                        update(job, "processing")
+
+                    elif stage == "master":
+                        stats, method = result
+                        job.analysis = {"stats": stats, "method": method}
+                        filename = f"mastered_{label}_{method}_{job.audio_id}_{stamp}.wav"
+                        nxt = submit_io(_upload_mastered, output_path, filename)
+                        pending[nxt] = ("upload", job_id, input_path, output_path)
+                        update(job, "uploading")
+
+                    else:
+                        audio = Audio.query.get(job.audio_id) if job.audio_id else None
+                        if audio is not None:
+                            audio.processed_file_url = result
+                            audio.processing_status = 'mastered'
+                            audio.last_processed_at = datetime.utcnow()
+                        update(job, "completed", mastered_url=result)
+                        shutil.rmtree(os.path.dirname(output_path), ignore_errors=True)
+
+        except Exception as e:
+            print(f"❌ Batch mastering coordinator error: {e}")
+            traceback.print_exc()
+            db.session.rollback()
+            for job in jobs:
+                if job.status not in ("completed", "error"):
+                    fail(job, e)
+
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            print(f"✅ Batch {batch_id} finished: {_batch_summary(jobs)}")
+            db.session.remove()
+
+
+@ai_mastering_bp.route('/api/ai/mastering/batch', methods=['POST'])
+@jwt_required()
+def batch_master_tracks():
+    """
+    Master many tracks at once.
+
+    JSON body:
+      { "audio_ids": [1, 2, 3], "preset": "radio_ready" }
+      or { "audio_ids": [...], "reference": "pop", "mode": "hybrid", "polish_preset": null }
+
+    Returns 202 with a batch_id; progress is pushed over Socket.IO
+    and available from GET /api/ai/mastering/batch/<batch_id>.
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        audio_ids = data.get('audio_ids') or []
+        if not isinstance(audio_ids, list) or not audio_ids:
+            return jsonify({"error": "audio_ids must be a non-empty list"}), 400
+        try:
+            audio_ids = list(dict.fromkeys(int(aid) for aid in audio_ids))
+        except (TypeError, ValueError):
+            return jsonify({"error": "audio_ids must be integers"}), 400
+        if len(audio_ids) > MASTERING_BATCH_MAX_TRACKS:
+            return jsonify({"error": f"A batch can contain at most {MASTERING_BATCH_MAX_TRACKS} tracks"}), 400
+
+        reference_key = data.get('reference')
+        preset_key = data.get('preset', 'radio_ready')
+        if reference_key:
+            if reference_key not in REFERENCE_PROFILES:
+                return jsonify({
+                    "error": f"Unknown reference: {reference_key}",
+                    "available_references": list(REFERENCE_PROFILES.keys())
+                }), 400
+            polish_preset = data.get('polish_preset') or REFERENCE_PROFILES[reference_key]["fallback_preset"]
+            if polish_preset not in MASTERING_PRESETS:
+                return jsonify({"error": f"Unknown preset: {polish_preset}"}), 400
+            plan = {
+                "reference": reference_key,
+                "mode": data.get('mode', 'hybrid'),
+                "polish_preset": polish_preset,
+            }
+            preset_used = polish_preset
+        else:
+            if preset_key not in MASTERING_PRESETS:
+                return jsonify({
+                    "error": f"Unknown preset: {preset_key}",
+                    "available_presets": list(MASTERING_PRESETS.keys())
+                }), 400
+            plan = {"preset": preset_key}
+            preset_used = preset_key
+
+        audios = Audio.query.filter(Audio.id.in_(audio_ids)).all()
+        by_id = {a.id: a for a in audios}
+        missing = [aid for aid in audio_ids if aid not in by_id]
+        if missing:
+            return jsonify({"error": "Track not found", "audio_ids": missing}), 404
+        if any(str(a.user_id) != str(user_id) for a in audios):
+            return jsonify({"error": "Unauthorized — you can only master your own tracks"}), 403
+        no_url = [a.id for a in audios if not a.file_url]
+        if no_url:
+            return jsonify({"error": "No audio file URL found for some tracks", "audio_ids": no_url}), 400
+
+        batch_id = uuid.uuid4().hex
+        jobs = []
+        for aid in audio_ids:
+            audio = by_id[aid]
+            audio.processing_status = 'processing'
+            job = MasteringJob(
+                user_id=user_id,
+                audio_id=audio.id,
+                preset_used=preset_used,
+                reference_profile=reference_key,
+                original_url=audio.file_url,
+                status="queued",
+                batch_id=batch_id,
+            )
+            db.session.add(job)
+            jobs.append(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        socketio = getattr(app, "socketio", None)
+        if socketio:
+            socketio.start_background_task(_run_mastering_batch, app, batch_id, user_id, plan)
+        else:
+            threading.Thread(target=_run_mastering_batch, args=(app, batch_id, user_id, plan),
+                             daemon=True).start()
+
+        return jsonify({
+            "message": f"🎚️ Mastering {len(jobs)} tracks",
+            "batch_id": batch_id,
+            "plan": plan,
+            "jobs": [j.serialize() for j in jobs],
+            "summary": _batch_summary(jobs),
+        }), 202
+
+    except Exception as e:
+        print(f"❌ Batch mastering error: {str(e)}")
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({"error": f"Batch mastering failed: {str(e)}"}), 500
+
+
+@ai_mastering_bp.route('/api/ai/mastering/batch/<batch_id>', methods=['GET'])
+@jwt_required()
+def get_batch_mastering_status(batch_id):
+    """Per-track status for a mastering batch."""
+    user_id = get_jwt_identity()
+    jobs = MasteringJob.query.filter_by(batch_id=batch_id).order_by(MasteringJob.id).all()
+    if not jobs:
+        return jsonify({"error": "Batch not found"}), 404
+    if str(jobs[0].user_id) != str(user_id):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    return jsonify({
+        "batch_id": batch_id,
+        "jobs": [j.serialize() for j in jobs],
+        "summary": _batch_summary(jobs),
+    }), 200
+
+
 # =============================================================================
 # EXPORT ALIAS — ai_mastering_phase3.py imports this name
 # =============================================================================
@@ -28,6 +28,11 @@ import soundfile as sf
 
 # Internal imports
 from api.models import db, Audio, User
+from api.audio_features import extract_features
+from api.loudness import measure as measure_loudness
+from api.audio_loader import load_audio
+from api.analysis_cache import cached_analysis, lookup_by_source
+from api.reference_fingerprint import master_to_reference
 try:
     from api.r2_storage_setup import uploadFile
 except ImportError:
@@ -44,6 +49,11 @@ ai_mastering_phase3_bp = Blueprint('ai_mastering_phase3', __name__)
 # All free libraries, no API keys needed.
 # =====================================================
 
+# Bump when analyze_track output changes — invalidates cached analyses
+ANALYZER_NAME = "mastering_phase3"
+ANALYZER_VERSION = "3"
+
+
 def analyze_track(file_path):
     """
     Deep analysis of an audio track.
@@ -65,16 +75,19 @@ def analyze_track(file_path):
     - genre_hints: suggested genres based on audio features
     """
     try:
-        # Load audio
-        y, sr = librosa.load(file_path, sr=44100, mono=True)
-        duration = librosa.get_duration(y=y, sr=sr)
-        
+        # Load audio — channels-first for the loudness meter, mono downmix for librosa features
+        y_channels, sr = load_audio(file_path).get(sr=44100)
+        y = y_channels if y_channels.ndim == 1 else np.mean(y_channels, axis=0, dtype=np.float32)
+
+        # One STFT + one CQT → every feature below
+        features = extract_features(y, sr)
+        duration = features["duration"]
+
         # ===== BPM / TEMPO =====
-        tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sr)
-        bpm = float(tempo[0]) if hasattr(tempo, '__len__') else float(tempo)
-        
+        bpm = features["bpm"]
+
         # ===== KEY DETECTION =====
-        chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
+        chroma = features["chroma"]
         key_index = int(np.argmax(np.mean(chroma, axis=1)))
         key_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
         key = key_names[key_index]
@@ -92,47 +105,35 @@ def analyze_track(file_path):
         key_full = f"{key} {scale}"
         
         # ===== LOUDNESS =====
-        rms = librosa.feature.rms(y=y)[0]
+        rms = features["rms"]
         rms_mean = float(np.mean(rms))
         rms_max = float(np.max(rms))
-        peak = float(np.max(np.abs(y)))
+        peak = features["peak"]
         
-        # Estimate LUFS (simplified)
-        lufs_estimate = 20 * np.log10(rms_mean + 1e-10) - 0.691
+        # BS.1770 K-weighted, gated integrated loudness + true peak, summed
+        # over the real channels (a mono downmix reads ~3 LU low on stereo)
+        loudness = measure_loudness(y_channels, sr)
+        lufs_estimate = loudness["integrated_lufs"]
         
         # Dynamic range
         rms_db = 20 * np.log10(rms + 1e-10)
         dynamic_range = float(np.percentile(rms_db, 95) - np.percentile(rms_db, 5))
         
         # ===== SPECTRAL FEATURES =====
-        spectral_centroid = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
-        spectral_rolloff = float(np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=0.85)))
-        spectral_bandwidth = float(np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)))
-        zero_crossing = float(np.mean(librosa.feature.zero_crossing_rate(y=y)))
+        spectral_centroid = features["spectral_centroid"]
+        spectral_rolloff = features["spectral_rolloff"]
+        spectral_bandwidth = features["spectral_bandwidth"]
+        zero_crossing = features["zero_crossing_rate"]
         
         # ===== FREQUENCY BAND ENERGY =====
-        S = np.abs(librosa.stft(y))
-        freqs = librosa.fft_frequencies(sr=sr)
-        
-        # Bass: 20-250Hz
-        bass_mask = (freqs >= 20) & (freqs < 250)
-        bass_energy = float(np.mean(S[bass_mask, :])) if np.any(bass_mask) else 0
-        
-        # Mids: 250-4000Hz
-        mid_mask = (freqs >= 250) & (freqs < 4000)
-        mid_energy = float(np.mean(S[mid_mask, :])) if np.any(mid_mask) else 0
-        
-        # Highs: 4000-20000Hz
-        high_mask = (freqs >= 4000) & (freqs <= 20000)
-        high_energy = float(np.mean(S[high_mask, :])) if np.any(high_mask) else 0
-        
-        # Sub-bass: 20-60Hz
-        sub_mask = (freqs >= 20) & (freqs < 60)
-        sub_energy = float(np.mean(S[sub_mask, :])) if np.any(sub_mask) else 0
-        
-        # Presence: 1000-5000Hz (vocal range)
-        presence_mask = (freqs >= 1000) & (freqs < 5000)
-        presence_energy = float(np.mean(S[presence_mask, :])) if np.any(presence_mask) else 0
+        # Bass 20-250Hz, Mids 250-4kHz, Highs 4-20kHz,
+        # Sub-bass 20-60Hz, Presence 1-5kHz (vocal range)
+        bands = features["bands"]
+        bass_energy = bands["bass"]
+        mid_energy = bands["mid"]
+        high_energy = bands["high"]
+        sub_energy = bands["sub"]
+        presence_energy = bands["presence"]
         
         # Normalize energies
         total_energy = bass_energy + mid_energy + high_energy + 1e-10
@@ -161,6 +162,8 @@ def analyze_track(file_path):
             
             # Loudness
             "loudness_lufs": round(lufs_estimate, 1),
+            "loudness_range_lu": loudness["loudness_range_lu"],
+            "true_peak_dbtp": loudness["true_peak_dbtp"],
             "rms_level": round(rms_mean, 4),
             "peak": round(peak, 4),
             "dynamic_range_db": round(dynamic_range, 1),
@@ -542,8 +545,15 @@ def master_with_reference(target_path, reference_path, output_path):
     
     Then applies those characteristics to the target track.
     
+    The reference side is fingerprinted once and cached (see
+    reference_fingerprint.py); Matchering is the fallback.
+
     Returns: output_path on success, None on failure.
     """
+    if master_to_reference(target_path, reference_path, output_path) is not None:
+        print(f"✅ Reference mastering complete: {output_path}")
+        return output_path
+
     try:
         import matchering as mg
         
@@ -1098,6 +1108,9 @@ def api_analyze_track():
     """
     user_id = get_jwt_identity()
     temp_path = None
+    analysis = None
+    audio_id = None
+    source_url = None
 
     try:
         # Get audio file
@@ -1110,19 +1123,29 @@ def api_analyze_track():
             audio = Audio.query.get(request.json['audio_id'])
             if not audio:
                 return jsonify({"error": "Audio not found"}), 404
-            # Download from Cloudinary
-            import requests as req
-            temp_dir = tempfile.mkdtemp()
-            temp_path = os.path.join(temp_dir, "analyze_track.wav")
-            r = req.get(audio.file_url, stream=True, timeout=60)
-            with open(temp_path, 'wb') as f:
-                for chunk in r.iter_content(8192):
-                    f.write(chunk)
+            audio_id = audio.id
+            source_url = audio.file_url
+
+            # Already analyzed this exact upload? Skip the download entirely.
+            analysis = lookup_by_source(ANALYZER_NAME, ANALYZER_VERSION,
+                                        audio_id=audio_id, source_url=source_url)
+            if analysis is None:
+                # Download from Cloudinary
+                import requests as req
+                temp_dir = tempfile.mkdtemp()
+                temp_path = os.path.join(temp_dir, "analyze_track.wav")
+                r = req.get(audio.file_url, stream=True, timeout=60)
+                with open(temp_path, 'wb') as f:
+                    for chunk in r.iter_content(8192):
+                        f.write(chunk)
         else:
             return jsonify({"error": "Provide audio_file or audio_id"}), 400
 
-        # Analyze
-        analysis = analyze_track(temp_path)
+        # Analyze (content-addressed: identical bytes are never re-analyzed)
+        if analysis is None:
+            analysis, _, _ = cached_analysis(ANALYZER_NAME, ANALYZER_VERSION, temp_path,
+                                             analyze_track, audio_id=audio_id,
+                                             source_url=source_url)
         if not analysis:
             return jsonify({"error": "Analysis failed"}), 500
 
@@ -1176,8 +1199,8 @@ def api_smart_master():
         temp_path = os.path.join(temp_dir, audio_file.filename)
         audio_file.save(temp_path)
 
-        # Step 1: Analyze
-        analysis = analyze_track(temp_path)
+        # Step 1: Analyze (cached by content — re-masters with another preset skip this)
+        analysis, _, _ = cached_analysis(ANALYZER_NAME, ANALYZER_VERSION, temp_path, analyze_track)
 
         # Step 2: Select preset
         if preset_override:
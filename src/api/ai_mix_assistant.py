@@ -16,17 +16,41 @@
 #   pip install librosa numpy scipy soundfile
 # =============================================================================
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+from concurrent.futures import wait, FIRST_COMPLETED
 import os
 import json
+import hashlib
 import tempfile
+import threading
 import traceback
+import uuid
 import numpy as np
 
+from api.analysis_cache import (cached_analysis, lookup_by_source, get_cached_analysis,
+                                store_analysis, remember_source, hash_file)
+from api.loudness import measure as measure_loudness
+from api.audio_loader import load_audio
+from api.audio_workers import submit_cpu, submit_io, cpu_workers
+from api.cache import cache
+
 ai_mix_assistant_bp = Blueprint('ai_mix_assistant', __name__)
 
+# Bump when analyze_single_track output changes — invalidates cached analyses
+MIX_ANALYZER_NAME = "mix_assistant_track"
+MIX_ANALYZER_VERSION = "4"
+
+# Tracks analyzed at once per request (defaults to one per CPU worker)
+MIX_ASSISTANT_MAX_WORKERS = int(os.environ.get("MIX_ASSISTANT_MAX_WORKERS", "0")) or cpu_workers()
+# Upper bound on client-supplied track indices
+MAX_MIX_TRACKS = 256
+MIX_DOWNLOAD_CONCURRENCY = int(os.environ.get("MIX_DOWNLOAD_CONCURRENCY", "8"))
+_DOWNLOAD_CHUNK = 1024 * 1024
+# How long a mix session remembers its tracks between re-runs
+MIX_SESSION_TTL = int(os.environ.get("MIX_SESSION_TTL", str(6 * 3600)))
+
 
 # =============================================================================
 # GENRE MIX PROFILES — target frequency balances
@@ -88,6 +112,18 @@ GENRE_PROFILES = {
 # TRACK ANALYZER — Per-track spectral + dynamic analysis
 # =============================================================================
 
+# Band energy (sub, bass, low-mid, mid, upper-mid, presence, brilliance)
+MIX_BANDS = {
+    "sub":        (20, 60),
+    "bass":       (60, 250),
+    "low_mid":    (250, 500),
+    "mid":        (500, 2000),
+    "upper_mid":  (2000, 4000),
+    "presence":   (4000, 8000),
+    "brilliance": (8000, 16000),
+}
+ENVELOPE_SECONDS = 1.0  # time resolution of band_envelope (conflict sections)
+
 def analyze_single_track(file_path, sr=22050):
     """
     Deep analysis of a single audio track.
@@ -97,8 +133,8 @@ def analyze_single_track(file_path, sr=22050):
     import soundfile as sf
 
     try:
-        y, sr = librosa.load(file_path, sr=sr, mono=True)
-        duration = librosa.get_duration(y=y, sr=sr)
+        y, sr = load_audio(file_path).get(sr=sr, mono=True)
+        duration = len(y) / sr
 
         if len(y) < sr:  # Less than 1 second
             return {"error": "Track too short", "duration": duration}
@@ -112,33 +148,36 @@ def analyze_single_track(file_path, sr=22050):
         # Dynamic range (difference between peak and RMS)
         dynamic_range_db = peak_db - rms_db
 
+        # BS.1770 loudness — what level balancing is based on
+        loudness = measure_loudness(y, sr)
+
         # ── Frequency Analysis ──
         S = np.abs(librosa.stft(y, n_fft=2048, hop_length=512))
         freqs = librosa.fft_frequencies(sr=sr, n_fft=2048)
         mag_avg = np.mean(S, axis=1)
 
-        # Band energy (sub, bass, low-mid, mid, upper-mid, presence, brilliance)
-        bands = {
-            "sub":        (20, 60),
-            "bass":       (60, 250),
-            "low_mid":    (250, 500),
-            "mid":        (500, 2000),
-            "upper_mid":  (2000, 4000),
-            "presence":   (4000, 8000),
-            "brilliance": (8000, 16000),
-        }
+        # (bands × bins) mask matrix: band sums for every frame in one product
+        band_masks = np.array([(freqs >= lo) & (freqs < hi) for lo, hi in MIX_BANDS.values()],
+                              dtype=np.float32)
+        band_totals = band_masks @ (mag_avg ** 2)
 
         band_energy = {}
         total_energy = np.sum(mag_avg ** 2)
-        for band_name, (lo, hi) in bands.items():
-            mask = (freqs >= lo) & (freqs < hi)
-            band_e = np.sum(mag_avg[mask] ** 2)
+        for band_name, band_e in zip(MIX_BANDS, band_totals):
             band_energy[band_name] = {
                 "energy": float(band_e),
                 "percentage": round(float(band_e / max(total_energy, 1e-10)) * 100, 1),
                 "db": round(float(10 * np.log10(max(band_e, 1e-10))), 1),
             }
 
+        # Band energy per ENVELOPE_SECONDS block (dB) — time-resolved conflicts
+        frame_energy = band_masks @ (S ** 2)
+        per_block = max(1, int(round(ENVELOPE_SECONDS * sr / 512)))
+        starts = np.arange(0, frame_energy.shape[1], per_block)
+        counts = np.diff(np.append(starts, frame_energy.shape[1]))
+        blocks = np.add.reduceat(frame_energy, starts, axis=1) / counts
+        band_envelope = np.round(10 * np.log10(np.maximum(blocks, 1e-10)), 1).tolist()
+
         # ── Dominant frequency ──
         dominant_idx = np.argmax(mag_avg)
         dominant_freq = float(freqs[dominant_idx])
@@ -177,19 +216,23 @@ def analyze_single_track(file_path, sr=22050):
 
         return {
             "duration": round(duration, 2),
-            "rms_db": round(rms_db, 1),
-            "peak_db": round(peak_db, 1),
-            "dynamic_range_db": round(dynamic_range_db, 1),
+            "rms_db": round(float(rms_db), 1),
+            "lufs": round(loudness["integrated_lufs"], 1),
+            "true_peak_db": round(loudness["true_peak_dbtp"], 1),
+            "peak_db": round(float(peak_db), 1),
+            "dynamic_range_db": round(float(dynamic_range_db), 1),
             "dominant_freq": round(dominant_freq, 1),
             "spectral_centroid": round(avg_centroid, 1),
             "spectral_rolloff": round(avg_rolloff, 1),
             "zcr": round(avg_zcr, 4),
             "track_type": track_type,
-            "is_clipping": is_clipping,
+            "is_clipping": bool(is_clipping),
             "band_energy": band_energy,
             "bass_pct": round(bass_pct, 1),
             "mid_pct": round(mid_pct, 1),
             "high_pct": round(high_pct, 1),
+            "band_envelope": band_envelope,
+            "envelope_seconds": per_block * 512 / sr,
         }
 
     except Exception as e:
@@ -202,30 +245,38 @@ def analyze_single_track(file_path, sr=22050):
 # MIX SUGGESTION ENGINE — Generates actionable recommendations
 # =============================================================================
 
+def _public_analysis(analysis):
+    """Analysis without the per-block envelope (internal to conflict detection)."""
+    return {k: v for k, v in analysis.items() if k != "band_envelope"}
+
+
 def generate_mix_suggestions(track_analyses, genre="pop"):
     """
-    Takes array of per-track analyses and generates mix suggestions.
+    Takes per-track analyses (a list, or a dict keyed by track index)
+    and generates mix suggestions.
     Returns suggestions for volume, pan, EQ, compression per track,
     plus cross-track conflict warnings and overall mix health.
     """
     profile = GENRE_PROFILES.get(genre, GENRE_PROFILES["pop"])
     suggestions = []
     conflicts = []
-    valid_tracks = [(i, a) for i, a in enumerate(track_analyses) if "error" not in a]
+    items = sorted(track_analyses.items()) if isinstance(track_analyses, dict) else enumerate(track_analyses)
+    valid_tracks = [(i, a) for i, a in items if "error" not in a]
 
     if not valid_tracks:
         return {"suggestions": [], "conflicts": [], "health_score": 0, "summary": "No valid tracks to analyze"}
 
     # ── Step 1: Volume balancing ──
-    # Find average RMS across all tracks, suggest levels relative to that
-    rms_values = [a["rms_db"] for _, a in valid_tracks]
+    # Find average loudness (LUFS, RMS for older cached analyses)
+    # across all tracks, suggest levels relative to that
+    rms_values = [a.get("lufs", a["rms_db"]) for _, a in valid_tracks]
     avg_rms = np.mean(rms_values)
     target_rms = -18.0  # Industry standard mix target
 
     for i, analysis in valid_tracks:
         s = {
             "track_index": i,
-            "analysis": analysis,
+            "analysis": _public_analysis(analysis),
             "volume": {},
             "pan": {},
             "eq": [],
@@ -234,7 +285,7 @@ def generate_mix_suggestions(track_analyses, genre="pop"):
         }
 
         # ── Volume suggestion ──
-        rms_diff = analysis["rms_db"] - avg_rms
+        rms_diff = analysis.get("lufs", analysis["rms_db"]) - avg_rms
         if abs(rms_diff) > 3:
             direction = "down" if rms_diff > 0 else "up"
             suggested_volume = max(0, min(1, 0.8 + (-rms_diff / 40)))
@@ -408,41 +459,7 @@ def generate_mix_suggestions(track_analyses, genre="pop"):
         suggestions.append(s)
 
     # ── Step 2: Cross-track frequency conflicts ──
-    for i in range(len(valid_tracks)):
-        for j in range(i + 1, len(valid_tracks)):
-            idx_i, a_i = valid_tracks[i]
-            idx_j, a_j = valid_tracks[j]
-
-            # Check for bass conflict
-            if a_i["bass_pct"] > 30 and a_j["bass_pct"] > 30:
-                conflicts.append({
-                    "tracks": [idx_i, idx_j],
-                    "band": "bass",
-                    "message": f"Track {idx_i+1} and Track {idx_j+1} both have heavy bass — EQ one to avoid muddiness",
-                    "suggestion": f"High-pass Track {idx_j+1} at 100Hz or sidechain compress",
-                    "priority": "high",
-                })
-
-            # Check for midrange masking
-            if (a_i["track_type"] == "midrange" and a_j["track_type"] == "midrange"
-                    and abs(a_i["spectral_centroid"] - a_j["spectral_centroid"]) < 400):
-                conflicts.append({
-                    "tracks": [idx_i, idx_j],
-                    "band": "midrange",
-                    "message": f"Track {idx_i+1} and Track {idx_j+1} are masking each other in the mids",
-                    "suggestion": "Pan apart or EQ complementary cuts (boost one at 1kHz, cut the other)",
-                    "priority": "medium",
-                })
-
-            # Check for brightness clash
-            if a_i["track_type"] == "bright" and a_j["track_type"] == "bright":
-                conflicts.append({
-                    "tracks": [idx_i, idx_j],
-                    "band": "highs",
-                    "message": f"Track {idx_i+1} and Track {idx_j+1} are both bright — may sound harsh together",
-                    "suggestion": "Pan to opposite sides or cut one at 6-8kHz",
-                    "priority": "medium",
-                })
+    conflicts, masking = find_conflicts(valid_tracks)
 
     # ── Step 3: Overall mix health score ──
     score = 100
@@ -479,29 +496,341 @@ def generate_mix_suggestions(track_analyses, genre="pop"):
         "summary": summary,
         "genre_profile": profile["name"],
         "total_tracks_analyzed": len(valid_tracks),
+        "masking_matrix": masking,
     }
 
 
+# =============================================================================
+# CONFLICT MATRIX — all track pairs at once, per band group and time block
+# =============================================================================
+
+CONFLICT_GROUPS = {
+    "bass": ("sub", "bass"),
+    "midrange": ("low_mid", "mid"),
+    "highs": ("upper_mid", "presence", "brilliance"),
+}
+CONFLICT_SHARE = 0.25        # group's share of a track's energy in a block to "occupy" it
+CONFLICT_ACTIVE_DB = 12.0    # ...and within this many dB of the track's loudest block there
+CONFLICT_MIN_SECONDS = 8.0   # unbroken shared occupancy that counts as a clash on its own
+CONFLICT_MIN_MASKING = 0.3   # ...only when the pair's masking score is at least this
+MAX_TIME_CONFLICTS_PER_TRACK = 2  # strongest time-only clashes reported per track
+MAX_CONFLICT_SECTIONS = 10
+
+_CONFLICT_TEXT = {
+    "bass": ("both have heavy bass — EQ one to avoid muddiness",
+             "High-pass Track {j} at 100Hz or sidechain compress", "high"),
+    "midrange": ("are masking each other in the mids",
+                 "Pan apart or EQ complementary cuts (boost one at 1kHz, cut the other)", "medium"),
+    "highs": ("are both bright — may sound harsh together",
+              "Pan to opposite sides or cut one at 6-8kHz", "medium"),
+}
+
+
+def _band_tensor(analyses):
+    """
+    (tracks × bands × blocks) linear band energy, zero-padded to the longest
+    track. Analyses cached before band_envelope existed contribute their
+    average as a constant and are flagged untimed.
+    """
+    n_blocks = max((len(a["band_envelope"][0]) for a in analyses if a.get("band_envelope")), default=1)
+    energy = np.zeros((len(analyses), len(MIX_BANDS), n_blocks), dtype=np.float32)
+    timed = np.zeros(len(analyses), dtype=bool)
+    for k, a in enumerate(analyses):
+        env = a.get("band_envelope")
+        if env:
+            env = np.asarray(env, dtype=np.float32)
+            energy[k, :, :env.shape[1]] = np.power(10.0, env / 10.0)
+            timed[k] = True
+        else:
+            energy[k] = np.array([a["band_energy"][b]["energy"] for b in MIX_BANDS],
+                                 dtype=np.float32)[:, None]
+    return energy, timed
+
+
+def _sections(mask, seconds, limit):
+    """[start, end) runs of True in a 1-D block mask → [{"start", "end"}] in seconds, clipped to `limit`."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    return [{"start": round(float(min(s * seconds, limit)), 1), "end": round(float(min(e * seconds, limit)), 1)}
+            for s, e in zip(starts[:MAX_CONFLICT_SECTIONS], ends[:MAX_CONFLICT_SECTIONS])]
+
+
+def find_conflicts(valid_tracks):
+    """
+    Frequency conflicts for every track pair from a few array operations.
+
+    Averaged rules (heavy bass on both, close midrange centroids, two
+    bright tracks) still decide the classic warnings; the band envelopes
+    add which sections actually clash and catch pairs that only collide
+    part of the time. Returns (conflicts, masking_matrix).
+    """
+    indices = [i for i, _ in valid_tracks]
+    analyses = [a for _, a in valid_tracks]
+    n = len(analyses)
+    masking = {"tracks": indices, "groups": list(CONFLICT_GROUPS),
+               "scores": [[0.0] * n for _ in range(n)]}
+    if n < 2:
+        return [], masking
+
+    energy, timed = _band_tensor(analyses)
+    band_index = {b: k for k, b in enumerate(MIX_BANDS)}
+    groups = np.stack([energy[:, [band_index[b] for b in bands]].sum(axis=1)
+                       for bands in CONFLICT_GROUPS.values()], axis=1)        # T × G × N
+    total = energy.sum(axis=1, keepdims=True)
+    share = groups / np.maximum(total, 1e-12)
+    level_db = 10 * np.log10(np.maximum(groups, 1e-12))
+    active = ((share >= CONFLICT_SHARE) & (groups > 1e-10)
+              & (level_db >= level_db.max(axis=2, keepdims=True) - CONFLICT_ACTIVE_DB))
+
+    # Upper-triangle pairs in (i, j>i) order — same order as a nested loop
+    pi, pj = np.triu_indices(n, k=1)
+    both = active[pi] & active[pj]                                            # P × G × N
+    overlap_blocks = both.sum(axis=2)
+    pair_masking = (np.minimum(share[pi], share[pj]) * both).mean(axis=2)     # P × G
+    pair_timed = timed[pi] & timed[pj]
+
+    scores = np.zeros((n, n), dtype=np.float32)
+    scores[pi, pj] = scores[pj, pi] = pair_masking.max(axis=1)
+    masking["scores"] = np.round(scores.astype(np.float64), 3).tolist()
+
+    # Averaged rules, vectorized over pairs
+    bass_pct = np.array([a["bass_pct"] for a in analyses])
+    centroid = np.array([a["spectral_centroid"] for a in analyses])
+    types = np.array([a["track_type"] for a in analyses])
+    rules = np.stack([
+        (bass_pct[pi] > 30) & (bass_pct[pj] > 30),
+        (types[pi] == "midrange") & (types[pj] == "midrange") & (np.abs(centroid[pi] - centroid[pj]) < 400),
+        (types[pi] == "bright") & (types[pj] == "bright"),
+    ], axis=1)                                                                # P × G
+    block_seconds = float(analyses[int(np.argmax(timed))].get("envelope_seconds", ENVELOPE_SECONDS))
+    # Longest unbroken run of shared blocks: run length resets wherever `both` is False
+    runs = np.cumsum(both, axis=2, dtype=np.int32)
+    runs -= np.maximum.accumulate(np.where(both, 0, runs), axis=2)
+    longest = runs.max(axis=2)
+    durations = np.array([a.get("duration") or energy.shape[2] * block_seconds for a in analyses])
+    pair_seconds = np.minimum(durations[pi], durations[pj])                  # P
+    longest_seconds = np.minimum(longest * block_seconds, pair_seconds[:, None])
+    time_only = (pair_timed[:, None] & ~rules
+                 & (longest_seconds >= CONFLICT_MIN_SECONDS)
+                 & (pair_masking >= CONFLICT_MIN_MASKING))
+    # Keep only each track's strongest time-only clashes
+    per_track = {}
+    for p, g in sorted(zip(*np.nonzero(time_only)), key=lambda pg: -pair_masking[pg]):
+        a, b = pi[p], pj[p]
+        if per_track.get(a, 0) < MAX_TIME_CONFLICTS_PER_TRACK and per_track.get(b, 0) < MAX_TIME_CONFLICTS_PER_TRACK:
+            per_track[a] = per_track.get(a, 0) + 1
+            per_track[b] = per_track.get(b, 0) + 1
+        else:
+            time_only[p, g] = False
+
+    conflicts = []
+    for p in np.flatnonzero((rules | time_only).any(axis=1)):
+        i, j = indices[pi[p]], indices[pj[p]]
+        for g, group in enumerate(CONFLICT_GROUPS):
+            if not (rules[p, g] or time_only[p, g]):
+                continue
+            text, suggestion, priority = _CONFLICT_TEXT[group]
+            if rules[p, g]:
+                message = f"Track {i+1} and Track {j+1} {text}"
+            else:
+                # Section-level finding — reported, but not a health-score penalty
+                priority = "low"
+                message = (f"Track {i+1} and Track {j+1} crowd the {group} at the same time "
+                           f"(up to {longest_seconds[p, g]:.0f}s at once)")
+            conflict = {
+                "tracks": [i, j],
+                "band": group,
+                "message": message,
+                "suggestion": suggestion.format(j=j + 1),
+                "priority": priority,
+                "masking_score": round(float(pair_masking[p, g]), 3),
+            }
+            if pair_timed[p]:
+                active_i = active[pi[p], g].sum()
+                active_j = active[pj[p], g].sum()
+                conflict["overlap_seconds"] = round(float(min(overlap_blocks[p, g] * block_seconds,
+                                                              pair_seconds[p])), 1)
+                conflict["overlap_pct"] = round(
+                    float(100.0 * overlap_blocks[p, g] / max(1, min(active_i, active_j))), 1)
+                conflict["sections"] = _sections(both[p, g], block_seconds, pair_seconds[p])
+                if overlap_blocks[p, g] == 0:
+                    # Heavy on average, but never at the same time
+                    conflict["priority"] = "low"
+            conflicts.append(conflict)
+
+    return conflicts, masking
+
+
 # =============================================================================
 # HELPER: Download audio from URL to local temp file
 # =============================================================================
 
-def download_audio(url, dest_path):
-    """Download audio from URL (Cloudinary or local) to a temp file."""
-    import requests as req
+_session = None
+_session_lock = threading.Lock()
+
 
+def _http_session():
+    """Shared keep-alive session sized for MIX_DOWNLOAD_CONCURRENCY parallel fetches."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests as req
+            from requests.adapters import HTTPAdapter
+            _session = req.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MIX_DOWNLOAD_CONCURRENCY)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def download_audio(url, dest_path):
+    """
+    Download audio from URL (Cloudinary or local) to a temp file.
+    Returns the sha256 of the bytes, computed while writing.
+    """
     if url.startswith(('http://', 'https://')):
-        r = req.get(url, timeout=30)
-        r.raise_for_status()
-        with open(dest_path, 'wb') as f:
-            f.write(r.content)
+        digest = hashlib.sha256()
+        with _http_session().get(url, stream=True, timeout=30) as r:
+            r.raise_for_status()
+            with open(dest_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=_DOWNLOAD_CHUNK):
+                    digest.update(chunk)
+                    f.write(chunk)
+        return digest.hexdigest()
     elif os.path.exists(url):
         import shutil
         shutil.copy2(url, dest_path)
+        return hash_file(dest_path)
     else:
         raise FileNotFoundError(f"Cannot access audio: {url}")
 
 
+def _fetch_track(tf):
+    """I/O pool: download (or just hash an uploaded file) → tf with content_hash."""
+    if tf.get("url"):
+        tf["content_hash"] = download_audio(tf["url"], tf["path"])
+    else:
+        tf["content_hash"] = hash_file(tf["path"])
+    return tf
+
+
+def analyze_tracks(track_files):
+    """
+    Concurrent downloads on the I/O pool feed analysis on the CPU pool
+    (at most MIX_ASSISTANT_MAX_WORKERS tracks at once). Yields
+    (track, analysis) as each track finishes, so total time tracks the
+    slowest track rather than the sum. Must run in an app context.
+    """
+    pending_fetch = set()
+    fetch_queue = list(track_files)
+    waiting = []        # fetched, not yet submitted for analysis
+    analyzing = {}      # future → track
+
+    def _fill_fetches():
+        while fetch_queue and len(pending_fetch) < MIX_DOWNLOAD_CONCURRENCY:
+            pending_fetch.add(submit_io(_fetch_track, fetch_queue.pop(0)))
+
+    _fill_fetches()
+    while pending_fetch or waiting or analyzing:
+        while waiting and len(analyzing) < MIX_ASSISTANT_MAX_WORKERS:
+            tf = waiting.pop(0)
+            analyzing[submit_cpu(analyze_single_track, tf["path"])] = tf
+
+        done, _ = wait(pending_fetch | set(analyzing), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future in pending_fetch:
+                pending_fetch.discard(future)
+                try:
+                    tf = future.result()
+                except Exception as e:
+                    print(f"⚠️ Could not fetch track: {e}")
+                    continue
+                cached = get_cached_analysis(MIX_ANALYZER_NAME, MIX_ANALYZER_VERSION, tf["content_hash"])
+                if cached is not None:
+                    if tf.get("url"):
+                        remember_source(MIX_ANALYZER_NAME, tf["content_hash"], None, tf["url"])
+                    yield tf, cached
+                else:
+                    waiting.append(tf)
+                continue
+
+            tf = analyzing.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"⚠️ Analysis failed for track {tf['index']+1}: {e}")
+                result = {"error": str(e)}
+            if result is not None and "error" not in result:
+                store_analysis(MIX_ANALYZER_NAME, MIX_ANALYZER_VERSION, tf["content_hash"],
+                               result, source_url=tf.get("url"))
+            yield tf, result or {"error": "Analysis failed"}
+        _fill_fetches()
+
+
+def _emit_track_result(user_id, request_id, index, total, analysis):
+    """Per-track progress for the studio UI ('mix_track_analyzed')."""
+    try:
+        socketio = getattr(current_app, "socketio", None)
+        if socketio is None:
+            return
+        socketio.emit("mix_track_analyzed", {
+            "request_id": request_id,
+            "index": index,
+            "completed": total["done"],
+            "total": total["count"],
+            "analysis": _public_analysis(analysis),
+        }, room=f"user_{user_id}")
+    except Exception as e:
+        print(f"⚠️ Mix progress emit failed: {e}")
+
+
+# =============================================================================
+# MIX SESSIONS — per-track content hashes remembered between re-runs
+# =============================================================================
+# {"tracks": {"<index>": {"content_hash", "url", "name"}}}; the features
+# themselves live in analysis_cache, so a re-run only fetches and analyzes
+# tracks whose URL changed or that were uploaded again.
+
+def _mix_session_key(user_id, session_id):
+    return f"mix_session:{user_id}:{session_id}"
+
+
+def load_mix_session(user_id, session_id):
+    try:
+        state = cache.get(_mix_session_key(user_id, session_id))
+    except Exception as e:
+        print(f"⚠️ Mix session load failed: {e}")
+        state = None
+    return state or {"tracks": {}}
+
+
+def save_mix_session(user_id, session_id, state):
+    try:
+        cache.set(_mix_session_key(user_id, session_id), state, timeout=MIX_SESSION_TTL)
+    except Exception as e:
+        print(f"⚠️ Mix session save failed: {e}")
+
+
+def _session_analysis(session, content_hash):
+    """Cached features for a hash this session has already seen."""
+    known = {t.get("content_hash") for t in session["tracks"].values()}
+    if not content_hash or content_hash not in known:
+        return None
+    return get_cached_analysis(MIX_ANALYZER_NAME, MIX_ANALYZER_VERSION, content_hash)
+
+
+def _track_indices(values, limit):
+    """Client track indices as ints, or None if any is invalid, out of range or repeated."""
+    indices = []
+    for value in values:
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value < limit:
+            return None
+        indices.append(value)
+    return indices if len(set(indices)) == len(indices) else None
+
+
 # =============================================================================
 # API ROUTES
 # =============================================================================
@@ -516,24 +845,40 @@ def analyze_mix():
     {
         "project_id": 123,        // Analyze saved project tracks
         "genre": "hip_hop",       // Optional genre for profile-aware suggestions
+        "session_id": "abc",      // Optional: re-runs only analyze changed tracks
     }
 
     OR multipart form with multiple audio files:
     - files[]: audio files
     - genre: optional genre string
+    - session_id: optional, as above
+    - file_indices: optional JSON list, track index of each uploaded file
+    - keep: optional JSON list of {"index", "name", "content_hash"} for
+      unchanged tracks that were not re-uploaded (hashes from a previous
+      response's "tracks")
     """
     user_id = get_jwt_identity()
     temp_dir = None
 
     try:
         genre = "pop"  # default
+        request_id = None
         track_files = []
+        cached_results = {}  # index → analysis found without downloading
+        track_hashes = {}    # index → content hash (for the session)
+        missing = []         # kept tracks whose features are gone — client must re-upload
+
+        payload = request.get_json() if request.is_json else request.form
+        session_id = payload.get('session_id') or uuid.uuid4().hex
+        session = load_mix_session(user_id, session_id)
+        session_by_url = {t["url"]: t.get("content_hash") for t in session["tracks"].values() if t.get("url")}
 
         if request.is_json:
             # ── Mode A: Analyze from saved project ──
-            data = request.get_json()
+            data = payload
             project_id = data.get('project_id')
             genre = data.get('genre', 'pop')
+            request_id = data.get('request_id')
 
             if not project_id:
                 return jsonify({"error": "project_id is required"}), 400
@@ -550,29 +895,79 @@ def analyze_mix():
                 url = track.get('audio_url')
                 if not url:
                     continue
+                name = track.get('name', f'Track {i+1}')
+
+                # Same URL as last run in this session → features by hash
+                content_hash = session_by_url.get(url)
+                cached = _session_analysis(session, content_hash)
+                if cached is not None:
+                    cached["name"] = name
+                    cached_results[i] = cached
+                    track_hashes[i] = {"content_hash": content_hash, "url": url, "name": name}
+                    continue
+
+                # Unchanged stem from a previous run → no download, no decode
+                cached = lookup_by_source(MIX_ANALYZER_NAME, MIX_ANALYZER_VERSION, source_url=url)
+                if cached is not None:
+                    cached["name"] = name
+                    cached_results[i] = cached
+                    track_hashes[i] = {"content_hash": None, "url": url, "name": name}
+                    continue
+
+                # Downloaded concurrently by analyze_tracks
                 ext = url.rsplit('.', 1)[-1] if '.' in url else 'wav'
-                local_path = os.path.join(temp_dir, f"track_{i}.{ext}")
-                try:
-                    download_audio(url, local_path)
-                    track_files.append({
-                        "index": i,
-                        "name": track.get('name', f'Track {i+1}'),
-                        "path": local_path,
-                    })
-                except Exception as e:
-                    print(f"⚠️ Could not download track {i}: {e}")
+                track_files.append({
+                    "index": i,
+                    "name": name,
+                    "path": os.path.join(temp_dir, f"track_{i}.{ext}"),
+                    "url": url,
+                })
 
         else:
             # ── Mode B: Analyze uploaded files directly ──
             genre = request.form.get('genre', 'pop')
+            request_id = request.form.get('request_id')
             files = request.files.getlist('files[]')
             if not files:
                 files = request.files.getlist('files')
-            if not files:
+            try:
+                keep = json.loads(request.form.get('keep') or '[]')
+                file_indices = json.loads(request.form.get('file_indices') or 'null')
+            except ValueError:
+                return jsonify({"error": "keep and file_indices must be JSON lists"}), 400
+            if not files and not keep:
                 return jsonify({"error": "No audio files provided"}), 400
+            if file_indices is None:
+                file_indices = list(range(len(files)))
+            if not isinstance(keep, list) or not isinstance(file_indices, list):
+                return jsonify({"error": "keep and file_indices must be JSON lists"}), 400
+            if len(file_indices) != len(files):
+                return jsonify({"error": "file_indices must have one entry per file"}), 400
+            if not all(isinstance(k, dict) and k.get("content_hash") for k in keep):
+                return jsonify({"error": "keep entries need index and content_hash"}), 400
+
+            known = max((int(i) + 1 for i in session["tracks"]), default=0)
+            limit = min(known + len(files), MAX_MIX_TRACKS)
+            keep_indices = _track_indices([k.get("index") for k in keep], limit)
+            file_indices = _track_indices(file_indices, limit)
+            if keep_indices is None or file_indices is None:
+                return jsonify({"error": f"Track indices must be unique integers in 0..{limit - 1}"}), 400
+            if set(keep_indices) & set(file_indices):
+                return jsonify({"error": "A track can't be both kept and re-uploaded"}), 400
+
+            # Unchanged tracks the client skipped uploading
+            for i, k in zip(keep_indices, keep):
+                name = k.get("name") or f"Track {i+1}"
+                cached = _session_analysis(session, k.get("content_hash"))
+                if cached is None:
+                    missing.append(i)
+                    continue
+                cached["name"] = name
+                cached_results[i] = cached
+                track_hashes[i] = {"content_hash": k["content_hash"], "url": None, "name": name}
 
             temp_dir = tempfile.mkdtemp()
-            for i, f in enumerate(files):
+            for i, f in zip(file_indices, files):
                 ext = f.filename.rsplit('.', 1)[-1] if '.' in f.filename else 'wav'
                 local_path = os.path.join(temp_dir, f"track_{i}.{ext}")
                 f.save(local_path)
@@ -582,26 +977,48 @@ def analyze_mix():
                     "path": local_path,
                 })
 
-        if not track_files:
+        if not track_files and not cached_results:
+            if missing:
+                return jsonify({"error": "Kept tracks expired — re-upload them",
+                                "missing_tracks": missing, "session_id": session_id}), 409
             return jsonify({"error": "No audio tracks to analyze"}), 400
 
         # ── Analyze each track ──
-        print(f"🎛️ AI Mix Assistant: Analyzing {len(track_files)} tracks (genre: {genre})")
-        analyses = [None] * (max(t["index"] for t in track_files) + 1)
-
-        for tf in track_files:
-            print(f"  📊 Analyzing Track {tf['index']+1}: {tf['name']}")
-            result = analyze_single_track(tf["path"])
+        print(f"🎛️ AI Mix Assistant: Analyzing {len(track_files)} tracks "
+              f"({len(cached_results)} cached, genre: {genre})")
+        analyses = {i: {"error": "Cached analysis expired — re-upload this track"} for i in missing}
+        progress = {"done": 0, "count": len(track_files) + len(cached_results) + len(missing)}
+        for i, cached in cached_results.items():
+            analyses[i] = cached
+            progress["done"] += 1
+            _emit_track_result(user_id, request_id, i, progress, cached)
+
+        for tf, result in analyze_tracks(track_files):
+            print(f"  📊 Analyzed Track {tf['index']+1}: {tf['name']}")
             result["name"] = tf["name"]
             analyses[tf["index"]] = result
-
-        # Fill gaps with empty
-        analyses = [a if a else {"error": "No audio"} for a in analyses]
+            if "error" not in result:
+                track_hashes[tf["index"]] = {"content_hash": tf["content_hash"],
+                                             "url": tf.get("url"), "name": tf["name"]}
+            progress["done"] += 1
+            _emit_track_result(user_id, request_id, tf["index"], progress, result)
 
         # ── Generate suggestions ──
         result = generate_mix_suggestions(analyses, genre)
         result["analyzed_at"] = datetime.utcnow().isoformat()
 
+        save_mix_session(user_id, session_id, {
+            "tracks": {str(i): t for i, t in track_hashes.items()},
+        })
+        result.update({
+            "session_id": session_id,
+            "tracks": {str(i): {"content_hash": t["content_hash"], "name": t["name"]}
+                       for i, t in track_hashes.items()},
+            "recomputed_tracks": sorted(t["index"] for t in track_files),
+            "reused_tracks": sorted(cached_results),
+            "missing_tracks": sorted(missing),
+        })
+
         return jsonify({"success": True, **result}), 200
 
     except Exception as e:
@@ -650,7 +1067,8 @@ def quick_analyze_track():
         path = os.path.join(temp_dir, f"track.{ext}")
         file.save(path)
 
-        analysis = analyze_single_track(path)
+        analysis, _, _ = cached_analysis(MIX_ANALYZER_NAME, MIX_ANALYZER_VERSION, path,
+                                         analyze_single_track)
 
         import shutil
         shutil.rmtree(temp_dir, ignore_errors=True)
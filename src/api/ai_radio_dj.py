@@ -8,7 +8,7 @@
 # EXISTING Pipeline per talk break:
 #   1. AI writes DJ script (Claude/OpenAI API)
 #   2. TTS generates DJ voice audio (OpenAI TTS / ElevenLabs)
-#   3. FFmpeg stitches: talk break + crossfade + next song
+#   3. FFmpeg renders talk break + crossfade window into the next song
 #   4. Output feeds into existing radio stream
 #
 # NEW Playlist Curation Pipeline:
@@ -42,6 +42,7 @@ def _check_radio_credits(user_id, feature='ai_radio_dj_tts'):
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
+import io
 import os
 import json
 import tempfile
@@ -54,6 +55,7 @@ from collections import defaultdict
 
 # Internal imports
 from api.models import db, Audio, RadioStation, User
+from api.analysis_cache import lookup_many_by_audio
 try:
     from api.r2_storage_setup import uploadFile
 except ImportError:
@@ -416,8 +418,12 @@ def _get_time_of_day(hour):
 # TEXT-TO-SPEECH
 # =====================================================
 
-def generate_tts_audio(script, persona_key, output_path, custom_voice_id=None):
-    """Convert DJ script to spoken audio."""
+def generate_tts_audio(script, persona_key, output_path=None, custom_voice_id=None):
+    """
+    Convert DJ script to spoken audio.
+    Writes to output_path and returns it; with output_path=None the
+    audio bytes are returned instead (nothing touches disk).
+    """
     persona = DJ_PERSONAS.get(persona_key, DJ_PERSONAS["auto_dj"])
 
     # Priority 1: Custom cloned voice
@@ -482,6 +488,9 @@ def _tts_openai(script, voice, output_path, api_key):
     )
     response.raise_for_status()
 
+    if output_path is None:
+        return response.content
+
     with open(output_path, "wb") as f:
         f.write(response.content)
 
@@ -509,6 +518,9 @@ def _tts_elevenlabs(script, voice_id, output_path, api_key):
     )
     response.raise_for_status()
 
+    if output_path is None:
+        return response.content
+
     with open(output_path, "wb") as f:
         f.write(response.content)
 
@@ -520,15 +532,28 @@ def _tts_offline(script, output_path):
     """Offline TTS fallback using pyttsx3."""
     try:
         import pyttsx3
+    except ImportError:
+        print("⚠️ pyttsx3 not installed. No TTS available.")
+        return None
+
+    # pyttsx3 can only write to a file
+    to_bytes = output_path is None
+    if to_bytes:
+        fd, output_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+    try:
         engine = pyttsx3.init()
         engine.setProperty("rate", 160)
         engine.save_to_file(script, output_path)
         engine.runAndWait()
         print(f"🗣️ Offline TTS generated: {output_path}")
-        return output_path
-    except ImportError:
-        print("⚠️ pyttsx3 not installed. No TTS available.")
-        return None
+        if not to_bytes:
+            return output_path
+        with open(output_path, "rb") as f:
+            return f.read()
+    finally:
+        if to_bytes and os.path.exists(output_path):
+            os.remove(output_path)
 
 
 # =====================================================
@@ -615,6 +640,124 @@ def download_audio_file(url, output_path):
     return output_path
 
 
+# =====================================================
+# CROSSFADE WINDOW RENDER (FFmpeg pipes)
+# =====================================================
+# Only the talk break and the first few seconds of the next
+# song are encoded. TTS bytes go in on stdin, ffmpeg reads
+# just the song's head straight from its URL (-t stops the
+# HTTP read early) and the MP3 comes back on stdout. The
+# rest of the song is then appended with the concat demuxer
+# and -c:a copy from song_start_seconds, so the uploaded
+# segment is complete but the song is never re-encoded.
+# Songs that aren't MP3 fall back to the full re-encode.
+
+SEGMENT_TAIL_SECONDS = float(os.environ.get("RADIO_SEGMENT_TAIL_SECONDS", "2"))
+SEGMENT_RENDER_TIMEOUT = int(os.environ.get("RADIO_SEGMENT_RENDER_TIMEOUT", "60"))
+MP3_FRAME_SAMPLES = 1152
+
+
+def _probe_song(song_url):
+    """(codec_name, sample_rate, channels) of the song's first audio stream, or None."""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "quiet", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name,sample_rate,channels",
+             "-of", "default=noprint_wrappers=1", song_url],
+            capture_output=True, text=True, timeout=30
+        )
+        if result.returncode != 0:
+            return None
+        fields = dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+        return fields["codec_name"], int(fields["sample_rate"]), int(fields["channels"])
+    except Exception:
+        return None
+
+
+def render_crossfade_window(talk_audio, song_url, crossfade_seconds=3, tail_seconds=SEGMENT_TAIL_SECONDS,
+                            sample_rate=44100, channels=2):
+    """
+    Encode talk break + crossfade into the song's opening seconds.
+    song_start_seconds is rounded up to an MP3 frame of the song.
+    Returns (mp3_bytes, song_start_seconds) or None if ffmpeg failed.
+    """
+    frame = MP3_FRAME_SAMPLES / sample_rate
+    head = math.ceil((float(crossfade_seconds) + max(float(tail_seconds), 0.0)) / frame) * frame
+    layout = "mono" if channels == 1 else "stereo"
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-i", "pipe:0",
+        "-t", f"{head:.6f}", "-i", song_url,
+        "-filter_complex",
+        f"[0:a]aformat=sample_rates={sample_rate}:channel_layouts={layout}[talk];"
+        f"[1:a]aformat=sample_rates={sample_rate}:channel_layouts={layout},atrim=0:{head:.6f}[song];"
+        f"[talk][song]acrossfade=d={crossfade_seconds}:c1=tri:c2=tri[out]",
+        "-map", "[out]",
+        "-c:a", "libmp3lame", "-b:a", "192k",
+        "-f", "mp3", "pipe:1",
+    ]
+    try:
+        result = subprocess.run(cmd, input=talk_audio, capture_output=True, timeout=SEGMENT_RENDER_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ Crossfade window render failed: {e}")
+        return None
+
+    if result.returncode != 0 or not result.stdout:
+        print(f"⚠️ Crossfade window render failed: {result.stderr.decode(errors='replace')[:300]}")
+        return None
+
+    return result.stdout, round(head, 6)
+
+
+def _ffconcat_quote(value):
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def render_spliced_segment(talk_audio, song_url, crossfade_seconds, temp_dir):
+    """
+    Crossfade window followed by the stream-copied rest of the song, as one
+    MP3 file. Returns (output_path, song_start_seconds) or None when the song
+    isn't MP3 or ffmpeg failed.
+    """
+    probe = _probe_song(song_url)
+    if not probe or probe[0] != "mp3":
+        return None
+    _, sample_rate, channels = probe
+
+    rendered = render_crossfade_window(talk_audio, song_url, crossfade_seconds,
+                                       sample_rate=sample_rate, channels=channels)
+    if not rendered:
+        return None
+    window_bytes, song_start = rendered
+
+    window_path = os.path.join(temp_dir, "crossfade_window.mp3")
+    with open(window_path, "wb") as f:
+        f.write(window_bytes)
+    list_path = os.path.join(temp_dir, "segment.ffconcat")
+    with open(list_path, "w") as f:
+        f.write(f"ffconcat version 1.0\nfile {_ffconcat_quote(window_path)}\n"
+                f"file {_ffconcat_quote(song_url)}\ninpoint {song_start:.6f}\n")
+
+    output_path = os.path.join(temp_dir, "stitched_segment.mp3")
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "concat", "-safe", "0",
+        "-protocol_whitelist", "file,http,https,tcp,tls,crypto",
+        "-i", list_path,
+        "-map", "0:a", "-c:a", "copy",
+        output_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=SEGMENT_RENDER_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ Segment splice failed: {e}")
+        return None
+    if result.returncode != 0 or not os.path.exists(output_path):
+        print(f"⚠️ Segment splice failed: {result.stderr.decode(errors='replace')[:300]}")
+        return None
+    return output_path, song_start
+
+
 # =====================================================
 # AUTOMATION ENGINE
 # =====================================================
@@ -724,6 +867,19 @@ def generate_break_segment(
             pass
 
 
+def _render_full_segment(talk_audio, song_url, crossfade_seconds, temp_dir):
+    """Legacy path: download the whole song and re-encode talk + song."""
+    tts_path = os.path.join(temp_dir, "talk_break.mp3")
+    with open(tts_path, "wb") as f:
+        f.write(talk_audio)
+
+    song_path = os.path.join(temp_dir, "next_song.mp3")
+    download_audio_file(song_url, song_path)
+
+    output_path = os.path.join(temp_dir, "stitched_segment.mp3")
+    return stitch_talk_and_song(tts_path, song_path, output_path, crossfade_seconds)
+
+
 def generate_stitched_segment(
     station_id,
     persona_key,
@@ -733,12 +889,19 @@ def generate_stitched_segment(
     crossfade_seconds=3,
     listener_count=0,
 ):
-    """Full pipeline: script → TTS → stitch with next song → upload."""
+    """
+    Full pipeline: script → TTS → crossfade into next song → upload.
+
+    audio_url (= segment_url) is always the complete segment. MP3 songs
+    are spliced (render="spliced"): only the crossfade window is encoded
+    and the song continues stream-copied from song_start_seconds. Other
+    formats are stitched by re-encoding the whole song (render="full").
+    """
     station = RadioStation.query.get(station_id)
     if not station:
         return None
 
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = None
 
     try:
         script = generate_dj_script(
@@ -760,10 +923,9 @@ def generate_stitched_segment(
             dj_config = station.playlist_schedule.get("dj_config", {})
             custom_voice_id = dj_config.get("custom_voice_id")
 
-        tts_path = os.path.join(temp_dir, "talk_break.mp3")
-        tts_result = generate_tts_audio(script, persona_key, tts_path, custom_voice_id=custom_voice_id)
+        talk_audio = generate_tts_audio(script, persona_key, custom_voice_id=custom_voice_id)
 
-        if not tts_result:
+        if not talk_audio:
             return None
 
         next_song_url = next_track_info.get("file_url")
@@ -772,48 +934,52 @@ def generate_stitched_segment(
             if audio:
                 next_song_url = audio.file_url
 
+        stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+
         if not next_song_url:
             print("⚠️ No song URL — returning talk break only")
-            break_filename = f"dj_break_{station_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp3"
-            with open(tts_path, "rb") as f:
-                break_url = uploadFile(f, break_filename)
+            break_url = uploadFile(io.BytesIO(talk_audio), f"dj_break_{station_id}_{stamp}.mp3")
             return {"audio_url": break_url, "script": script, "type": "break_only"}
 
-        song_path = os.path.join(temp_dir, "next_song.mp3")
-        download_audio_file(next_song_url, song_path)
-
-        output_path = os.path.join(temp_dir, "stitched_segment.mp3")
-        stitch_result = stitch_talk_and_song(tts_path, song_path, output_path, crossfade_seconds)
-
-        if not stitch_result:
-            return None
-
-        segment_filename = f"dj_segment_{station_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.mp3"
-        with open(output_path, "rb") as f:
-            segment_url = uploadFile(f, segment_filename)
-
-        print(f"🎵 Stitched segment uploaded: {segment_url}")
-
-        return {
-            "audio_url": segment_url,
+        segment = {
             "script": script,
             "break_type": break_type,
             "next_track": next_track_info,
             "persona": persona_key,
-            "generated_at": datetime.utcnow().isoformat(),
+            "song_url": next_song_url,
         }
 
+        temp_dir = tempfile.mkdtemp()
+        spliced = render_spliced_segment(talk_audio, next_song_url, crossfade_seconds, temp_dir)
+        if spliced:
+            output_path, song_start = spliced
+            segment.update({"render": "spliced", "song_start_seconds": song_start})
+        else:
+            output_path = _render_full_segment(talk_audio, next_song_url, crossfade_seconds, temp_dir)
+            if not output_path or not os.path.exists(output_path):
+                return None
+            segment.update({"render": "full", "song_start_seconds": None})
+
+        with open(output_path, "rb") as f:
+            audio_url = uploadFile(f, f"dj_segment_{station_id}_{stamp}.mp3")
+        print(f"🎵 Stitched segment uploaded ({segment['render']}): {audio_url}")
+
+        segment.update({
+            "audio_url": audio_url,
+            "segment_url": audio_url,
+            "generated_at": datetime.utcnow().isoformat(),
+        })
+        return segment
+
     except Exception as e:
         print(f"❌ Stitched segment failed: {e}")
         traceback.print_exc()
         return None
 
     finally:
-        try:
+        if temp_dir:
             import shutil
             shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
 
 
 # =============================================================================
@@ -1080,6 +1246,28 @@ PLAYLIST_STRATEGIES = {
 # HELPER
 # =====================================================
 
+def _cached_track_analysis(tracks):
+    """
+    bpm/key/mood for each Audio from the content-addressed analysis
+    cache (filled by mastering analysis). Lookup only — never decodes.
+    """
+    try:
+        from api.ai_mastering_phase3 import ANALYZER_NAME, ANALYZER_VERSION
+        cached = lookup_many_by_audio(ANALYZER_NAME, ANALYZER_VERSION, tracks)
+    except Exception as e:
+        print(f"⚠️ Cached analysis lookup failed: {e}")
+        return {}
+
+    return {
+        audio_id: {
+            "bpm": analysis.get("bpm"),
+            "key": analysis.get("key"),
+            "mood": analysis.get("mood"),
+        }
+        for audio_id, analysis in cached.items()
+    }
+
+
 def format_duration(seconds):
     """Convert seconds to MM:SS format."""
     if not seconds or not isinstance(seconds, (int, float)):
@@ -1211,7 +1399,9 @@ def api_generate_break():
 @ai_radio_dj_bp.route('/api/ai/radio/generate-segment', methods=['POST'])
 @jwt_required()
 def api_generate_stitched_segment():
-    """Generate a full stitched segment: talk break + crossfade + next song."""
+    """
+    Generate a DJ segment: talk break crossfaded into the next song.
+    """
     user_id = get_jwt_identity()
 
     # AI Credit check for TTS
@@ -1293,6 +1483,7 @@ def get_station_dj_config(station_id):
         "dj_enabled": dj_config.get("enabled", False),
         "persona": dj_config.get("persona", "auto_dj"),
         "schedule_rules": dj_config.get("rules", DEFAULT_SCHEDULE_RULES),
+        "prerender_breaks": dj_config.get("prerender_breaks", False),
         "available_personas": list(DJ_PERSONAS.keys()),
     }), 200
 
@@ -1316,6 +1507,8 @@ def update_station_dj_config(station_id):
         "enabled": data.get("enabled", False),
         "persona": data.get("persona", "auto_dj"),
         "rules": data.get("rules", DEFAULT_SCHEDULE_RULES),
+        # Opt-in: render the next break ahead of time (charged when rendered)
+        "prerender_breaks": bool(data.get("prerender_breaks", False)),
         "updated_at": datetime.utcnow().isoformat(),
     }
 
@@ -1324,6 +1517,9 @@ def update_station_dj_config(station_id):
     flag_modified(station, "playlist_schedule")
     db.session.commit()
 
+    from api import radio_break_scheduler
+    radio_break_scheduler.invalidate(station_id)
+
     return jsonify({
         "message": f"🤖 AI DJ {'enabled' if data.get('enabled') else 'disabled'} for {station.name}",
         "config": current_schedule["dj_config"],
@@ -1354,26 +1550,60 @@ def trigger_next_break(station_id):
     if not next_track_info:
         return jsonify({"error": "No next track available"}), 400
 
-    break_type = request.get_json().get("break_type", "song_intro") if request.get_json() else "song_intro"
+    # No explicit type → whatever was planned for this transition is served
+    requested_type = (request.get_json(silent=True) or {}).get("break_type")
 
-    result = generate_break_segment(
-        station_id=station_id,
-        persona_key=persona_key,
-        break_type=break_type,
-        last_track_info=current_track,
-        next_track_info=next_track_info,
-        listener_count=station.followers_count or 0,
-    )
+    from api import radio_break_scheduler
+    result = radio_break_scheduler.take_break(station, requested_type)
+    prerendered = result is not None
+
+    if not result:
+        # Pre-rendered breaks were charged when rendered; on-demand ones are charged here
+        if _HAS_CREDITS and not _check_radio_credits(user_id, 'ai_radio_dj_tts'):
+            return jsonify({"error": "Insufficient credits for AI DJ TTS", "feature": "ai_radio_dj_tts"}), 402
+        result = generate_break_segment(
+            station_id=station_id,
+            persona_key=persona_key,
+            break_type=requested_type or "song_intro",
+            last_track_info=current_track,
+            next_track_info=next_track_info,
+            listener_count=station.followers_count or 0,
+        )
+        if result:
+            radio_break_scheduler.mark_served(station)
 
     if not result:
         return jsonify({"error": "Failed to generate break"}), 500
 
+    # Pre-render the break for the transition after this one (opted-in stations only)
+    try:
+        radio_break_scheduler.fill_station(station)
+    except Exception as e:
+        print(f"⚠️ Break look-ahead refill failed: {e}")
+
     return jsonify({
         "message": f"🎙️ {DJ_PERSONAS.get(persona_key, {}).get('name', 'DJ')} break generated!",
         **result,
+        "prerendered": prerendered,
     }), 200
 
 
+@ai_radio_dj_bp.route('/api/ai/radio/station/<int:station_id>/break-queue', methods=['GET'])
+@jwt_required()
+def get_break_queue(station_id):
+    """Pre-rendered DJ breaks waiting for upcoming transitions."""
+    user_id = get_jwt_identity()
+    station = RadioStation.query.get(station_id)
+
+    if not station:
+        return jsonify({"error": "Station not found"}), 404
+    if str(station.user_id) != str(user_id):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    from api import radio_break_scheduler
+    return jsonify(radio_break_scheduler.queue_status(station_id)), 200
+
+
 @ai_radio_dj_bp.route('/api/ai/radio/station/<int:station_id>/request', methods=['POST'])
 @jwt_required()
 def listener_request(station_id):
@@ -1677,17 +1907,19 @@ def get_station_library(station_id):
             return jsonify({"error": "Station not found or unauthorized"}), 404
 
         tracks = Audio.query.filter_by(user_id=user_id).order_by(Audio.uploaded_at.desc()).all()
+        analyzed = _cached_track_analysis(tracks)
 
         track_list = []
         for track in tracks:
+            meta = analyzed.get(track.id, {})
             track_data = {
                 "id": track.id,
                 "title": track.title or "Untitled",
                 "artist": getattr(track, 'artist', None) or getattr(track, 'creator_name', None) or "Unknown",
                 "genre": getattr(track, 'genre', None) or "",
-                "bpm": getattr(track, 'bpm', None),
-                "key": getattr(track, 'key', None) or getattr(track, 'musical_key', None),
-                "mood": getattr(track, 'mood', None) or "",
+                "bpm": getattr(track, 'bpm', None) or meta.get("bpm"),
+                "key": getattr(track, 'key', None) or getattr(track, 'musical_key', None) or meta.get("key"),
+                "mood": getattr(track, 'mood', None) or meta.get("mood") or "",
                 "duration": getattr(track, 'duration', None),
                 "duration_formatted": format_duration(getattr(track, 'duration', None)),
                 "file_url": track.file_url,
@@ -1775,19 +2007,21 @@ def generate_smart_playlist(station_id):
             return jsonify({"error": "No tracks found. Upload music first!"}), 400
 
         # Build track data with metadata
+        analyzed = _cached_track_analysis(tracks)
         track_data_list = []
         for track in tracks:
             if track.id in exclude_ids:
                 continue
 
+            meta = analyzed.get(track.id, {})
             td = {
                 "id": track.id,
                 "title": track.title or "Untitled",
                 "artist": getattr(track, 'artist', None) or getattr(track, 'creator_name', None) or "Unknown",
                 "genre": getattr(track, 'genre', None) or "",
-                "bpm": getattr(track, 'bpm', None),
-                "key": getattr(track, 'key', None) or getattr(track, 'musical_key', None),
-                "mood": getattr(track, 'mood', None) or "",
+                "bpm": getattr(track, 'bpm', None) or meta.get("bpm"),
+                "key": getattr(track, 'key', None) or getattr(track, 'musical_key', None) or meta.get("key"),
+                "mood": getattr(track, 'mood', None) or meta.get("mood") or "",
                 "duration": getattr(track, 'duration', None),
                 "file_url": track.file_url,
                 "artwork_url": getattr(track, 'artwork_url', None) or getattr(track, 'cover_url', None),
@@ -1969,6 +2203,11 @@ def apply_playlist_to_station(station_id):
 
         db.session.commit()
 
+        from api import radio_break_scheduler, radio_hls, radio_now_playing
+        radio_break_scheduler.invalidate(station_id)
+        radio_hls.invalidate_playout(station_id)
+        radio_now_playing.publish_station(station_id)
+
         return jsonify({
             "message": f"🎵 AI playlist applied! {len(playlist)} tracks loaded with {strategy} strategy.",
             "station_id": station_id,
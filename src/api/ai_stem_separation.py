@@ -9,17 +9,17 @@
 #   6-stem: Vocals, Drums, Bass, Guitar, Piano, Other
 #
 # Pipeline:
-#   1. User uploads or selects existing track
-#   2. Demucs separates into stems
-#   3. Each stem uploaded to cloud storage
-#   4. StemSeparationJob record saved to database
+#   1. User uploads or selects existing track → StemSeparationJob queued (202)
+#   2. Celery worker runs Demucs (status: running, progress_pct)
+#   3. Stems uploaded to cloud storage concurrently (status: uploading)
+#   4. Job marked done; progress pushed over Socket.IO ('stem_job_update')
 #   5. User can download/preview individual stems
 #
 # Install: pip install demucs torch torchaudio
 # Register: app.register_blueprint(ai_stem_separation_bp)
 # =====================================================
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, redirect
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 import os
@@ -29,9 +29,20 @@ import traceback
 import shutil
 import subprocess
 import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Internal imports
 from api.models import db, Audio, User, StemSeparationJob
+from api import demucs_service, stem_cache, stem_variants
+from api.analysis_cache import hash_file
+from api.audio_workers import submit_io
+try:
+    from api.tasks import separate_stems_task
+except Exception as e:
+    print(f"⚠️ Stem Celery task unavailable, jobs will run in-process: {e}")
+    separate_stems_task = None
 try:
     from api.r2_storage_setup import uploadFile
 except ImportError:
@@ -39,6 +50,9 @@ except ImportError:
 
 ai_stem_separation_bp = Blueprint('ai_stem_separation', __name__)
 
+# Probe demucs/torch once at startup (cached for the process lifetime)
+demucs_service.warm_capabilities()
+
 
 # =====================================================
 # CONFIGURATION
@@ -98,7 +112,18 @@ STEM_INFO = {
     "other": {"name": "Other / Instruments", "icon": "🎹", "color": "#96CEB4"},
 }
 
-MAX_FILE_SIZE = 100 * 1024 * 1024
+MAX_FILE_SIZE = int(os.environ.get("STEM_MAX_FILE_SIZE_MB", "500")) * 1024 * 1024
+# Segmented separation keeps memory flat, so long DJ sets / podcasts are fine
+MAX_DURATION_SECONDS = int(os.environ.get("STEM_MAX_DURATION_SECONDS", str(4 * 3600)))
+# Spooled uploads are read by the Celery worker — must be a shared path
+STEM_SPOOL_DIR = os.environ.get("STEM_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "streampirex-stems"))
+STEM_OUTPUT_FORMAT = stem_variants.MASTER_FORMAT  # lossless master; mp3/ogg/wav on demand
+_SPOOL_CHUNK = 1024 * 1024
+# In-process fallback when Celery is down. Jobs block on their own uploads
+# in the shared I/O pool, so they must never run inside that pool.
+STEM_FALLBACK_WORKERS = int(os.environ.get("STEM_FALLBACK_WORKERS", "1"))
+_fallback_pool = None
+_fallback_lock = threading.Lock()
 ALLOWED_EXTENSIONS = {'.mp3', '.wav', '.flac', '.ogg', '.m4a', '.aac', '.wma'}
 
 
@@ -107,39 +132,15 @@ ALLOWED_EXTENSIONS = {'.mp3', '.wav', '.flac', '.ogg', '.m4a', '.aac', '.wma'}
 # =====================================================
 
 def check_demucs_available():
-    try:
-        result = subprocess.run(
-            ["python", "-c", "import demucs; print(demucs.__version__)"],
-            capture_output=True, text=True, timeout=10
-        )
-        if result.returncode == 0:
-            return True, result.stdout.strip()
-    except Exception:
-        pass
-    try:
-        result = subprocess.run(
-            ["python", "-c", "from demucs.pretrained import get_model; print('ok')"],
-            capture_output=True, text=True, timeout=10
-        )
-        if result.returncode == 0:
-            return True, "available"
-    except Exception:
-        pass
-    return False, None
+    version = demucs_service.get_capabilities()["demucs_version"]
+    return (True, version) if version else (False, None)
 
 
 def check_torch_available():
-    try:
-        result = subprocess.run(
-            ["python", "-c", "import torch; print(f'{torch.__version__}|{torch.cuda.is_available()}')"],
-            capture_output=True, text=True, timeout=10
-        )
-        if result.returncode == 0:
-            parts = result.stdout.strip().split("|")
-            return True, parts[0], parts[1] == "True"
-    except Exception:
-        pass
-    return False, None, False
+    caps = demucs_service.get_capabilities()
+    if not caps["torch_version"]:
+        return False, None, False
+    return True, caps["torch_version"], caps["gpu_available"]
 
 
 def get_audio_duration(file_path):
@@ -160,23 +161,39 @@ def get_audio_duration(file_path):
 # CORE: Run Demucs Separation
 # =====================================================
 
-def run_demucs_separation(input_path, output_dir, model_name=DEFAULT_MODEL, device="cpu"):
+def run_demucs_separation(input_path, output_dir, model_name=DEFAULT_MODEL, device="cpu", progress=None):
     print(f"🎵 Starting stem separation with model: {model_name}")
     print(f"   Input: {input_path}")
     print(f"   Device: {device}")
 
+    # Resident workers, segmented (model already loaded after the first job)
+    if demucs_service.in_process_available():
+        try:
+            stems = demucs_service.separate(input_path, output_dir, model_name, device, progress=progress)
+            if stems:
+                print(f"✅ Demucs service completed successfully")
+                return stems
+        except demucs_service.DemucsServiceError as e:
+            print(f"⚠️ Demucs service unavailable, falling back to CLI: {e}")
+
+    return run_demucs_cli(input_path, output_dir, model_name, device)
+
+
+def run_demucs_cli(input_path, output_dir, model_name=DEFAULT_MODEL, device="cpu"):
+    """One-shot `python -m demucs` subprocess (fallback path)."""
     cmd = [
         "python", "-m", "demucs",
         "--name", model_name,
         "--out", output_dir,
         "--device", device,
-        "--mp3",
-        "--mp3-bitrate", "320",
+        "--flac",
         input_path
     ]
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        # Whole-file CLI run: allow ~3x realtime for long inputs
+        timeout = max(600, int(3 * (get_audio_duration(input_path) or 0)))
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
         if result.returncode != 0:
             print(f"❌ Demucs error: {result.stderr}")
             raise RuntimeError(f"Demucs failed: {result.stderr[:500]}")
@@ -211,7 +228,7 @@ def run_demucs_separation(input_path, output_dir, model_name=DEFAULT_MODEL, devi
     model_stems = DEMUCS_MODELS.get(model_name, {}).get("stems", ["vocals", "drums", "bass", "other"])
     stems = {}
     for stem_name in model_stems:
-        for ext in [".mp3", ".wav"]:
+        for ext in [".flac", ".wav", ".mp3"]:
             stem_path = os.path.join(stems_dir, f"{stem_name}{ext}")
             if os.path.exists(stem_path):
                 file_size = os.path.getsize(stem_path)
@@ -227,18 +244,26 @@ def run_demucs_separation(input_path, output_dir, model_name=DEFAULT_MODEL, devi
     return stems
 
 
+def _upload_stem(path, filename):
+    with open(path, 'rb') as f:
+        return uploadFile(f, filename)
+
+
 def upload_stems_to_cloud(stems, title, job_id):
     stem_urls = {}
     stem_id = uuid.uuid4().hex[:8]
     timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
 
+    # All stems upload concurrently on the shared I/O pool
+    futures = {}
     for stem_name, stem_data in stems.items():
-        stem_filename = f"stem_{stem_name}_{job_id}_{stem_id}_{timestamp}.mp3"
+        ext = os.path.splitext(stem_data["filename"])[1] or ".flac"
+        stem_filename = f"stem_{stem_name}_{job_id}_{stem_id}_{timestamp}{ext}"
         print(f"☁️ Uploading {stem_name} stem...")
+        futures[stem_name] = submit_io(_upload_stem, stem_data["path"], stem_filename)
 
-        with open(stem_data["path"], 'rb') as f:
-            stem_url = uploadFile(f, stem_filename)
-
+    for stem_name, stem_data in stems.items():
+        stem_url = futures[stem_name].result()
         stem_urls[stem_name] = {
             "url": stem_url,
             "name": STEM_INFO.get(stem_name, {}).get("name", stem_name),
@@ -251,6 +276,16 @@ def upload_stems_to_cloud(stems, title, job_id):
     return stem_urls
 
 
+def _apply_stem_urls(job, stem_urls):
+    job.stem_count = len(stem_urls)
+    job.vocals_url = stem_urls.get("vocals", {}).get("url")
+    job.drums_url = stem_urls.get("drums", {}).get("url")
+    job.bass_url = stem_urls.get("bass", {}).get("url")
+    job.guitar_url = stem_urls.get("guitar", {}).get("url")
+    job.piano_url = stem_urls.get("piano", {}).get("url")
+    job.other_url = stem_urls.get("other", {}).get("url")
+
+
 def save_stem_job(user_id, audio_id, title, original_url, duration, model_name, device, stem_urls):
     job = StemSeparationJob(
         user_id=user_id,
@@ -260,21 +295,339 @@ def save_stem_job(user_id, audio_id, title, original_url, duration, model_name,
         duration_seconds=round(duration, 2) if duration else None,
         model_used=model_name,
         device_used=device,
-        stem_count=len(stem_urls),
-        vocals_url=stem_urls.get("vocals", {}).get("url"),
-        drums_url=stem_urls.get("drums", {}).get("url"),
-        bass_url=stem_urls.get("bass", {}).get("url"),
-        guitar_url=stem_urls.get("guitar", {}).get("url"),
-        piano_url=stem_urls.get("piano", {}).get("url"),
-        other_url=stem_urls.get("other", {}).get("url"),
         status='completed',
         created_at=datetime.utcnow(),
     )
+    _apply_stem_urls(job, stem_urls)
     db.session.add(job)
     db.session.commit()
     return job
 
 
+# =====================================================
+# ASYNC JOBS: queued → running → uploading → done
+# =====================================================
+
+def _spool_upload(file, filename):
+    """
+    Save an upload where the worker can pick it up (STEM_SPOOL_DIR must be
+    shared), hashing it on the way. Returns (path, sha256).
+    """
+    os.makedirs(STEM_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(STEM_SPOOL_DIR, f"{uuid.uuid4().hex}_{filename}")
+    digest = hashlib.sha256()
+    file.stream.seek(0)
+    with open(path, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(_SPOOL_CHUNK), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    return path, digest.hexdigest()
+
+
+def _discard_spool(path):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _download_source(url, temp_dir):
+    import requests as req
+    url_path = url.split('?')[0]
+    input_ext = os.path.splitext(url_path)[1] or '.mp3'
+    input_path = os.path.join(temp_dir, f"input{input_ext}")
+
+    response = req.get(url, stream=True, timeout=120)
+    response.raise_for_status()
+    with open(input_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+    return input_path
+
+
+def _upload_original(path):
+    # Spooled names are "<hex>_<original filename>"
+    return _upload_stem(path, os.path.basename(path).split('_', 1)[-1])
+
+
+def _job_payload(job):
+    model = DEMUCS_MODELS.get(job.model_used, DEMUCS_MODELS[DEFAULT_MODEL])
+    payload = job.serialize()
+    # Coalesced jobs report the progress of the job computing their stems
+    if job.source_job_id and job.status in stem_cache.IN_FLIGHT_STATUSES:
+        leader = StemSeparationJob.query.get(job.source_job_id)
+        if leader:
+            payload["progress_pct"] = leader.progress_pct or 0
+    variants = stem_variants.known_variants([info["url"] for info in payload["stems"].values()])
+    for info in payload["stems"].values():
+        info["variants"] = variants.get(info["url"], {})
+    payload.update({
+        "job_id": job.id,
+        "master_format": job.output_format,
+        "variant_formats": sorted(stem_variants.VARIANT_FORMATS),
+        "model": {"id": job.model_used, "name": model["name"], "quality": model["quality"]},
+        "device": job.device_used,
+        "status_url": f"/api/ai/stems/job/{job.id}/progress",
+    })
+    if job.status == 'done':
+        payload["message"] = "🎵 Stems separated successfully!"
+    return payload
+
+
+def _emit_stem_event(job, **extra):
+    """Push job state to the owner's room (workers need SOCKETIO_MESSAGE_QUEUE)."""
+    try:
+        socketio = getattr(current_app, "socketio", None)
+        if socketio is None:
+            return
+        payload = {"job_id": job.id, "status": job.status, "progress_pct": job.progress_pct or 0}
+        payload.update(extra)
+        socketio.emit("stem_job_update", payload, room=f"user_{job.user_id}")
+    except Exception as e:
+        print(f"⚠️ Stem job socket emit failed: {e}")
+
+
+def _finish_from_stems(job, stems, cache_status=None):
+    """Mark a job done with stems computed elsewhere (cache hit or coalesced)."""
+    _apply_stem_urls(job, stems)
+    if cache_status:
+        job.cache_status = cache_status
+    job.status = 'done'
+    job.progress_pct = 100
+    job.input_path = None
+    audio = Audio.query.get(job.audio_id) if job.audio_id else None
+    if audio is not None and audio.processing_status == 'separating':
+        audio.processing_status = 'separated'
+        audio.last_processed_at = datetime.utcnow()
+    db.session.commit()
+    _emit_stem_event(job, stems=stems)
+
+
+def _fail_job(job, message):
+    job.status = 'error'
+    job.error_message = message[:500]
+    job.input_path = None
+    audio = Audio.query.get(job.audio_id) if job.audio_id else None
+    if audio is not None and audio.processing_status == 'separating':
+        audio.processing_status = 'error'
+    db.session.commit()
+    _emit_stem_event(job, error=job.error_message)
+
+
+def _stems_of(job):
+    return {name: dict(info) for name, info in job.serialize()["stems"].items()}
+
+
+def _follow(job, leader):
+    """Wait on an identical in-flight job instead of running Demucs again."""
+    job.source_job_id = leader.id
+    job.cache_status = 'coalesced'
+    job.input_path = None
+    db.session.commit()
+    print(f"🔗 Stem job {job.id} coalesced onto job {leader.id}")
+
+    # The leader may have finished before this job was registered
+    db.session.refresh(leader)
+    if leader.status in stem_cache.DONE_STATUSES:
+        _finish_from_stems(job, _stems_of(leader))
+    elif leader.status == 'error':
+        _fail_job(job, leader.error_message or "Stem separation failed")
+    else:
+        _emit_stem_event(job)
+
+
+def _resolve_followers(job, stems=None, error=None):
+    for follower in stem_cache.followers(job):
+        try:
+            if stems:
+                follower.device_used = job.device_used
+                follower.duration_seconds = follower.duration_seconds or job.duration_seconds
+                _finish_from_stems(follower, stems)
+            else:
+                _fail_job(follower, error or "Stem separation failed")
+        except Exception as e:
+            print(f"⚠️ Could not resolve coalesced stem job {follower.id}: {e}")
+            db.session.rollback()
+
+
+def _reuse_stems(job):
+    """Cache hit or in-flight twin → handled without Demucs (returns True)."""
+    if not job.content_hash:
+        return False
+    stems = stem_cache.lookup(job.content_hash, job.model_used, job.output_format)
+    if stems:
+        print(f"♻️ Stem job {job.id} served from cache")
+        _finish_from_stems(job, stems, 'hit')
+        return True
+    leader = stem_cache.find_in_flight(job)
+    if leader:
+        _follow(job, leader)
+        return True
+    return False
+
+
+def _stem_format(stems):
+    exts = {os.path.splitext(data["filename"])[1].lstrip('.').lower() for data in stems.values()}
+    return exts.pop() if len(exts) == 1 else None
+
+
+def _run_stem_job_in_app(app, job_id):
+    with app.app_context():
+        return run_stem_separation_job(job_id)
+
+
+def _get_fallback_pool():
+    global _fallback_pool
+    with _fallback_lock:
+        if _fallback_pool is None:
+            _fallback_pool = ThreadPoolExecutor(max_workers=max(1, STEM_FALLBACK_WORKERS),
+                                                thread_name_prefix="stem-job")
+        return _fallback_pool
+
+
+def _enqueue_stem_job(job):
+    try:
+        if separate_stems_task is None:
+            raise RuntimeError("Celery tasks not importable")
+        result = separate_stems_task.apply_async(args=[job.id], retry=False)
+        job.celery_task_id = result.id
+        db.session.commit()
+        print(f"📬 Stem job {job.id} queued (task {result.id})")
+    except Exception as e:
+        # No broker: still keep the request non-blocking, run off the request thread
+        print(f"⚠️ Celery unavailable, running stem job {job.id} in-process: {e}")
+        _get_fallback_pool().submit(_run_stem_job_in_app, current_app._get_current_object(), job.id)
+
+
+def _reuse_stems_after_original(job, audio, original_future):
+    """Worker-side dedup; a pending original upload is finished first."""
+    stems = stem_cache.lookup(job.content_hash, job.model_used, job.output_format)
+    leader = None if stems else stem_cache.find_in_flight(job)
+    if not stems and not leader:
+        return False
+    if original_future is not None:
+        job.original_url = audio.file_url = original_future.result()
+        db.session.commit()
+    if stems:
+        print(f"♻️ Stem job {job.id} served from cache")
+        _finish_from_stems(job, stems, 'hit')
+    else:
+        _follow(job, leader)
+    return True
+
+
+def run_stem_separation_job(job_id, task_id=None):
+    """Worker body for one StemSeparationJob (Celery task or in-process fallback)."""
+    job = StemSeparationJob.query.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+    if job.status == 'done' or job.source_job_id:
+        return _job_payload(job)
+    if job.status in ('running', 'uploading') and task_id and job.celery_task_id not in (None, task_id):
+        return {"error": "Job already running", "job_id": job.id}
+
+    job.status = 'running'
+    job.progress_pct = 0
+    job.error_message = None
+    if task_id:
+        job.celery_task_id = task_id
+    db.session.commit()
+    _emit_stem_event(job)
+
+    audio = Audio.query.get(job.audio_id) if job.audio_id else None
+    # separate-upload: the original still needs to go to storage
+    upload_original = audio is not None and not audio.file_url and bool(job.input_path)
+    spooled_path = job.input_path
+    temp_dir = tempfile.mkdtemp()
+    original_future = None
+
+    try:
+        if spooled_path:
+            input_path = spooled_path
+            if upload_original:
+                original_future = submit_io(_upload_original, input_path)
+        else:
+            input_path = _download_source(job.original_url, temp_dir)
+
+        if not job.content_hash:
+            job.content_hash = hash_file(input_path)
+            db.session.commit()
+        if _reuse_stems_after_original(job, audio, original_future):
+            return _job_payload(job)
+        job.cache_status = 'miss'
+
+        duration = get_audio_duration(input_path)
+        if duration and duration > MAX_DURATION_SECONDS:
+            raise RuntimeError(f"Track too long. Maximum duration is {MAX_DURATION_SECONDS // 60} minutes.")
+
+        _, _, gpu_available = check_torch_available()
+        job.device_used = "cuda" if gpu_available else "cpu"
+        job.duration_seconds = round(duration, 2) if duration else None
+        job.progress_pct = 5
+        db.session.commit()
+        _emit_stem_event(job)
+
+        def on_progress(info):
+            pct = int(5 + 0.85 * info["percent"])
+            if pct == job.progress_pct:
+                return
+            job.progress_pct = pct
+            db.session.commit()
+            _emit_stem_event(job, segment=info["segment"], segments=info["segments"])
+
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir, exist_ok=True)
+        stems = run_demucs_separation(input_path, output_dir, job.model_used, job.device_used,
+                                      progress=on_progress)
+        if not stems:
+            raise RuntimeError("Stem separation produced no output.")
+
+        job.status = 'uploading'
+        job.progress_pct = 90
+        db.session.commit()
+        _emit_stem_event(job)
+
+        stem_urls = upload_stems_to_cloud(stems, job.title, job.audio_id or job.id)
+        _apply_stem_urls(job, stem_urls)
+
+        if original_future is not None:
+            job.original_url = audio.file_url = original_future.result()
+
+        _finish_from_stems(job, stem_urls)
+        print(f"✅ Stem job {job.id} done ({len(stem_urls)} stems)")
+
+        fmt = _stem_format(stems)
+        if fmt:
+            stem_cache.store(job.content_hash, job.model_used, fmt, stem_urls,
+                             job.duration_seconds, job.id)
+        _resolve_followers(job, stems=stem_urls)
+        return _job_payload(job)
+
+    except Exception as e:
+        print(f"❌ Stem job {job_id} failed: {str(e)}")
+        traceback.print_exc()
+        db.session.rollback()
+        if upload_original:
+            # Keep the track playable if the original made it to storage
+            try:
+                if original_future is not None:
+                    audio.file_url = job.original_url = original_future.result()
+            except Exception:
+                pass
+        _fail_job(job, str(e))
+        _resolve_followers(job, error=job.error_message)
+        return {"error": job.error_message, "job_id": job.id}
+
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if spooled_path:
+            try:
+                os.remove(spooled_path)
+            except OSError:
+                pass
+
+
 # =====================================================
 # API ROUTES
 # =====================================================
@@ -283,13 +636,7 @@ def save_stem_job(user_id, audio_id, title, original_url, duration, model_name,
 def get_stem_capabilities():
     demucs_available, demucs_version = check_demucs_available()
     torch_available, torch_version, gpu_available = check_torch_available()
-
-    has_ffprobe = False
-    try:
-        result = subprocess.run(["ffprobe", "-version"], capture_output=True, timeout=5)
-        has_ffprobe = result.returncode == 0
-    except Exception:
-        pass
+    has_ffprobe = demucs_service.get_capabilities()["ffprobe_available"]
 
     return jsonify({
         "demucs_available": demucs_available,
@@ -309,7 +656,10 @@ def get_stem_capabilities():
         } for k, v in DEMUCS_MODELS.items()},
         "default_model": DEFAULT_MODEL,
         "max_file_size_mb": MAX_FILE_SIZE / (1024 * 1024),
+        "max_duration_seconds": MAX_DURATION_SECONDS,
         "allowed_formats": list(ALLOWED_EXTENSIONS),
+        "service": demucs_service.stats(),
+        "cache": stem_cache.cache_stats(),
         "status": "ready" if demucs_available else "not_installed",
     }), 200
 
@@ -317,7 +667,7 @@ def get_stem_capabilities():
 @ai_stem_separation_bp.route('/api/ai/stems/separate', methods=['POST'])
 @jwt_required()
 def separate_stems():
-    """Separate an existing track or uploaded file into stems."""
+    """Queue separation of an existing track or uploaded file (202 + job_id)."""
     user_id = get_jwt_identity()
 
     try:
@@ -332,16 +682,13 @@ def separate_stems():
         if model_name not in DEMUCS_MODELS:
             model_name = DEFAULT_MODEL
 
-        _, _, gpu_available = check_torch_available()
-        device = "cuda" if gpu_available else "cpu"
-
-        temp_dir = tempfile.mkdtemp()
         input_path = None
         audio_id = None
         original_url = None
+        content_hash = None
         title = request.form.get('title', 'Untitled')
 
-        # Option 1: Existing track
+        # Option 1: Existing track (the worker downloads it)
         if request.form.get('audio_id'):
             audio_id = int(request.form.get('audio_id'))
             audio = Audio.query.get(audio_id)
@@ -353,18 +700,7 @@ def separate_stems():
 
             title = audio.title or title
             original_url = audio.file_url
-
-            import requests as req
-            url = audio.file_url
-            url_path = url.split('?')[0]
-            input_ext = os.path.splitext(url_path)[1] or '.mp3'
-            input_path = os.path.join(temp_dir, f"input{input_ext}")
-
-            response = req.get(url, stream=True, timeout=120)
-            response.raise_for_status()
-            with open(input_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            content_hash = stem_cache.hash_for_audio(audio)
 
         # Option 2: Upload
         elif request.files.get('file'):
@@ -382,47 +718,44 @@ def separate_stems():
             if file_size > MAX_FILE_SIZE:
                 return jsonify({"error": f"File too large. Maximum is {MAX_FILE_SIZE // (1024*1024)}MB."}), 400
 
-            input_path = os.path.join(temp_dir, filename)
-            file.save(input_path)
+            input_path, content_hash = _spool_upload(file, filename)
             title = request.form.get('title', filename.rsplit('.', 1)[0])
         else:
             return jsonify({"error": "Provide either audio_id or upload a file"}), 400
 
-        duration = get_audio_duration(input_path)
-        if duration and duration > 900:
-            return jsonify({"error": "Track too long. Maximum duration is 15 minutes."}), 400
-
-        # Run Demucs
-        output_dir = os.path.join(temp_dir, "output")
-        os.makedirs(output_dir, exist_ok=True)
-        stems = run_demucs_separation(input_path, output_dir, model_name, device)
-
-        if not stems:
-            return jsonify({"error": "Stem separation produced no output."}), 500
+        job = StemSeparationJob(
+            user_id=user_id,
+            audio_id=audio_id,
+            title=title,
+            original_url=original_url,
+            model_used=model_name,
+            input_path=input_path,
+            content_hash=content_hash,
+            output_format=STEM_OUTPUT_FORMAT,
+            status='queued',
+            progress_pct=0,
+            created_at=datetime.utcnow(),
+        )
+        db.session.add(job)
+        db.session.commit()
 
-        # Upload & save
-        stem_urls = upload_stems_to_cloud(stems, title, "direct")
-        job = save_stem_job(user_id, audio_id, title, original_url, duration, model_name, device, stem_urls)
+        # Same bytes + model + format already separated (or in progress)
+        if _reuse_stems(job):
+            _discard_spool(input_path)
+            return jsonify(_job_payload(job)), 200 if job.status == 'done' else 202
 
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
+        _enqueue_stem_job(job)
 
         return jsonify({
-            "message": "🎵 Stems separated successfully!",
+            "message": "🎵 Stem separation queued",
             "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/ai/stems/job/{job.id}/progress",
             "title": title,
             "model": {"id": model_name, "name": DEMUCS_MODELS[model_name]["name"], "quality": DEMUCS_MODELS[model_name]["quality"]},
-            "device": device,
-            "duration_seconds": round(duration, 2) if duration else None,
-            "stems": stem_urls,
-            "stem_count": len(stem_urls),
             "audio_id": audio_id,
-        }), 200
+        }), 202
 
-    except RuntimeError as e:
-        return jsonify({"error": str(e)}), 500
     except Exception as e:
         print(f"❌ Stem separation error: {str(e)}")
         traceback.print_exc()
@@ -432,7 +765,7 @@ def separate_stems():
 @ai_stem_separation_bp.route('/api/ai/stems/separate-upload', methods=['POST'])
 @jwt_required()
 def upload_and_separate():
-    """Upload a new track AND separate stems in one request."""
+    """Upload a new track AND queue stem separation in one request."""
     user_id = get_jwt_identity()
 
     try:
@@ -458,81 +791,132 @@ def upload_and_separate():
         if file_size > MAX_FILE_SIZE:
             return jsonify({"error": f"File too large. Maximum is {MAX_FILE_SIZE // (1024*1024)}MB."}), 400
 
-        # Upload original
-        original_url = uploadFile(file, filename)
+        demucs_available, _ = check_demucs_available()
+        if not demucs_available:
+            # Nothing to queue — keep the old behaviour of saving the track
+            original_url = uploadFile(file, filename)
+            new_audio = Audio(
+                user_id=user_id,
+                title=title,
+                file_url=original_url,
+                processing_status='uploaded',
+                uploaded_at=datetime.utcnow()
+            )
+            db.session.add(new_audio)
+            db.session.commit()
+            return jsonify({
+                "error": "Stem separation not available yet. Track saved.",
+                "audio_id": new_audio.id,
+                "original_url": original_url,
+            }), 503
 
-        # Save to Audio table
+        # The worker uploads the original alongside the stems
+        input_path, content_hash = _spool_upload(file, filename)
         new_audio = Audio(
             user_id=user_id,
             title=title,
-            file_url=original_url,
+            file_url="",
             processing_status='separating',
             uploaded_at=datetime.utcnow()
         )
         db.session.add(new_audio)
+        db.session.flush()
+
+        job = StemSeparationJob(
+            user_id=user_id,
+            audio_id=new_audio.id,
+            title=title,
+            model_used=model_name,
+            input_path=input_path,
+            content_hash=content_hash,
+            output_format=STEM_OUTPUT_FORMAT,
+            status='queued',
+            progress_pct=0,
+            created_at=datetime.utcnow(),
+        )
+        db.session.add(job)
         db.session.commit()
+        _enqueue_stem_job(job)
 
-        # Save locally for processing
-        file.seek(0)
-        temp_dir = tempfile.mkdtemp()
-        input_path = os.path.join(temp_dir, filename)
-        file.save(input_path)
+        return jsonify({
+            "message": "🎵 Track received, stem separation queued",
+            "job_id": job.id,
+            "audio_id": new_audio.id,
+            "status": job.status,
+            "status_url": f"/api/ai/stems/job/{job.id}/progress",
+            "title": title,
+            "model": {"id": model_name, "name": DEMUCS_MODELS[model_name]["name"]},
+        }), 202
 
-        duration = get_audio_duration(input_path)
-        if duration and duration > 900:
-            new_audio.processing_status = 'error'
-            db.session.commit()
-            return jsonify({"error": "Track too long. Maximum 15 minutes."}), 400
+    except Exception as e:
+        print(f"❌ Upload & separate error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": f"Failed: {str(e)}"}), 500
 
-        demucs_available, _ = check_demucs_available()
-        if not demucs_available:
-            new_audio.processing_status = 'uploaded'
-            db.session.commit()
-            return jsonify({
-                "error": "Stem separation not available yet. Track saved.",
-                "audio_id": new_audio.id,
-                "original_url": original_url,
-            }), 503
 
-        _, _, gpu_available = check_torch_available()
-        device = "cuda" if gpu_available else "cpu"
+@ai_stem_separation_bp.route('/api/ai/stems/job/<int:job_id>/progress', methods=['GET'])
+@jwt_required()
+def get_stem_job_progress(job_id):
+    """Poll a queued/running stem job (Socket.IO 'stem_job_update' pushes the same state)."""
+    user_id = get_jwt_identity()
 
-        output_dir = os.path.join(temp_dir, "output")
-        os.makedirs(output_dir, exist_ok=True)
-        stems = run_demucs_separation(input_path, output_dir, model_name, device)
+    try:
+        job = StemSeparationJob.query.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        if str(job.user_id) != str(user_id):
+            return jsonify({"error": "Unauthorized"}), 403
 
-        if not stems:
-            new_audio.processing_status = 'error'
-            db.session.commit()
-            return jsonify({"error": "Stem separation produced no output."}), 500
+        return jsonify(_job_payload(job)), 200
 
-        stem_urls = upload_stems_to_cloud(stems, title, new_audio.id)
-        job = save_stem_job(user_id, new_audio.id, title, original_url, duration, model_name, device, stem_urls)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        new_audio.processing_status = 'separated'
-        new_audio.last_processed_at = datetime.utcnow()
-        db.session.commit()
 
-        try:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        except Exception:
-            pass
+@ai_stem_separation_bp.route('/api/ai/stems/job/<int:job_id>/stems/<stem_name>', methods=['GET'])
+@jwt_required()
+def get_stem_variant(job_id, stem_name):
+    """
+    One stem in a delivery format (?format=mp3|ogg|wav|flac). The first
+    request starts building it from the lossless master and returns 202;
+    poll the same URL until it answers 200 with the url (?redirect=1
+    sends a 302 once it's ready).
+    """
+    user_id = get_jwt_identity()
 
-        return jsonify({
-            "message": "🎵 Track uploaded and stems separated!",
-            "job_id": job.id,
-            "audio_id": new_audio.id,
-            "title": title,
-            "original_url": original_url,
-            "model": {"id": model_name, "name": DEMUCS_MODELS[model_name]["name"]},
-            "device": device,
-            "duration_seconds": round(duration, 2) if duration else None,
-            "stems": stem_urls,
-            "stem_count": len(stem_urls),
-        }), 201
+    try:
+        job = StemSeparationJob.query.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        if str(job.user_id) != str(user_id):
+            return jsonify({"error": "Unauthorized"}), 403
+
+        master_url = job.serialize()["stems"].get(stem_name, {}).get("url")
+        if not master_url:
+            return jsonify({"error": f"Stem not found: {stem_name}"}), 404
+
+        fmt = request.args.get('format', 'mp3').lower()
+        if fmt != stem_variants.MASTER_FORMAT and fmt not in stem_variants.VARIANT_FORMATS:
+            return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+
+        payload = {"job_id": job.id, "stem": stem_name, "format": fmt}
+        url = stem_variants.find_variant(master_url, fmt)
+        if url is None:
+            error = stem_variants.request_variant(master_url, fmt)
+            if error:
+                return jsonify({**payload, "status": "error", "error": f"Transcode failed: {error}"}), 500
+            response = jsonify({**payload, "status": "building", "poll_url": request.full_path.rstrip('?')})
+            response.headers['Location'] = request.full_path.rstrip('?')
+            response.headers['Retry-After'] = '2'
+            return response, 202
+
+        if request.args.get('redirect'):
+            return redirect(url, code=302)
+
+        return jsonify({**payload, "status": "ready", "url": url}), 200
 
     except Exception as e:
-        print(f"❌ Upload & separate error: {str(e)}")
+        print(f"❌ Stem variant error: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": f"Failed: {str(e)}"}), 500
 
@@ -0,0 +1,267 @@
+# src/api/analysis_cache.py
+# =====================================================
+# CONTENT-ADDRESSED ANALYSIS CACHE — StreamPireX
+# =====================================================
+# Analyzer results keyed by (sha256 of the audio bytes,
+# analyzer name). Each row also records the analyzer
+# version; a version bump makes old rows a miss, and the
+# next store overwrites them.
+#
+# Two tiers:
+#   1. In-process LRU (ANALYSIS_CACHE_SIZE entries)
+#   2. audio_analysis table (persisted alongside Audio)
+#
+# Callers that know the source (audio_id / file_url) can
+# look up by source first and skip the download entirely.
+# =====================================================
+
+import copy
+import hashlib
+import math
+import os
+import threading
+import traceback
+from collections import OrderedDict
+
+from api.models import db, AudioAnalysis
+
+ANALYSIS_CACHE_SIZE = int(os.environ.get("ANALYSIS_CACHE_SIZE", "512"))
+_HASH_CHUNK = 1024 * 1024
+
+
+class LRUCache:
+    """Small thread-safe LRU with hit/miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+_memory = LRUCache(ANALYSIS_CACHE_SIZE)
+
+
+# =====================================================
+# HASHING
+# =====================================================
+
+def hash_file(path):
+    """sha256 of a file's bytes (no decode)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# =====================================================
+# LOOKUPS
+# =====================================================
+
+def _key(analyzer, version, content_hash):
+    return (analyzer, version, content_hash)
+
+
+def get_cached_analysis(analyzer, version, content_hash):
+    """Return a copy of the cached result or None."""
+    key = _key(analyzer, version, content_hash)
+    hit = _memory.get(key)
+    if hit is not None:
+        return copy.deepcopy(hit)
+
+    try:
+        row = AudioAnalysis.query.filter_by(content_hash=content_hash, analyzer=analyzer).first()
+        if not row or row.analyzer_version != version:
+            return None
+        row.hit_count = (row.hit_count or 0) + 1
+        db.session.commit()
+        _memory.put(key, row.result)
+        return copy.deepcopy(row.result)
+    except Exception as e:
+        print(f"⚠️ Analysis cache lookup failed: {e}")
+        db.session.rollback()
+        return None
+
+
+def lookup_by_source(analyzer, version, audio_id=None, source_url=None):
+    """
+    Find a cached result without touching the audio at all.
+    Matches on audio_id + source_url when both are known, so a
+    replaced upload (new file_url) is a miss.
+    """
+    if not audio_id and not source_url:
+        return None
+    try:
+        query = AudioAnalysis.query.filter_by(analyzer=analyzer, analyzer_version=version)
+        if audio_id:
+            query = query.filter_by(audio_id=audio_id)
+        if source_url:
+            query = query.filter_by(source_url=source_url)
+        row = query.order_by(AudioAnalysis.updated_at.desc()).first()
+        if not row:
+            return None
+        return get_cached_analysis(analyzer, version, row.content_hash)
+    except Exception as e:
+        print(f"⚠️ Analysis cache source lookup failed: {e}")
+        db.session.rollback()
+        return None
+
+
+def lookup_many_by_audio(analyzer, version, audios):
+    """Batch lookup for Audio rows → {audio_id: result}. Never computes."""
+    by_id = {a.id: a for a in audios if a is not None}
+    if not by_id:
+        return {}
+    try:
+        rows = AudioAnalysis.query.filter(
+            AudioAnalysis.analyzer == analyzer,
+            AudioAnalysis.analyzer_version == version,
+            AudioAnalysis.audio_id.in_(list(by_id.keys())),
+        ).all()
+    except Exception as e:
+        print(f"⚠️ Analysis cache batch lookup failed: {e}")
+        db.session.rollback()
+        return {}
+
+    results = {}
+    for row in rows:
+        audio = by_id.get(row.audio_id)
+        if audio is None or (row.source_url and row.source_url != audio.file_url):
+            continue
+        results[row.audio_id] = copy.deepcopy(row.result)
+    return results
+
+
+# =====================================================
+# STORE
+# =====================================================
+
+def _json_safe(value):
+    """
+    numpy scalars/arrays → plain Python so the JSON column accepts them.
+    NaN/inf become None (Postgres rejects them as JSON tokens).
+    """
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if hasattr(value, "tolist"):
+        return _json_safe(value.tolist())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def store_analysis(analyzer, version, content_hash, result, audio_id=None, source_url=None):
+    """Persist a result (overwriting rows from older analyzer versions)."""
+    result = _json_safe(result)
+    _memory.put(_key(analyzer, version, content_hash), copy.deepcopy(result))
+    try:
+        row = AudioAnalysis.query.filter_by(content_hash=content_hash, analyzer=analyzer).first()
+        if row is None:
+            row = AudioAnalysis(content_hash=content_hash, analyzer=analyzer, hit_count=0)
+            db.session.add(row)
+        row.analyzer_version = version
+        row.result = result
+        if audio_id:
+            row.audio_id = audio_id
+        if source_url:
+            row.source_url = source_url
+        db.session.commit()
+    except Exception as e:
+        print(f"⚠️ Analysis cache store failed: {e}")
+        db.session.rollback()
+
+
+def cached_analysis(analyzer, version, file_path, compute, audio_id=None, source_url=None,
+                    content_hash=None):
+    """
+    Hash the file, return the cached result if present, otherwise
+    run compute(file_path) and store it. Results containing an
+    "error" key (or None) are never cached.
+
+    Returns (result, content_hash, was_cached).
+    """
+    content_hash = content_hash or hash_file(file_path)
+
+    cached = get_cached_analysis(analyzer, version, content_hash)
+    if cached is not None:
+        if audio_id or source_url:
+            remember_source(analyzer, content_hash, audio_id, source_url)
+        return cached, content_hash, True
+
+    result = compute(file_path)
+    if result is None or (isinstance(result, dict) and "error" in result):
+        return result, content_hash, False
+
+    try:
+        store_analysis(analyzer, version, content_hash, result, audio_id, source_url)
+    except Exception:
+        traceback.print_exc()
+    return copy.deepcopy(result), content_hash, False
+
+
+def remember_source(analyzer, content_hash, audio_id, source_url):
+    """Point an existing row at the latest audio_id / URL it was seen under."""
+    try:
+        row = AudioAnalysis.query.filter_by(content_hash=content_hash, analyzer=analyzer).first()
+        if not row:
+            return
+        changed = False
+        if audio_id and row.audio_id != audio_id:
+            row.audio_id = audio_id
+            changed = True
+        if source_url and row.source_url != source_url:
+            row.source_url = source_url
+            changed = True
+        if changed:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def invalidate(analyzer, content_hash, version):
+    """Drop one entry from both tiers."""
+    _memory.discard(_key(analyzer, version, content_hash))
+    try:
+        AudioAnalysis.query.filter_by(content_hash=content_hash, analyzer=analyzer).delete()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def cache_stats():
+    return _memory.stats()
@@ -0,0 +1,124 @@
+# src/api/audio_features.py
+# =====================================================
+# SHARED FEATURE ENGINE — StreamPireX
+# =====================================================
+# One magnitude STFT + one CQT per track. Every spectral
+# feature, the beat tracker's onset envelope and the
+# band-energy ratios are derived from those two transforms
+# instead of each librosa helper re-computing its own.
+#
+# Used by: ai_mastering_phase3.analyze_track
+# =====================================================
+
+import numpy as np
+import librosa
+
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# chroma_cqt defaults: 7 octaves at 36 bins/octave from C1
+CQT_BINS_PER_OCTAVE = 36
+CQT_OCTAVES = 7
+
+# (low, high) in Hz — high is exclusive except for "high"
+BAND_RANGES = {
+    "sub": (20, 60),
+    "bass": (20, 250),
+    "mid": (250, 4000),
+    "high": (4000, 20000),
+    "presence": (1000, 5000),
+}
+
+
+def compute_spectra(y, sr, n_fft=N_FFT, hop_length=HOP_LENGTH, with_cqt=True):
+    """
+    Compute the shared transforms for a mono signal.
+
+    Returns dict with:
+    - S: magnitude spectrogram (1 + n_fft/2, frames)
+    - freqs: center frequency of each STFT bin
+    - C: CQT magnitude (or None when with_cqt=False)
+    """
+    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+
+    C = None
+    if with_cqt:
+        C = np.abs(librosa.cqt(
+            y=y, sr=sr, hop_length=hop_length,
+            fmin=librosa.note_to_hz('C1'),
+            n_bins=CQT_OCTAVES * CQT_BINS_PER_OCTAVE,
+            bins_per_octave=CQT_BINS_PER_OCTAVE,
+        ))
+
+    return {"S": S, "freqs": freqs, "C": C, "sr": sr,
+            "n_fft": n_fft, "hop_length": hop_length}
+
+
+def band_means(S, freqs, bands=BAND_RANGES):
+    """Mean magnitude inside each band, taken from an existing spectrogram."""
+    energies = {}
+    for name, (lo, hi) in bands.items():
+        if name == "high":
+            mask = (freqs >= lo) & (freqs <= hi)
+        else:
+            mask = (freqs >= lo) & (freqs < hi)
+        energies[name] = float(np.mean(S[mask, :])) if np.any(mask) else 0
+    return energies
+
+
+def extract_features(y, sr, spectra=None):
+    """
+    Derive every analysis feature from a single set of spectra.
+
+    Returns a flat dict of raw (unrounded) values consumed by
+    analyze_track. Pass `spectra` to reuse transforms already
+    computed by the caller.
+    """
+    spectra = spectra or compute_spectra(y, sr)
+    S = spectra["S"]
+    freqs = spectra["freqs"]
+    n_fft = spectra["n_fft"]
+    hop_length = spectra["hop_length"]
+
+    # ── Tempo: onset envelope from the mel projection of S ──
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr, n_fft=n_fft)
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel, ref=np.max),
+                                             sr=sr, hop_length=hop_length)
+    tempo, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr,
+                                                 hop_length=hop_length)
+    bpm = float(tempo[0]) if hasattr(tempo, '__len__') else float(tempo)
+
+    # ── Chroma from the shared CQT ──
+    C = spectra["C"]
+    if C is None:
+        chroma = librosa.feature.chroma_stft(S=S ** 2, sr=sr, n_fft=n_fft)
+    else:
+        chroma = librosa.feature.chroma_cqt(C=C, sr=sr, hop_length=hop_length,
+                                            bins_per_octave=CQT_BINS_PER_OCTAVE,
+                                            n_octaves=CQT_OCTAVES)
+
+    # ── Loudness / spectral shape ──
+    # RMS stays time-domain: rms(S=...) applies the STFT window and reads ~4.3 dB low
+    rms = librosa.feature.rms(y=y, frame_length=n_fft, hop_length=hop_length)[0]
+    centroid = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=n_fft, freq=freqs)
+    rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr, n_fft=n_fft, freq=freqs,
+                                               roll_percent=0.85)
+    bandwidth = librosa.feature.spectral_bandwidth(S=S, sr=sr, n_fft=n_fft, freq=freqs)
+
+    # ZCR is likewise a time-domain count
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=n_fft, hop_length=hop_length)
+
+    return {
+        "duration": float(len(y)) / sr if sr else 0.0,
+        "bpm": bpm,
+        "beat_frames": beat_frames,
+        "chroma": chroma,
+        "rms": rms,
+        "peak": float(np.max(np.abs(y))) if len(y) else 0.0,
+        "spectral_centroid": float(np.mean(centroid)),
+        "spectral_rolloff": float(np.mean(rolloff)),
+        "spectral_bandwidth": float(np.mean(bandwidth)),
+        "zero_crossing_rate": float(np.mean(zcr)),
+        "bands": band_means(S, freqs),
+    }
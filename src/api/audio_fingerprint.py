@@ -0,0 +1,418 @@
+# src/api/audio_fingerprint.py
+# =====================================================
+# PERCEPTUAL AUDIO FINGERPRINTS — StreamPireX
+# =====================================================
+# Landmark fingerprints (spectral-peak pairs) that catch
+# re-uploads exact SHA-256 checks miss: re-encodes, other
+# bitrates/formats, trimmed intros and outros.
+#
+#   1. Mono 8 kHz → log-magnitude STFT (128 ms / 32 ms hop)
+#   2. Local spectral peaks, capped per second
+#   3. Each peak paired with the next few peaks after it:
+#      hash = (f1, f2, Δt) packed into one int
+#   4. Rows in audio_fingerprint_landmarks, indexed by hash
+#
+# Lookup only reads index rows that share a hash with the
+# query, then scores each candidate by how many hits agree
+# on a single time offset (a trim shifts every offset by
+# the same amount, random collisions don't line up).
+#
+# POST /api/audio/fingerprint/lookup — file or audio_url
+# =====================================================
+
+import ipaddress
+import os
+import socket
+import tempfile
+import traceback
+from math import gcd
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+import soundfile as sf
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from scipy import ndimage, signal
+
+from api.models import db, Audio, AudioFingerprint, AudioFingerprintLandmark
+from api.audio_loader import load_audio
+
+audio_fingerprint_bp = Blueprint('audio_fingerprint', __name__)
+
+FINGERPRINT_VERSION = "1"
+
+FP_SAMPLE_RATE = 8000
+FP_N_FFT = 1024
+FP_HOP = 256
+FP_MAX_SECONDS = 900
+PEAK_FREQ_NEIGHBORHOOD = 15   # bins
+PEAK_TIME_NEIGHBORHOOD = 9    # frames
+PEAK_FLOOR_DB = -60.0         # relative to the loudest bin
+PEAKS_PER_SECOND = 12
+FAN_OUT = 6
+MAX_PAIR_FRAMES = 63          # 6 bits
+MAX_FREQ_BIN = 511            # 9 bits
+
+MIN_ALIGNED_MATCHES = int(os.environ.get("AUDIO_FINGERPRINT_MIN_MATCHES", "50"))
+MIN_MATCH_RATIO = float(os.environ.get("AUDIO_FINGERPRINT_MIN_RATIO", "0.05"))
+LOOKUP_CHUNK = 500
+
+_KEY_SHIFT = 1 << 21          # (fingerprint_id, offset delta) packed for np.unique
+_DELTA_BIAS = 1 << 20
+
+
+# =====================================================
+# LANDMARK EXTRACTION
+# =====================================================
+
+def _empty():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+
+def landmarks_from_samples(y, sr):
+    """(hashes, offsets) int64 arrays for mono float samples at any rate."""
+    y = np.asarray(y, dtype=np.float32)
+    if sr != FP_SAMPLE_RATE:
+        g = gcd(int(sr), FP_SAMPLE_RATE)
+        y = signal.resample_poly(y, FP_SAMPLE_RATE // g, int(sr) // g).astype(np.float32)
+    y = y[:FP_MAX_SECONDS * FP_SAMPLE_RATE]
+    if len(y) < FP_N_FFT:
+        return _empty()
+
+    _, _, Z = signal.stft(y, nperseg=FP_N_FFT, noverlap=FP_N_FFT - FP_HOP,
+                          boundary=None, padded=False)
+    S = 20 * np.log10(np.abs(Z[:MAX_FREQ_BIN + 1]) + 1e-10)  # (freq, time)
+
+    local_max = ndimage.maximum_filter(S, size=(PEAK_FREQ_NEIGHBORHOOD, PEAK_TIME_NEIGHBORHOOD),
+                                       mode="constant", cval=-np.inf)
+    peaks = (S == local_max) & (S > S.max() + PEAK_FLOOR_DB)
+    peaks[0] = False  # DC
+    f, t = np.nonzero(peaks)
+    if len(f) < 2:
+        return _empty()
+
+    # Keep the strongest PEAKS_PER_SECOND peaks in each second
+    amp = S[f, t]
+    bucket = (t * FP_HOP // FP_SAMPLE_RATE).astype(np.int64)
+    order = np.lexsort((-amp, bucket))
+    f, t, bucket = f[order], t[order], bucket[order]
+    rank = np.arange(len(bucket)) - np.searchsorted(bucket, bucket, side="left")
+    keep = rank < PEAKS_PER_SECOND
+    f, t = f[keep].astype(np.int64), t[keep].astype(np.int64)
+
+    order = np.lexsort((f, t))
+    f, t = f[order], t[order]
+
+    hashes, offsets = [], []
+    for k in range(1, FAN_OUT + 1):
+        if k >= len(t):
+            break
+        dt = t[k:] - t[:-k]
+        ok = dt <= MAX_PAIR_FRAMES
+        hashes.append((f[:-k][ok] << 15) | (f[k:][ok] << 6) | dt[ok])
+        offsets.append(t[:-k][ok])
+    if not hashes:
+        return _empty()
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+
+def _fingerprint(y, sr):
+    hashes, offsets = landmarks_from_samples(y, sr)
+    return {
+        "hashes": hashes,
+        "offsets": offsets,
+        "duration_seconds": round(len(y) / float(sr), 2) if sr else 0.0,
+    }
+
+
+def fingerprint_file(path):
+    """Fingerprint a local file (decoded through the shared audio loader)."""
+    y, sr = load_audio(path).get(sr=FP_SAMPLE_RATE, mono=True)
+    return _fingerprint(y, sr)
+
+
+def fingerprint_stream(stream):
+    """Fingerprint an upload stream in place; seekable streams are rewound."""
+    start = stream.tell()
+    try:
+        data, sr = sf.read(stream, dtype="float32", always_2d=True)
+        return _fingerprint(data.mean(axis=1), sr)
+    except (sf.LibsndfileError, RuntimeError):
+        # Containers libsndfile can't parse → temp file + ffmpeg path
+        stream.seek(start)
+        fd, tmp_path = tempfile.mkstemp(suffix=".audio")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(stream.read())
+            return fingerprint_file(tmp_path)
+        finally:
+            os.remove(tmp_path)
+    finally:
+        stream.seek(start)
+
+
+# =====================================================
+# INDEX
+# =====================================================
+
+def index_fingerprint(fingerprint, source_type, source_id, user_id=None, content_hash=None):
+    """
+    Store a fingerprint and its landmarks in the current session
+    (caller commits). Replaces any previous fingerprint for the source.
+    """
+    remove_fingerprints(source_type, source_id)
+
+    pairs = np.unique(np.stack([fingerprint["hashes"], fingerprint["offsets"]]), axis=1) \
+        if len(fingerprint["hashes"]) else np.zeros((2, 0), dtype=np.int64)
+
+    record = AudioFingerprint(
+        content_hash=content_hash,
+        source_type=source_type,
+        source_id=int(source_id),
+        user_id=int(user_id) if user_id is not None else None,
+        duration_seconds=fingerprint.get("duration_seconds"),
+        landmark_count=int(pairs.shape[1]),
+        algorithm_version=FINGERPRINT_VERSION,
+    )
+    db.session.add(record)
+    db.session.flush()
+
+    if pairs.shape[1]:
+        db.session.execute(
+            AudioFingerprintLandmark.__table__.insert(),
+            [{"hash": int(h), "fingerprint_id": record.id, "time_offset": int(o)}
+             for h, o in zip(pairs[0], pairs[1])],
+        )
+    return record
+
+
+def remove_fingerprints(source_type, source_id):
+    stale = AudioFingerprint.query.filter_by(source_type=source_type, source_id=int(source_id)).all()
+    for record in stale:
+        AudioFingerprintLandmark.query.filter_by(fingerprint_id=record.id).delete(synchronize_session=False)
+        db.session.delete(record)
+
+
+# =====================================================
+# LOOKUP
+# =====================================================
+
+def _postings(hashes):
+    """Index rows for the given hashes → (hash, fingerprint_id, time_offset) arrays."""
+    unique = np.unique(hashes)
+    rows = []
+    for i in range(0, len(unique), LOOKUP_CHUNK):
+        chunk = [int(h) for h in unique[i:i + LOOKUP_CHUNK]]
+        rows.extend(
+            db.session.query(AudioFingerprintLandmark.hash,
+                             AudioFingerprintLandmark.fingerprint_id,
+                             AudioFingerprintLandmark.time_offset)
+            .filter(AudioFingerprintLandmark.hash.in_(chunk))
+            .all()
+        )
+    if not rows:
+        return None
+    arr = np.asarray(rows, dtype=np.int64)
+    return arr[:, 0], arr[:, 1], arr[:, 2]
+
+
+def _aligned_scores(hashes, offsets, postings):
+    """
+    Best offset-aligned hit count per candidate fingerprint.
+    Returns {fingerprint_id: (aligned_hits, offset_delta_frames)}.
+    """
+    db_hash, db_fid, db_off = postings
+
+    order = np.argsort(hashes, kind="stable")
+    q_hash, q_off = hashes[order], offsets[order]
+    lo = np.searchsorted(q_hash, db_hash, side="left")
+    counts = np.searchsorted(q_hash, db_hash, side="right") - lo
+    total = int(counts.sum())
+    if total == 0:
+        return {}
+
+    # Every (posting, query landmark) pair sharing a hash
+    row = np.repeat(np.arange(len(db_hash)), counts)
+    q_idx = np.repeat(lo, counts) + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+    delta = db_off[row] - q_off[q_idx]
+
+    keys, hits = np.unique(db_fid[row] * _KEY_SHIFT + (delta + _DELTA_BIAS), return_counts=True)
+
+    # Allow ±1 frame of jitter from re-encoding
+    smoothed = hits.copy()
+    for step in (-1, 1):
+        pos = np.searchsorted(keys, keys + step)
+        pos = np.minimum(pos, len(keys) - 1)
+        smoothed += np.where(keys[pos] == keys + step, hits[pos], 0)
+
+    fids = keys // _KEY_SHIFT
+    scores = {}
+    for fid, key, score in zip(fids.tolist(), keys.tolist(), smoothed.tolist()):
+        if score > scores.get(fid, (0, 0))[0]:
+            scores[fid] = (score, key % _KEY_SHIFT - _DELTA_BIAS)
+    return scores
+
+
+def find_matches(fingerprint, limit=5, content_hash=None):
+    """
+    Candidate fingerprints for a query, best first. Exact content-hash
+    matches are returned first with match_ratio 1.0.
+    """
+    matches = []
+    seen = set()
+
+    if content_hash:
+        for record in AudioFingerprint.query.filter_by(content_hash=content_hash).limit(limit).all():
+            matches.append({**record.serialize(), "aligned_matches": record.landmark_count or 0,
+                            "match_ratio": 1.0, "offset_seconds": 0.0, "exact": True})
+            seen.add(record.id)
+
+    hashes, offsets = fingerprint["hashes"], fingerprint["offsets"]
+    if len(hashes) == 0 or len(matches) >= limit:
+        return matches[:limit]
+
+    postings = _postings(hashes)
+    if postings is None:
+        return matches
+
+    scores = _aligned_scores(hashes, offsets, postings)
+    ranked = sorted(((s, fid, d) for fid, (s, d) in scores.items()
+                     if s >= MIN_ALIGNED_MATCHES and fid not in seen), reverse=True)
+    ranked = ranked[:limit * 4]
+    if not ranked:
+        return matches
+
+    records = {r.id: r for r in AudioFingerprint.query.filter(
+        AudioFingerprint.id.in_([fid for _, fid, _ in ranked])).all()}
+    query_count = len(np.unique(np.stack([hashes, offsets]), axis=1)[0])
+
+    for score, fid, delta in ranked:
+        record = records.get(fid)
+        if record is None:
+            continue
+        ratio = score / float(max(1, min(query_count, record.landmark_count or query_count)))
+        if ratio < MIN_MATCH_RATIO:
+            continue
+        matches.append({**record.serialize(), "aligned_matches": int(score),
+                        "match_ratio": round(min(ratio, 1.0), 4),
+                        "offset_seconds": round(delta * FP_HOP / FP_SAMPLE_RATE, 2),
+                        "exact": False})
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def find_duplicate(fingerprint, content_hash=None, exclude_user_id=None):
+    """Best match (optionally ignoring one user's own uploads), or None."""
+    for match in find_matches(fingerprint, limit=5, content_hash=content_hash):
+        if exclude_user_id is not None and match["user_id"] == int(exclude_user_id):
+            continue
+        return match
+    return None
+
+
+# =====================================================
+# REMOTE AUDIO (storage URLs only)
+# =====================================================
+
+LOOKUP_MAX_BYTES = int(os.environ.get("FINGERPRINT_LOOKUP_MAX_MB", "100")) * 1024 * 1024
+
+
+def _allowed_hosts():
+    hosts = {"res.cloudinary.com"}
+    public = os.environ.get("R2_PUBLIC_URL", "")
+    if public:
+        hosts.add((urlparse(public).hostname or "").lower())
+    extra = os.environ.get("FINGERPRINT_ALLOWED_HOSTS", "")
+    hosts.update(h.strip().lower() for h in extra.split(",") if h.strip())
+    hosts.discard("")
+    return hosts
+
+
+def _check_storage_url(url):
+    """Only https URLs on our media storage hosts, resolving to public addresses."""
+    parsed = urlparse(url or "")
+    host = (parsed.hostname or "").lower()
+    if parsed.scheme != "https" or not host:
+        raise ValueError("audio_url must be an https media storage URL")
+    if host not in _allowed_hosts() and not host.endswith(".r2.dev"):
+        raise ValueError("audio_url must point at StreamPireX media storage")
+
+    try:
+        infos = socket.getaddrinfo(host, parsed.port or 443, proto=socket.IPPROTO_TCP)
+    except socket.gaierror:
+        raise ValueError("audio_url host does not resolve")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0])
+        if not address.is_global:
+            raise ValueError("audio_url resolves to a non-public address")
+
+
+def _download_storage_audio(url, path):
+    _check_storage_url(url)
+    # No redirects: a storage host must not bounce us somewhere unchecked
+    with requests.get(url, stream=True, timeout=120, allow_redirects=False) as resp:
+        if resp.is_redirect:
+            raise ValueError("audio_url redirects are not followed")
+        resp.raise_for_status()
+        if int(resp.headers.get("Content-Length") or 0) > LOOKUP_MAX_BYTES:
+            raise ValueError("audio is too large to fingerprint")
+        written = 0
+        with open(path, "wb") as f:
+            for chunk in resp.iter_content(chunk_size=1024 * 1024):
+                written += len(chunk)
+                if written > LOOKUP_MAX_BYTES:
+                    raise ValueError("audio is too large to fingerprint")
+                f.write(chunk)
+
+
+# =====================================================
+# ROUTES
+# =====================================================
+
+@audio_fingerprint_bp.route('/api/audio/fingerprint/lookup', methods=['POST'])
+@jwt_required()
+def lookup_fingerprint():
+    """
+    Find uploads that sound like the given audio.
+    Multipart 'file', or JSON { audio_id } / { audio_url } — URLs must be
+    on our media storage (R2 / Cloudinary / FINGERPRINT_ALLOWED_HOSTS).
+    Optional ?limit= (max 20).
+    """
+    try:
+        limit = min(max(request.args.get('limit', 5, type=int), 1), 20)
+
+        upload = request.files.get('file')
+        if upload and upload.filename:
+            fingerprint = fingerprint_stream(upload.stream)
+        else:
+            data = request.get_json(silent=True) or {}
+            audio_url = data.get('audio_url')
+            if data.get('audio_id'):
+                audio = Audio.query.get(data['audio_id'])
+                if not audio:
+                    return jsonify({"error": "Audio not found"}), 404
+                audio_url = audio.file_url
+            if not audio_url:
+                return jsonify({"error": "Provide a file, audio_id or audio_url"}), 400
+            with tempfile.TemporaryDirectory() as temp_dir:
+                path = os.path.join(temp_dir, "lookup_audio")
+                try:
+                    _download_storage_audio(audio_url, path)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                fingerprint = fingerprint_file(path)
+
+        matches = find_matches(fingerprint, limit=limit)
+        return jsonify({
+            "success": True,
+            "landmarks": int(len(fingerprint["hashes"])),
+            "duration_seconds": fingerprint["duration_seconds"],
+            "matches": matches,
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Fingerprint lookup error: {e}")
+        traceback.print_exc()
+        return jsonify({"error": f"Fingerprint lookup failed: {str(e)}"}), 500
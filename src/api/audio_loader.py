@@ -0,0 +1,279 @@
+# src/api/audio_loader.py
+# =====================================================
+# DECODE-ONCE AUDIO LOADER — StreamPireX
+# =====================================================
+# One decode per file per request/job, shared by every
+# stage that needs the samples:
+#
+#   - WAV (PCM16/32, float32): np.memmap over the data
+#     chunk — float32 files are never copied
+#   - Anything libsndfile reads (FLAC, OGG, AIFF, ...):
+#     soundfile
+#   - Everything else (MP3, M4A, ...): a single ffmpeg
+#     pipe to float32
+#
+# DecodedAudio.get(sr, mono) hands out lazily computed,
+# cached views (mono downmix first, then resample — the
+# same order librosa.load uses, so results match it).
+#
+# Registry scope: flask.g inside a request, or an
+# explicit `with audio_session():` block for jobs.
+# Outside both, load_audio() simply decodes.
+# =====================================================
+
+import contextvars
+import os
+import struct
+import subprocess
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import soundfile as sf
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_session_registry = contextvars.ContextVar("audio_loader_registry", default=None)
+
+
+class DecodedAudio:
+    """Decoded samples at the native rate plus cached derived views."""
+
+    def __init__(self, path, data, sample_rate):
+        self.path = path
+        # (channels, samples), float32, read-only — views are shared
+        self.data = data
+        self.sample_rate = int(sample_rate)
+        self._views = {}
+        self._lock = threading.Lock()
+
+    @property
+    def channels(self):
+        return int(self.data.shape[0])
+
+    @property
+    def frames(self):
+        return int(self.data.shape[1])
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+    def get(self, sr=None, mono=False):
+        """
+        (y, sr) like librosa.load: mono → 1-D, otherwise (channels, samples)
+        (1-D for single-channel files). sr=None keeps the native rate.
+        """
+        target_sr = int(sr) if sr else self.sample_rate
+        key = (target_sr, bool(mono))
+        with self._lock:
+            if key in self._views:
+                return self._views[key], target_sr
+
+        if mono:
+            y = self.data[0] if self.channels == 1 else np.mean(self.data, axis=0, dtype=np.float32)
+        else:
+            y = self.data[0] if self.channels == 1 else self.data
+
+        if target_sr != self.sample_rate:
+            import librosa
+            y = librosa.resample(np.ascontiguousarray(y), orig_sr=self.sample_rate,
+                                 target_sr=target_sr, axis=-1).astype(np.float32, copy=False)
+
+        if y.flags.writeable:
+            y.flags.writeable = False
+        with self._lock:
+            self._views[key] = y
+        return y, target_sr
+
+
+# =====================================================
+# DECODERS
+# =====================================================
+
+def _wav_memmap(path):
+    """Map a plain PCM16/PCM32/float32 WAV's data chunk. None if not applicable."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+                return None
+            fmt = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+                if chunk_id == b"fmt ":
+                    body = f.read(size)
+                    tag, channels, rate = struct.unpack("<HHI", body[:8])
+                    bits = struct.unpack("<H", body[14:16])[0]
+                    if tag == _WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        tag = struct.unpack("<H", body[24:26])[0]
+                    fmt = (tag, channels, rate, bits)
+                    if size % 2:
+                        f.seek(1, os.SEEK_CUR)
+                elif chunk_id == b"data":
+                    if fmt is None:
+                        return None
+                    offset = f.tell()
+                    break
+                else:
+                    f.seek(size + (size % 2), os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+
+    tag, channels, rate, bits = fmt
+    dtype = {
+        (_WAVE_FORMAT_PCM, 16): np.int16,
+        (_WAVE_FORMAT_PCM, 32): np.int32,
+        (_WAVE_FORMAT_IEEE_FLOAT, 32): np.float32,
+    }.get((tag, bits))
+    if dtype is None or channels < 1:
+        return None
+
+    frame_bytes = channels * np.dtype(dtype).itemsize
+    available = os.path.getsize(path) - offset
+    frames = min(size, available) // frame_bytes  # size can be 0/garbage on streamed WAVs
+    if size in (0, 0xFFFFFFFF):
+        frames = available // frame_bytes
+    if frames <= 0:
+        return None
+
+    raw = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+    if dtype is np.float32:
+        data = raw.T
+    else:
+        scale = 1.0 / float(np.iinfo(dtype).max + 1)
+        data = (raw.T.astype(np.float32) * np.float32(scale))
+    return data, rate
+
+
+def _soundfile_read(path):
+    try:
+        data, rate = sf.read(path, dtype="float32", always_2d=True)
+    except Exception:
+        return None
+    return np.ascontiguousarray(data.T), rate
+
+
+def probe_audio_info(path):
+    """(sample_rate, channels, duration_seconds) from headers only, or None."""
+    try:
+        info = sf.info(path)
+        return int(info.samplerate), int(info.channels), float(info.duration)
+    except Exception:
+        pass
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "quiet", "-select_streams", "a:0",
+             "-show_entries", "stream=sample_rate,channels:format=duration",
+             "-of", "default=noprint_wrappers=1", path],
+            capture_output=True, text=True, timeout=30
+        )
+        if result.returncode != 0:
+            return None
+        fields = dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+        return int(fields["sample_rate"]), int(fields["channels"]), float(fields.get("duration", 0) or 0)
+    except Exception:
+        return None
+
+
+def _ffmpeg_read(path):
+    """Decode anything ffmpeg understands through one pipe at the native rate/layout."""
+    info = probe_audio_info(path)
+    if info is None:
+        return None
+    rate, channels, _ = info
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-v", "error", "-i", path, "-map", "0:a:0",
+             "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(channels), "-ar", str(rate), "-"],
+            capture_output=True, timeout=600
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    samples = np.frombuffer(result.stdout, dtype=np.float32)
+    samples = samples[: len(samples) - (len(samples) % channels)]
+    return np.ascontiguousarray(samples.reshape(-1, channels).T), rate
+
+
+def decode(path):
+    """Decode a file once using the fastest available path."""
+    decoded = _wav_memmap(path) or _soundfile_read(path) or _ffmpeg_read(path)
+    if decoded is None:
+        import librosa
+        y, rate = librosa.load(path, sr=None, mono=False)
+        decoded = (y.reshape(1, -1) if y.ndim == 1 else y).astype(np.float32, copy=False), rate
+
+    data, rate = decoded
+    if data.flags.writeable:
+        data.flags.writeable = False
+    return DecodedAudio(path, data, rate)
+
+
+# =====================================================
+# REGISTRY
+# =====================================================
+
+def _current_registry():
+    registry = _session_registry.get()
+    if registry is not None:
+        return registry
+    try:
+        from flask import g, has_request_context
+        if has_request_context():
+            if not hasattr(g, "_audio_registry"):
+                g._audio_registry = {}
+            return g._audio_registry
+    except Exception:
+        pass
+    return None
+
+
+@contextmanager
+def audio_session():
+    """Share decodes across every load_audio() call inside the block."""
+    token = _session_registry.set({})
+    try:
+        yield
+    finally:
+        _session_registry.reset(token)
+
+
+def remember(path, decoded):
+    """
+    Register already-decoded samples for another path (e.g. a float WAV
+    written from them) so later loads of that path skip the decode.
+    """
+    registry = _current_registry()
+    if registry is None:
+        return
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    registry[(os.path.realpath(path), stat.st_size, stat.st_mtime_ns)] = decoded
+
+
+def load_audio(path):
+    """DecodedAudio for path, reused within the current request/session."""
+    registry = _current_registry()
+    if registry is None:
+        return decode(path)
+
+    try:
+        stat = os.stat(path)
+        key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return decode(path)
+
+    decoded = registry.get(key)
+    if decoded is None:
+        decoded = decode(path)
+        registry[key] = decoded
+    return decoded
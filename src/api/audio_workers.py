@@ -0,0 +1,117 @@
+# src/api/audio_workers.py
+# =====================================================
+# SHARED AUDIO WORKER POOLS — StreamPireX
+# =====================================================
+# Two lazily-created, process-wide executors:
+#   - CPU pool: ProcessPoolExecutor sized to the cores, for
+#     DSP / analysis that holds the GIL. Uses a forkserver
+#     that preloads only the worker's module, so children
+#     never re-run app.py (scheduler, sockets) and start with
+#     that module (and its warm state) already imported.
+#   - I/O pool: ThreadPoolExecutor for downloads and R2
+#     uploads, so transfers overlap with compute
+#
+# Work submitted to the CPU pool must be a module-level
+# function with picklable args (paths + plain dicts).
+# If the process pool can't start or breaks, work falls
+# back to the I/O threads so the request still completes.
+# =====================================================
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+AUDIO_CPU_WORKERS = int(os.environ.get("AUDIO_CPU_WORKERS", "0")) or (os.cpu_count() or 1)
+AUDIO_IO_WORKERS = int(os.environ.get("AUDIO_IO_WORKERS", "8"))
+
+_lock = threading.Lock()
+_process_pool = None
+_io_pool = None
+
+
+def cpu_workers():
+    return AUDIO_CPU_WORKERS
+
+
+def mp_context(preload=()):
+    """forkserver context preloading `preload` (spawn where unavailable)."""
+    try:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(list(preload))
+        return ctx
+    except ValueError:
+        return multiprocessing.get_context("spawn")
+
+
+def get_process_pool(preload=()):
+    """
+    Shared process pool (None if it can't be created). `preload` only
+    matters for the call that creates the pool.
+    """
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            try:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=AUDIO_CPU_WORKERS,
+                    mp_context=mp_context(preload),
+                )
+                print(f"✅ Audio process pool started ({AUDIO_CPU_WORKERS} workers)")
+            except Exception as e:
+                print(f"⚠️ Audio process pool unavailable, using threads: {e}")
+                return None
+        return _process_pool
+
+
+def get_io_pool():
+    """Shared thread pool for network/disk transfers."""
+    global _io_pool
+    with _lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=AUDIO_IO_WORKERS,
+                                          thread_name_prefix="audio-io")
+        return _io_pool
+
+
+def _reset_process_pool():
+    global _process_pool
+    with _lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        try:
+            pool.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+
+def submit_cpu(fn, *args, **kwargs):
+    """Run fn in the process pool, falling back to a thread."""
+    preload = (fn.__module__,)
+    pool = get_process_pool(preload)
+    if pool is not None:
+        try:
+            return pool.submit(fn, *args, **kwargs)
+        except (BrokenProcessPool, RuntimeError) as e:
+            print(f"⚠️ Audio process pool broken, restarting: {e}")
+            _reset_process_pool()
+            pool = get_process_pool(preload)
+            if pool is not None:
+                try:
+                    return pool.submit(fn, *args, **kwargs)
+                except Exception:
+                    _reset_process_pool()
+    return get_io_pool().submit(fn, *args, **kwargs)
+
+
+def submit_io(fn, *args, **kwargs):
+    return get_io_pool().submit(fn, *args, **kwargs)
+
+
+def pool_stats():
+    return {
+        "cpu_workers": AUDIO_CPU_WORKERS,
+        "io_workers": AUDIO_IO_WORKERS,
+        "process_pool_started": _process_pool is not None,
+    }
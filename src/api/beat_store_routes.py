@@ -6,6 +6,7 @@ import os, json, stripe
 
 from api.models import db, User, Audio
 from api.beat_store_models import Beat, BeatLicense, BeatPurchase, DEFAULT_LICENSE_TEMPLATES
+from api.audio_fingerprint import fingerprint_stream, find_duplicate, index_fingerprint
 
 try:
     from api.r2_storage_setup import uploadFile, getSignedUrl
@@ -119,6 +120,20 @@ def create_beat():
 
         preview_url = mp3_url = wav_url = stems_url = artwork_url = None
 
+        # Block re-uploads of another producer's beat (re-encoded/trimmed copies included)
+        fingerprint = None
+        source_file = next((request.files[k] for k in ('preview_file', 'audio_file')
+                            if k in request.files and request.files[k].filename), None)
+        if source_file:
+            try:
+                fingerprint = fingerprint_stream(source_file.stream)
+                match = find_duplicate(fingerprint, exclude_user_id=user_id)
+                if match:
+                    return jsonify({"error": "This audio matches a beat or track already on StreamPireX",
+                                    "match": match}), 409
+            except Exception as e:
+                print(f"⚠️ Beat fingerprint check skipped: {e}")
+
         if 'preview_file' in request.files:
             f = request.files['preview_file']
             if f and f.filename: preview_url = uploadFile(f, secure_filename(f.filename))
@@ -186,6 +201,16 @@ def create_beat():
 
         beat.base_price = _get_lowest_price(beat.id)
         db.session.commit()
+
+        # Best-effort: a fingerprint index failure never loses the beat
+        if fingerprint is not None:
+            try:
+                index_fingerprint(fingerprint, "beat", beat.id, user_id=user_id)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ Fingerprint indexing failed for beat {beat.id}: {e}")
+
         return jsonify({"message": "Beat listed successfully!", "beat": beat.serialize()}), 201
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,432 @@
+# src/api/demucs_service.py
+# =====================================================
+# DEMUCS SEPARATION SERVICE — StreamPireX
+# =====================================================
+# Long-lived separation workers instead of one
+# `python -m demucs` process per request:
+#
+#   - DEMUCS_WORKERS dedicated processes (default 1) fed
+#     through the executor's job queue
+#   - Each worker imports torch/demucs once and keeps
+#     pretrained models resident in an LRU bounded by
+#     DEMUCS_MODEL_CACHE_MB (weights are loaded once per
+#     DEMUCS_MODELS entry, evicted least-recently-used)
+#   - Capability probing (demucs/torch versions, CUDA)
+#     runs once per process in a single subprocess, so the
+#     web process never imports torch itself
+#
+# Separation is segmented: the source is converted once to
+# a float WAV at the model rate, cut into overlapping
+# DEMUCS_SEGMENT_SECONDS windows that run across the
+# workers, then cross-faded back together and appended to
+# each stem file (24-bit FLAC master, same layout as the CLI:
+#   <output_dir>/<model>/<input name>/<stem>.flac)
+# so RAM stays bounded and stems grow while it runs.
+# Lossy delivery formats are transcoded on demand
+# (api/stem_variants.py), off the separation path.
+# =====================================================
+
+import gc
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import soundfile as sf
+
+DEMUCS_WORKERS = int(os.environ.get("DEMUCS_WORKERS", "1"))
+DEMUCS_MODEL_CACHE_MB = int(os.environ.get("DEMUCS_MODEL_CACHE_MB", "2048"))
+DEMUCS_TORCH_THREADS = int(os.environ.get("DEMUCS_TORCH_THREADS", "0"))
+DEMUCS_SEGMENT_TIMEOUT = int(os.environ.get("DEMUCS_SEGMENT_TIMEOUT", "600"))
+SEGMENT_SECONDS = float(os.environ.get("DEMUCS_SEGMENT_SECONDS", "30"))
+SEGMENT_OVERLAP_SECONDS = float(os.environ.get("DEMUCS_SEGMENT_OVERLAP_SECONDS", "2"))
+DEMUCS_PRELOAD_MODELS = [m for m in os.environ.get("DEMUCS_PRELOAD_MODELS", "").split(",") if m]
+STEM_SUBTYPE = "PCM_24"
+
+
+class DemucsServiceError(RuntimeError):
+    """The resident worker couldn't run the job (caller may fall back to the CLI)."""
+
+
+# =====================================================
+# CAPABILITY PROBE (cached)
+# =====================================================
+
+_PROBE_SCRIPT = """
+import json
+out = {"demucs": None, "torch": None, "cuda": False}
+try:
+    import demucs
+    out["demucs"] = getattr(demucs, "__version__", None) or "available"
+except Exception:
+    pass
+try:
+    import torch
+    out["torch"] = torch.__version__
+    out["cuda"] = bool(torch.cuda.is_available())
+except Exception:
+    pass
+print(json.dumps(out))
+"""
+
+_probe_lock = threading.Lock()
+_capabilities = None
+
+
+def get_capabilities(refresh=False):
+    """
+    {"demucs_version", "torch_version", "gpu_available", "ffprobe_available"}
+    — probed once per process in a single interpreter.
+    """
+    global _capabilities
+    with _probe_lock:
+        if _capabilities is not None and not refresh:
+            return _capabilities
+        probed = {}
+        try:
+            result = subprocess.run([sys.executable, "-c", _PROBE_SCRIPT],
+                                    capture_output=True, text=True, timeout=120)
+            if result.returncode == 0:
+                probed = json.loads(result.stdout.strip().splitlines()[-1])
+        except Exception as e:
+            print(f"⚠️ Demucs capability probe failed: {e}")
+        _capabilities = {
+            "demucs_version": probed.get("demucs"),
+            "torch_version": probed.get("torch"),
+            "gpu_available": bool(probed.get("cuda")),
+            "ffprobe_available": shutil.which("ffprobe") is not None,
+        }
+        return _capabilities
+
+
+def warm_capabilities():
+    """Probe in the background so the first request finds it cached."""
+    threading.Thread(target=get_capabilities, name="demucs-probe", daemon=True).start()
+
+
+def in_process_available():
+    return importlib.util.find_spec("demucs") is not None
+
+
+# =====================================================
+# WORKER SIDE (runs inside the service processes)
+# =====================================================
+
+_models = OrderedDict()   # model name → (model, bytes)
+
+
+def _model_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def _get_model(model_name):
+    """Pretrained model from the resident LRU, loading it on first use."""
+    if model_name in _models:
+        _models.move_to_end(model_name)
+        return _models[model_name][0]
+
+    from demucs.pretrained import get_model
+    model = get_model(model_name)
+    model.cpu()
+    model.eval()
+    size = _model_bytes(model)
+
+    budget = DEMUCS_MODEL_CACHE_MB * 1024 * 1024
+    while _models and sum(b for _, b in _models.values()) + size > budget:
+        evicted, _ = _models.popitem(last=False)
+        print(f"♻️ Demucs worker evicted {evicted}")
+        gc.collect()
+
+    _models[model_name] = (model, size)
+    print(f"✅ Demucs worker loaded {model_name} ({size / (1024 * 1024):.0f} MB)")
+    return model
+
+
+def _init_worker():
+    # An initializer exception would break the whole pool — log instead
+    try:
+        import torch
+        if DEMUCS_TORCH_THREADS:
+            torch.set_num_threads(DEMUCS_TORCH_THREADS)
+    except Exception as e:
+        print(f"⚠️ Demucs worker started without torch: {e}")
+        return
+    for model_name in DEMUCS_PRELOAD_MODELS:
+        try:
+            _get_model(model_name)
+        except Exception as e:
+            print(f"⚠️ Demucs preload of {model_name} failed: {e}")
+
+
+def model_info(model_name):
+    """Rate / channel layout / stem names of a resident model."""
+    model = _get_model(model_name)
+    return {
+        "samplerate": int(model.samplerate),
+        "channels": int(model.audio_channels),
+        "sources": list(model.sources),
+    }
+
+
+def separate_segment(source_path, start, frames, model_name, device, mean, std):
+    """
+    Separate one window of a prepared source WAV (already at the model's
+    rate/channels). Returns (stems, channels, frames) float32.
+    """
+    import torch
+    from demucs.apply import apply_model
+
+    model = _get_model(model_name)
+    with sf.SoundFile(source_path) as f:
+        f.seek(start)
+        wav = f.read(frames, dtype="float32", always_2d=True).T
+    wav = torch.from_numpy(np.ascontiguousarray(wav))
+
+    # Whole-track normalization, same as the demucs CLI
+    with torch.no_grad():
+        sources = apply_model(model, ((wav - mean) / std)[None], device=device,
+                              shifts=1, split=True, overlap=0.25, progress=False)[0]
+    return (sources * std + mean).cpu().numpy().astype(np.float32, copy=False)
+
+
+# =====================================================
+# SERVICE SIDE (web / task processes)
+# =====================================================
+
+_pool_lock = threading.Lock()
+_pool = None
+_model_info = {}
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from api.audio_workers import mp_context
+            _pool = ProcessPoolExecutor(
+                max_workers=DEMUCS_WORKERS,
+                mp_context=mp_context(("api.demucs_service",)),
+                initializer=_init_worker,
+            )
+            print(f"✅ Demucs service started ({DEMUCS_WORKERS} worker(s), "
+                  f"{DEMUCS_MODEL_CACHE_MB} MB model cache)")
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        try:
+            pool.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+
+def submit(fn, *args):
+    """Queue fn(*args) on a resident worker; returns the Future."""
+    try:
+        return _get_pool().submit(fn, *args)
+    except (BrokenProcessPool, RuntimeError) as e:
+        print(f"⚠️ Demucs service broken, restarting: {e}")
+        _reset_pool()
+        try:
+            return _get_pool().submit(fn, *args)
+        except Exception as e2:
+            raise DemucsServiceError(f"Demucs service unavailable: {e2}") from e2
+
+
+def _result(future, timeout=DEMUCS_SEGMENT_TIMEOUT):
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        raise RuntimeError("Stem separation timed out. Try a shorter track or faster model.")
+    except BrokenProcessPool as e:
+        _reset_pool()
+        raise DemucsServiceError(f"Demucs worker died: {e}") from e
+    except (ImportError, OSError) as e:
+        raise DemucsServiceError(str(e)) from e
+
+
+def get_model_info(model_name):
+    info = _model_info.get(model_name)
+    if info is None:
+        info = _result(submit(model_info, model_name))
+        _model_info[model_name] = info
+    return info
+
+
+def _prepare_source(input_path, work_dir, samplerate, channels):
+    """
+    Float WAV at the model's rate/channels so windows can be read by seek.
+    ffmpeg streams the conversion; the in-memory loader is the fallback.
+    """
+    try:
+        info = sf.info(input_path)
+        if info.samplerate == samplerate and info.channels == channels and info.format == "WAV":
+            return input_path
+    except Exception:
+        pass
+
+    source_path = os.path.join(work_dir, "source.wav")
+    if shutil.which("ffmpeg"):
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-v", "error", "-i", input_path, "-map", "0:a:0",
+             "-ac", str(channels), "-ar", str(samplerate), "-acodec", "pcm_f32le", source_path],
+            capture_output=True, text=True, timeout=DEMUCS_SEGMENT_TIMEOUT
+        )
+        if result.returncode == 0:
+            return source_path
+        print(f"⚠️ ffmpeg conversion failed, decoding in memory: {result.stderr[:200]}")
+
+    from api.audio_loader import load_audio
+    y, _ = load_audio(input_path).get(sr=samplerate)
+    wav = y.reshape(1, -1) if y.ndim == 1 else y
+    if wav.shape[0] < channels:
+        wav = np.repeat(wav[:1], channels, axis=0)
+    elif wav.shape[0] > channels:
+        wav = wav[:channels] if channels > 1 else wav.mean(axis=0, keepdims=True)
+    sf.write(source_path, wav.T, samplerate, subtype="FLOAT")
+    return source_path
+
+
+def _mix_stats(source_path):
+    """(frames, mean, std) of the mono reference, read block by block."""
+    total = 0
+    acc = acc_sq = 0.0
+    with sf.SoundFile(source_path) as f:
+        for block in f.blocks(blocksize=1 << 20, dtype="float32", always_2d=True):
+            ref = block.mean(axis=1, dtype=np.float64)
+            acc += float(ref.sum())
+            acc_sq += float(np.square(ref).sum())
+            total += len(ref)
+    if total == 0:
+        return 0, 0.0, 1.0
+    mean = acc / total
+    std = max(float(np.sqrt(max(acc_sq / total - mean * mean, 0.0))), 1e-8)
+    return total, float(mean), std
+
+
+def _stem_entry(stem_path):
+    size = os.path.getsize(stem_path)
+    return {
+        "path": stem_path,
+        "filename": os.path.basename(stem_path),
+        "size_bytes": size,
+        "size_mb": round(size / (1024 * 1024), 2),
+    }
+
+
+class _StemWriter:
+    """Incremental lossless stem master (24-bit FLAC)."""
+
+    def __init__(self, path_base, samplerate, channels):
+        self.path = path_base + ".flac"
+        self.file = sf.SoundFile(self.path, "w", samplerate, channels,
+                                 format="FLAC", subtype=STEM_SUBTYPE)
+
+    def write(self, block):
+        """block: (channels, frames) float."""
+        self.file.write(np.clip(block, -1.0, 1.0).T)
+
+    def close(self):
+        self.file.close()
+        return self.path
+
+
+def separate(input_path, output_dir, model_name, device="cpu", progress=None):
+    """
+    Segmented separation: overlapping SEGMENT_SECONDS windows fan out to
+    the resident workers, come back in order, are cross-faded over the
+    overlap and appended to the stem files as they finish. Memory stays
+    at a few windows regardless of track length.
+
+    progress(info) is called after every segment with
+    {"segment", "segments", "percent", "stems"} — stems are the partial
+    files written so far.
+    """
+    info = get_model_info(model_name)
+    sr, channels, sources = info["samplerate"], info["channels"], info["sources"]
+
+    input_name = os.path.splitext(os.path.basename(input_path))[0]
+    stems_dir = os.path.join(output_dir, model_name, input_name)
+    os.makedirs(stems_dir, exist_ok=True)
+
+    source_path = _prepare_source(input_path, output_dir, sr, channels)
+    total, mean, std = _mix_stats(source_path)
+    if total == 0:
+        return {}
+
+    hop = int(SEGMENT_SECONDS * sr)
+    overlap = min(int(SEGMENT_OVERLAP_SECONDS * sr), hop - 1)
+    starts = list(range(0, total, hop))
+    segments = len(starts)
+
+    writers = {name: _StemWriter(os.path.join(stems_dir, name), sr, channels) for name in sources}
+    pending = deque()
+    next_index = 0
+    tail = None
+    try:
+        for index in range(segments):
+            # Keep every worker busy, one segment queued ahead
+            while next_index < segments and len(pending) < DEMUCS_WORKERS + 1:
+                start = starts[next_index]
+                frames = min(hop + overlap, total - start)
+                pending.append(submit(separate_segment, source_path, start, frames,
+                                      model_name, device, mean, std))
+                next_index += 1
+
+            out = _result(pending.popleft())       # (stems, channels, frames)
+            last = index == segments - 1
+
+            head = 0
+            if tail is not None:
+                head = tail.shape[-1]
+                ramp = (np.arange(head, dtype=np.float32) + 0.5) / head
+                out[..., :head] = tail * (1.0 - ramp) + out[..., :head] * ramp
+            end = out.shape[-1] if last else hop
+            tail = None if last else out[..., hop:].copy()
+
+            for stem_index, name in enumerate(sources):
+                writers[name].write(out[stem_index, :, :end])
+
+            if progress is not None:
+                try:
+                    progress({
+                        "segment": index + 1,
+                        "segments": segments,
+                        "percent": round(100.0 * (index + 1) / segments, 1),
+                        "stems": {name: w.path for name, w in writers.items()},
+                    })
+                except Exception as e:
+                    print(f"⚠️ Separation progress callback failed: {e}")
+    finally:
+        for future in pending:
+            future.cancel()
+        paths = {name: w.close() for name, w in writers.items()}
+        if source_path != input_path:
+            try:
+                os.remove(source_path)
+            except OSError:
+                pass
+
+    return {name: _stem_entry(path) for name, path in paths.items()}
+
+
+def stats():
+    return {
+        "workers": DEMUCS_WORKERS,
+        "model_cache_mb": DEMUCS_MODEL_CACHE_MB,
+        "segment_seconds": SEGMENT_SECONDS,
+        "segment_overlap_seconds": SEGMENT_OVERLAP_SECONDS,
+        "started": _pool is not None,
+        "in_process": in_process_available(),
+    }
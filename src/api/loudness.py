@@ -0,0 +1,365 @@
+# src/api/loudness.py
+# =====================================================
+# LOUDNESS METER (ITU-R BS.1770 / EBU R128) — StreamPireX
+# =====================================================
+# K-weighted loudness and true peak in NumPy/SciPy:
+#   - Momentary (400 ms), short-term (3 s), gated
+#     integrated loudness and loudness range (LRA)
+#   - True peak via 4x polyphase oversampling
+#
+# LoudnessMeter is block-wise: filter state, partial
+# 100 ms steps and oversampler history carry across
+# add() calls, so the streaming mastering engine can
+# meter while it writes. measure() / measure_file() are
+# the one-shot helpers. PeakLimiter + normalize_file()
+# hit a LUFS target in a single measured render pass.
+#
+# Used by: ai_mastering, ai_mastering_phase3, reference_fingerprint,
+#          ai_mix_assistant, podcast_studio_ai_routes
+# =====================================================
+
+import numpy as np
+import soundfile as sf
+from scipy import signal
+
+# Reported when everything is below the absolute gate (silence)
+LUFS_FLOOR = -70.0
+
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+LRA_RELATIVE_GATE_LU = -20.0
+
+STEP_SECONDS = 0.1          # hop between gating blocks (75% overlap)
+MOMENTARY_STEPS = 4         # 400 ms
+SHORT_TERM_STEPS = 30       # 3 s
+
+TRUE_PEAK_OVERSAMPLE = 4
+TRUE_PEAK_TAPS = 48         # per phase
+
+# BS.1770 channel weights in L, R, C, LFE, Ls, Rs order
+_SURROUND_WEIGHTS = [1.0, 1.0, 1.0, 0.0, 1.41, 1.41]
+
+
+def k_weighting_sos(sr):
+    """Pre-filter (high shelf) + RLB high-pass as second-order sections for any rate."""
+    # Stage 1: high shelf
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sr)
+    vh = 10 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0,
+        2.0 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+        1.0,
+        2.0 * (k * k - 1.0) / a0,
+        (1.0 - k / q + k * k) / a0,
+    ]
+
+    # Stage 2: RLB high-pass
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sr)
+    a0 = 1.0 + k / q + k * k
+    highpass = [
+        1.0, -2.0, 1.0,
+        1.0,
+        2.0 * (k * k - 1.0) / a0,
+        (1.0 - k / q + k * k) / a0,
+    ]
+    return np.array([shelf, highpass])
+
+
+def _oversampling_filter():
+    n = TRUE_PEAK_TAPS * TRUE_PEAK_OVERSAMPLE
+    return signal.firwin(n, 1.0 / TRUE_PEAK_OVERSAMPLE) * TRUE_PEAK_OVERSAMPLE
+
+
+def _power_to_lufs(power):
+    return -0.691 + 10.0 * np.log10(np.maximum(power, 1e-20))
+
+
+def _sliding_mean(values, width):
+    if len(values) < width:
+        return np.empty(0)
+    csum = np.cumsum(np.concatenate(([0.0], values)))
+    return (csum[width:] - csum[:-width]) / width
+
+
+class LoudnessMeter:
+    """
+    Streaming BS.1770 meter. Feed (channels, samples) blocks with
+    add(); read results with result() at any point.
+    """
+
+    def __init__(self, sample_rate, channels):
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.step = max(1, int(round(self.sample_rate * STEP_SECONDS)))
+
+        if self.channels <= 2:
+            self.weights = np.ones(self.channels)
+        else:
+            weights = _SURROUND_WEIGHTS + [1.0] * max(0, self.channels - len(_SURROUND_WEIGHTS))
+            self.weights = np.array(weights[:self.channels])
+
+        self._sos = k_weighting_sos(self.sample_rate)
+        self._zi = np.zeros((self._sos.shape[0], self.channels, 2))
+        self._pending = np.empty(0)
+        self._steps = []
+
+        self._fir = _oversampling_filter()
+        self._history = TRUE_PEAK_TAPS
+        self._tail = np.zeros((self.channels, self._history), dtype=np.float64)
+        self.sample_peak = 0.0
+        self._true_peak = 0.0
+        self.frames = 0
+
+    def add(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        if block.shape[1] == 0:
+            return
+
+        # K-weighted, channel-weighted mean square per 100 ms step
+        filtered, self._zi = signal.sosfilt(self._sos, block, axis=1, zi=self._zi)
+        power = np.einsum("c,cn->n", self.weights, filtered * filtered)
+        buf = np.concatenate((self._pending, power))
+        n_steps = len(buf) // self.step
+        if n_steps:
+            self._steps.extend(buf[:n_steps * self.step].reshape(n_steps, self.step).mean(axis=1))
+        self._pending = buf[n_steps * self.step:]
+
+        self.sample_peak = max(self.sample_peak, float(np.max(np.abs(block))))
+        self._true_peak = max(self._true_peak, self._oversampled_peak(block))
+        self.frames += block.shape[1]
+
+    def _oversampled_peak(self, block, flush=False):
+        ext = np.concatenate((self._tail, block), axis=1)
+        up = signal.upfirdn(self._fir, ext, up=TRUE_PEAK_OVERSAMPLE, axis=1)
+        start = self._history * TRUE_PEAK_OVERSAMPLE
+        end = up.shape[1] if flush else ext.shape[1] * TRUE_PEAK_OVERSAMPLE
+        if not flush:
+            self._tail = ext[:, -self._history:]
+        segment = up[:, start:end]
+        return float(np.max(np.abs(segment))) if segment.size else 0.0
+
+    @property
+    def true_peak(self):
+        # Include the filter ring-out after the last sample
+        flush = np.zeros((self.channels, 0))
+        return max(self._true_peak, self.sample_peak, self._oversampled_peak(flush, flush=True))
+
+    def momentary_series(self):
+        return _power_to_lufs(_sliding_mean(np.asarray(self._steps), MOMENTARY_STEPS))
+
+    def short_term_series(self):
+        return _power_to_lufs(_sliding_mean(np.asarray(self._steps), SHORT_TERM_STEPS))
+
+    def integrated(self):
+        blocks = _sliding_mean(np.asarray(self._steps), MOMENTARY_STEPS)
+        if blocks.size == 0:
+            return LUFS_FLOOR
+        blocks = blocks[_power_to_lufs(blocks) > ABSOLUTE_GATE_LUFS]
+        if blocks.size == 0:
+            return LUFS_FLOOR
+        relative_gate = _power_to_lufs(np.mean(blocks)) + RELATIVE_GATE_LU
+        gated = blocks[_power_to_lufs(blocks) > relative_gate]
+        if gated.size == 0:
+            return LUFS_FLOOR
+        return float(_power_to_lufs(np.mean(gated)))
+
+    def loudness_range(self):
+        short_term = _sliding_mean(np.asarray(self._steps), SHORT_TERM_STEPS)
+        short_term = short_term[_power_to_lufs(short_term) > ABSOLUTE_GATE_LUFS]
+        if short_term.size == 0:
+            return 0.0
+        relative_gate = _power_to_lufs(np.mean(short_term)) + LRA_RELATIVE_GATE_LU
+        levels = _power_to_lufs(short_term)
+        levels = levels[levels > relative_gate]
+        if levels.size == 0:
+            return 0.0
+        return float(np.percentile(levels, 95) - np.percentile(levels, 10))
+
+    def result(self):
+        momentary = self.momentary_series()
+        short_term = self.short_term_series()
+        true_peak = self.true_peak
+        return {
+            "integrated_lufs": round(self.integrated(), 2),
+            "loudness_range_lu": round(self.loudness_range(), 2),
+            "momentary_max_lufs": round(max(float(np.max(momentary)), LUFS_FLOOR), 2) if momentary.size else LUFS_FLOOR,
+            "short_term_max_lufs": round(max(float(np.max(short_term)), LUFS_FLOOR), 2) if short_term.size else LUFS_FLOOR,
+            "true_peak_dbtp": round(float(20 * np.log10(max(true_peak, 1e-10))), 2),
+            "sample_peak_dbfs": round(float(20 * np.log10(max(self.sample_peak, 1e-10))), 2),
+        }
+
+
+def measure(audio, sample_rate):
+    """One-shot meter for an in-memory signal, (channels, samples) or mono 1-D."""
+    audio = np.asarray(audio)
+    if audio.ndim == 1:
+        audio = audio.reshape(1, -1)
+    meter = LoudnessMeter(sample_rate, audio.shape[0])
+    meter.add(audio)
+    return meter.result()
+
+
+def integrated_loudness(audio, sample_rate):
+    return measure(audio, sample_rate)["integrated_lufs"]
+
+
+def measure_file(path, block_frames=65536):
+    """Stream a file through the meter without loading it whole."""
+    with sf.SoundFile(path) as f:
+        meter = LoudnessMeter(f.samplerate, f.channels)
+        for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            meter.add(block.T)
+    return meter.result()
+
+
+def gain_to_target(measured_lufs, target_lufs, true_peak_dbtp=None, ceiling_dbtp=None):
+    """
+    dB of gain that moves measured_lufs to target_lufs, capped so the
+    resulting true peak stays under ceiling_dbtp when both are given.
+    """
+    if measured_lufs is None or measured_lufs <= LUFS_FLOOR:
+        return 0.0
+    gain_db = target_lufs - measured_lufs
+    if true_peak_dbtp is not None and ceiling_dbtp is not None:
+        gain_db = min(gain_db, ceiling_dbtp - true_peak_dbtp)
+    return float(gain_db)
+
+
+class _TruePeakDetector:
+    """
+    4x-oversampled peak envelope for the limiter. Each sample's value is
+    the largest interpolated peak within one sample either side of it,
+    so inter-sample overs between two samples hold the gain down on both.
+    Output lags input by TRUE_PEAK_TAPS // 2 samples (the FIR's reach).
+    """
+
+    def __init__(self, channels):
+        self.channels = int(channels)
+        self.reach = TRUE_PEAK_TAPS // 2
+        self._fir = _oversampling_filter()
+        # FIR group delay in oversampled steps, rounded down to the sample grid
+        self._offset = (len(self._fir) - 1) // 2 - (TRUE_PEAK_OVERSAMPLE - 1)
+        self._context = np.zeros((self.channels, self.reach))
+        self._pending = np.zeros((self.channels, 0))
+
+    def process(self, block):
+        """Returns (delayed samples, envelope) for every sample whose neighbourhood is known."""
+        P = D = self.reach
+        buf = np.concatenate((self._context, self._pending, block), axis=1)
+        count = buf.shape[1] - P - D
+        if count <= 0:
+            self._pending = buf[:, P:]
+            return np.zeros((self.channels, 0)), np.zeros(0)
+
+        up = signal.upfirdn(self._fir, buf, up=TRUE_PEAK_OVERSAMPLE, axis=1)
+        level = np.max(np.abs(up), axis=0)
+        k = TRUE_PEAK_OVERSAMPLE
+        start = self._offset + P * k
+        quarters = level[start:start + (count + 1) * k].reshape(count + 1, k).max(axis=1)
+        out = buf[:, P:P + count]
+        env = np.maximum(np.maximum(quarters[:-1], quarters[1:]), np.max(np.abs(out), axis=0))
+
+        self._context = buf[:, count:P + count]
+        self._pending = buf[:, P + count:]
+        return out, env
+
+    def flush(self):
+        out, env = self.process(np.zeros((self.channels, self.reach)))
+        self._pending = np.zeros((self.channels, 0))
+        return out, env
+
+
+class PeakLimiter:
+    """
+    Streaming look-ahead limiter that is unity gain below the ceiling.
+    With true_peak (the default) the detector is 4x oversampled, so
+    ceiling_db is a dBTP ceiling; otherwise it holds sample peaks only.
+    Required gain min(1, ceiling/peak) is min-filtered over the
+    look-ahead window and then box-smoothed over the same window,
+    which keeps every output sample at or under the ceiling. Output
+    lags input; call flush() at the end.
+    """
+
+    def __init__(self, sample_rate, channels, ceiling_db=-1.0, lookahead_ms=5.0, true_peak=True):
+        from scipy.ndimage import minimum_filter1d
+        self._min_filter = minimum_filter1d
+        self.channels = int(channels)
+        self.ceiling = 10 ** (ceiling_db / 20.0)
+        self.lookahead = max(2, int(sample_rate * lookahead_ms / 1000.0))
+        self._detector = _TruePeakDetector(self.channels) if true_peak else None
+        # Required gain for the samples the next output still depends on,
+        # seeded with unity for the virtual samples before the stream
+        self._r = np.ones(self.lookahead - 1)
+        self._x = np.zeros((self.channels, 0))
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim == 1:
+            block = block.reshape(1, -1)
+        if self._detector is not None:
+            block, env = self._detector.process(block)
+        else:
+            env = np.max(np.abs(block), axis=0) if block.shape[1] else np.zeros(0)
+        return self._apply(block, env)
+
+    def _apply(self, block, env):
+        L = self.lookahead
+        r_new = np.minimum(1.0, self.ceiling / np.maximum(env, 1e-12))
+
+        r = np.concatenate((self._r, r_new))
+        x = np.concatenate((self._x, block), axis=1)
+
+        # m[k] = min(r[k : k + L]) for every full window
+        centered = self._min_filter(r, size=L, mode='nearest')
+        m = centered[L // 2: L // 2 + len(r) - L + 1]
+        # g[n] = mean(m[n - L + 1 : n + 1])
+        csum = np.cumsum(np.concatenate(([0.0], m)))
+        g = (csum[L:] - csum[:-L]) / L
+
+        out = x[:, :len(g)] * g
+        self._r = r[len(g):]
+        self._x = x[:, len(g):]
+        return out
+
+    def flush(self):
+        """Push out the delayed tail (unity-gain padding, zero signal)."""
+        parts = []
+        if self._detector is not None:
+            parts.append(self._apply(*self._detector.flush()))
+        tail = np.zeros((self.channels, self.lookahead - 1))
+        parts.append(self._apply(tail, np.zeros(tail.shape[1])))
+        return np.concatenate(parts, axis=1)
+
+
+def normalize_file(input_path, output_path, target_lufs, ceiling_db=-1.0,
+                   block_frames=65536, subtype='PCM_24'):
+    """
+    Measure once, then render a single gain + true-peak limiter pass to
+    hit target_lufs with true peaks held under ceiling_db (dBTP). The output is metered
+    as it is written, so no second measure pass is needed.
+    Returns {"before": ..., "after": ..., "gain_db": ...}.
+    """
+    before = measure_file(input_path, block_frames)
+    gain_db = gain_to_target(before["integrated_lufs"], target_lufs)
+    gain = 10 ** (gain_db / 20.0)
+
+    with sf.SoundFile(input_path) as fin:
+        meter = LoudnessMeter(fin.samplerate, fin.channels)
+        limiter = PeakLimiter(fin.samplerate, fin.channels, ceiling_db)
+        with sf.SoundFile(output_path, 'w', fin.samplerate, fin.channels, subtype=subtype) as fout:
+            for block in fin.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                out = limiter.process(block.T * gain)
+                meter.add(out)
+                fout.write(out.T)
+            out = limiter.flush()
+            meter.add(out)
+            fout.write(out.T)
+
+    return {"before": before, "after": meter.result(), "gain_db": round(gain_db, 2)}
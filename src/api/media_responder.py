@@ -0,0 +1,127 @@
+# src/api/media_responder.py
+# =====================================================
+# RANGE-AWARE MEDIA RESPONDER — StreamPireX
+# =====================================================
+# Serves local audio files (station mixes, uploads) with:
+#   - single byte-range requests → 206 Partial Content,
+#     multi-range requests → the full 200 body,
+#     unsatisfiable ranges → 416, If-Range honoured
+#   - ETag / Last-Modified validators and 304 responses
+#   - cacheable Cache-Control instead of no-store
+#
+# The file is opened positioned at the range start. With
+# `sendfile` enabled (GUNICORN_SENDFILE) the body goes to the
+# server's wsgi.file_wrapper and gunicorn sendfile()s exactly
+# Content-Length bytes; otherwise the wrapper would be read
+# to EOF, so the body is a generator that stops after
+# Content-Length bytes in MEDIA_BUFFER_SIZE blocks — either
+# way seeking in a long mix never re-streams from byte 0.
+# =====================================================
+
+import mimetypes
+import os
+import stat as stat_module
+from datetime import datetime, timezone
+
+from flask import Response, jsonify, request
+
+MEDIA_BUFFER_SIZE = int(os.environ.get("MEDIA_BUFFER_KB", "256")) * 1024
+MEDIA_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", "3600"))
+# Same switch gunicorn.conf.py reads
+MEDIA_SENDFILE = os.environ.get("GUNICORN_SENDFILE", "0").lower() in ("1", "true", "yes")
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, HEAD, OPTIONS',
+    'Access-Control-Allow-Headers': 'Range, Content-Type, If-Range, If-None-Match, If-Modified-Since',
+    'Access-Control-Expose-Headers': 'Content-Range, Content-Length, Accept-Ranges, ETag',
+}
+
+
+def _read_range(f, length):
+    """Body of exactly `length` bytes from the file's current offset."""
+    try:
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(MEDIA_BUFFER_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _range_applies(etag, last_modified):
+    """If-Range: only honour Range when the client's copy is still current."""
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == etag
+    if if_range.date:
+        return if_range.date >= last_modified
+    return True
+
+
+def send_media(file_path, mimetype=None, max_age=MEDIA_MAX_AGE, download_name=None):
+    """Serve a local media file with Range / conditional request support."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return jsonify({"error": "File not found"}), 404
+    # Directories (e.g. /uploads/station_mixes/.) stat fine but can't be served
+    if not stat_module.S_ISREG(stat.st_mode):
+        return jsonify({"error": "File not found"}), 404
+
+    size = stat.st_size
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+    etag = f"{stat.st_ino:x}-{size:x}-{int(stat.st_mtime):x}"
+    mimetype = mimetype or mimetypes.guess_type(file_path)[0] or 'audio/mpeg'
+
+    headers = {
+        **CORS_HEADERS,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': f'public, max-age={max_age}',
+        'Content-Disposition': f'inline; filename="{download_name or os.path.basename(file_path)}"',
+    }
+
+    def finish(response):
+        response.headers.update(headers)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+
+    # Conditional GET — If-None-Match wins over If-Modified-Since
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return finish(Response(status=304))
+    elif request.if_modified_since and last_modified <= request.if_modified_since:
+        return finish(Response(status=304))
+
+    start, end, status = 0, size, 200
+    byte_range = request.range
+    # Multipart byteranges aren't supported — the full body is a valid answer
+    if byte_range is not None and byte_range.units == 'bytes' and len(byte_range.ranges) == 1 \
+            and _range_applies(etag, last_modified):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            response = finish(Response(status=416))
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        start, end = bounds
+        status = 206
+
+    length = end - start
+    if request.method == 'HEAD':
+        body = b''
+    else:
+        f = open(file_path, 'rb')
+        f.seek(start)
+        file_wrapper = request.environ.get('wsgi.file_wrapper') if MEDIA_SENDFILE else None
+        # Only the sendfile path stops at Content-Length; iterating the wrapper reads to EOF
+        body = file_wrapper(f, MEDIA_BUFFER_SIZE) if file_wrapper else _read_range(f, length)
+
+    response = Response(body, status=status, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = length
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    return finish(response)
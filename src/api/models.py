@@ -7,6 +7,7 @@ from sqlalchemy.dialects.postgresql import JSON
 from api.extensions import db
 from datetime import datetime, timedelta
 
+import bisect
 import json
 
 
@@ -1071,6 +1072,7 @@ class RadioStation(db.Model):
 
     social_links = db.Column(db.JSON, nullable=True)  # Social media links
     playlist_schedule = db.Column(db.JSON, nullable=True)  # Stores track schedule
+    playlist_timeline = db.Column(db.JSON, nullable=True)  # Compiled from playlist_schedule (see compile_playlist_timeline)
     
     # Audio Management
     submission_guidelines = db.Column(db.Text, nullable=True)
@@ -1138,83 +1140,169 @@ class RadioStation(db.Model):
             "social_links": self.social_links or {}
         }
     
-    def get_current_track(self):
+    @property
+    def timeline(self):
+        """
+        Compiled playlist timeline: cumulative end offset per track and
+        the loop length. Stored in playlist_timeline (rebuilt on flush
+        when playlist_schedule changes); compiled in memory for rows
+        saved before the column existed.
+        """
+        tracks = (self.playlist_schedule or {}).get("tracks", [])
+        stored = self.playlist_timeline
+        if stored and stored.get("count") == len(tracks):
+            return stored
+        cached = getattr(self, "_timeline_cache", None)
+        if cached is None or cached[0] is not tracks:
+            cached = (tracks, compile_playlist_timeline(tracks))
+            self._timeline_cache = cached
+        return cached[1]
+
+    def _loop_position(self, now=None):
+        """(timeline, position in the current loop) or (timeline, None) past the end of a non-looping playlist."""
+        timeline = self.timeline
+        elapsed = ((now or datetime.utcnow()) - self.loop_started_at).total_seconds()
+        loop_seconds = timeline["loop_seconds"]
+        if elapsed > loop_seconds:
+            if not self.playlist_schedule.get("loop_mode", True) or loop_seconds <= 0:
+                return timeline, None
+            elapsed = elapsed % loop_seconds
+        return timeline, elapsed
+
+    def get_current_track(self, now=None):
         """Get currently playing track based on loop timing"""
         if not self.is_loop_enabled or not self.playlist_schedule or not self.loop_started_at:
             return None
-            
+
+        tracks = self.playlist_schedule.get("tracks", [])
+        if not tracks:
+            return None
+
         try:
-            # Calculate time elapsed since loop started
-            elapsed_seconds = (datetime.utcnow() - self.loop_started_at).total_seconds()
-            
-            # Get tracks from playlist schedule
-            tracks = self.playlist_schedule.get("tracks", [])
-            if not tracks:
-                return None
-            
-            # Calculate which track should be playing
-            total_duration = 0
-            for track in tracks:
-                # Parse duration (format: "mm:ss")
-                duration_parts = track.get("duration", "3:30").split(":")
-                if len(duration_parts) == 2:
-                    minutes, seconds = map(int, duration_parts)
-                    track_duration = minutes * 60 + seconds
-                else:
-                    track_duration = 210  # Default 3:30
-                
-                if elapsed_seconds <= total_duration + track_duration:
-                    # This is the current track
-                    position_in_track = elapsed_seconds - total_duration
-                    return {
-                        **track,
-                        "position": int(position_in_track),
-                        "remaining": track_duration - int(position_in_track)
-                    }
-                
-                total_duration += track_duration
-            
-            # If we've gone past all tracks, loop back to beginning
-            if self.playlist_schedule.get("loop_mode", True):
-                total_loop_duration = total_duration
-                if total_loop_duration > 0:
-                    loop_position = elapsed_seconds % total_loop_duration
-                    return self._get_track_at_position(loop_position)
-            
+            timeline, position = self._loop_position(now)
+            if position is not None:
+                return self._get_track_at_position(position, timeline)
         except Exception as e:
             print(f"Error calculating current track: {e}")
-        
-        return tracks[0] if tracks else None
-    
-    def _get_track_at_position(self, position_seconds):
+
+        return tracks[0]
+
+    def _get_track_at_position(self, position_seconds, timeline=None):
         """Helper method to get track at specific position in loop"""
         tracks = self.playlist_schedule.get("tracks", [])
-        current_position = 0
-        
-        for track in tracks:
-            duration_parts = track.get("duration", "3:30").split(":")
-            if len(duration_parts) == 2:
-                minutes, seconds = map(int, duration_parts)
-                track_duration = minutes * 60 + seconds
-            else:
-                track_duration = 210
-            
-            if position_seconds <= current_position + track_duration:
-                position_in_track = position_seconds - current_position
-                return {
-                    **track,
-                    "position": int(position_in_track),
-                    "remaining": track_duration - int(position_in_track)
-                }
-            
-            current_position += track_duration
-        
-        return tracks[0] if tracks else None
-    
+        return track_at_position(tracks, (timeline or self.timeline)["ends"], position_seconds)
+
+    @classmethod
+    def current_tracks(cls, stations, now=None):
+        """
+        Batch get_current_track for directory pages: {station_id: track}.
+        Accepts station rows or ids (ids are loaded in one query); every
+        station is resolved against the same `now`.
+        """
+        stations = list(stations)
+        ids = [s for s in stations if isinstance(s, int)]
+        if ids:
+            loaded = {s.id: s for s in cls.query.filter(cls.id.in_(ids)).all()}
+            stations = [loaded.get(s) if isinstance(s, int) else s for s in stations]
+        now = now or datetime.utcnow()
+        return {s.id: s.get_current_track(now=now) for s in stations if s is not None}
+
+    def upcoming_transitions(self, count=1, now=None):
+        """
+        Next `count` track boundaries on the loop timeline.
+        Each item: offset_seconds (since loop_started_at — stable across
+        calls, usable as a key), starts_at, last_track, next_track.
+        """
+        if not self.is_loop_enabled or not self.playlist_schedule or not self.loop_started_at:
+            return []
+
+        tracks = self.playlist_schedule.get("tracks", [])
+        timeline = self.timeline
+        ends, loop_length = timeline["ends"], timeline["loop_seconds"]
+        if not tracks or loop_length <= 0:
+            return []
+
+        loop_mode = self.playlist_schedule.get("loop_mode", True)
+        elapsed = ((now or datetime.utcnow()) - self.loop_started_at).total_seconds()
+        cycle = int(max(elapsed, 0) // loop_length)
+        if cycle > 0 and not loop_mode:
+            return []
+
+        base = cycle * loop_length
+        index = bisect.bisect_right(ends, elapsed - base)
+        transitions = []
+        while len(transitions) < count and index < len(tracks):
+            next_index = index + 1
+            if next_index == len(tracks):
+                if not loop_mode:
+                    break
+                next_index = 0
+            boundary = base + ends[index]
+            transitions.append({
+                "offset_seconds": boundary,
+                "starts_at": self.loop_started_at + timedelta(seconds=boundary),
+                "last_track": tracks[index],
+                "next_track": tracks[next_index],
+            })
+            index = next_index
+            if index == 0:
+                base += loop_length
+        return transitions
+
     def __repr__(self):
         return f'<RadioStation {self.name}>'
 
 
+def _track_seconds(track):
+    """Track duration from its "mm:ss" string (3:30 when missing or malformed)."""
+    duration_parts = str(track.get("duration", "3:30")).split(":")
+    if len(duration_parts) == 2:
+        try:
+            minutes, seconds = map(int, duration_parts)
+            return minutes * 60 + seconds
+        except ValueError:
+            pass
+    return 210
+
+
+def compile_playlist_timeline(tracks):
+    """Cumulative end offset (seconds) per track + total loop length."""
+    ends = []
+    total = 0
+    for track in tracks or []:
+        total += _track_seconds(track)
+        ends.append(total)
+    return {"ends": ends, "loop_seconds": total, "count": len(ends)}
+
+
+def track_at_position(tracks, ends, position_seconds):
+    """Track playing `position_seconds` into a loop with cumulative `ends` (bisect)."""
+    index = bisect.bisect_left(ends, position_seconds)
+    if index >= len(tracks):
+        return tracks[0] if tracks else None
+
+    start = ends[index - 1] if index else 0
+    track_duration = ends[index] - start
+    position_in_track = position_seconds - start
+    return {
+        **tracks[index],
+        "position": int(position_in_track),
+        "remaining": track_duration - int(position_in_track)
+    }
+
+
+@sa.event.listens_for(RadioStation, "before_insert")
+@sa.event.listens_for(RadioStation, "before_update")
+def _compile_station_timeline(mapper, connection, station):
+    """Rebuild playlist_timeline only when playlist_schedule changed."""
+    if station.playlist_timeline is not None and \
+            not sa.inspect(station).attrs.playlist_schedule.history.has_changes():
+        return
+    station.playlist_timeline = compile_playlist_timeline(
+        (station.playlist_schedule or {}).get("tracks", [])
+    )
+
+
 
 class RadioPlaylist(db.Model):
     __table_args__ = {'extend_existing': True}
@@ -2226,6 +2314,10 @@ class MasteringJob(db.Model):
     analysis = db.Column(db.JSON, nullable=True)
 
     status = db.Column(db.String(20), nullable=False, default="completed")
+    error_message = db.Column(db.Text, nullable=True)
+
+    # Set when the job belongs to a batch (album/EP) request
+    batch_id = db.Column(db.String(36), nullable=True, index=True)
 
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -2248,6 +2340,8 @@ class MasteringJob(db.Model):
             "mastered_url": self.mastered_url,
             "analysis": self.analysis,
             "status": self.status,
+            "error_message": self.error_message,
+            "batch_id": self.batch_id,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -3265,6 +3359,89 @@ class Audio(db.Model):
     def __repr__(self):
         return f'<Audio {self.id}: {self.title}>'
 
+
+class AudioAnalysis(db.Model):
+    """Cached analyzer output keyed by audio content hash (see api/analysis_cache.py)"""
+    __tablename__ = 'audio_analysis'
+    __table_args__ = (
+        db.UniqueConstraint('content_hash', 'analyzer', name='uq_audio_analysis_hash_analyzer'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)  # sha256 of file bytes
+    analyzer = db.Column(db.String(50), nullable=False)                  # e.g. 'mastering_phase3'
+    analyzer_version = db.Column(db.String(20), nullable=False)          # bump to invalidate
+    audio_id = db.Column(db.Integer, db.ForeignKey('audio.id'), nullable=True, index=True)
+    source_url = db.Column(db.String(500), nullable=True, index=True)    # last URL this content was fetched from
+    result = db.Column(db.JSON, nullable=False)
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    audio = db.relationship('Audio', backref=db.backref('analyses', lazy=True))
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "content_hash": self.content_hash,
+            "analyzer": self.analyzer,
+            "analyzer_version": self.analyzer_version,
+            "audio_id": self.audio_id,
+            "source_url": self.source_url,
+            "result": self.result,
+            "hit_count": self.hit_count or 0,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class AudioFingerprint(db.Model):
+    """One perceptual fingerprint per indexed upload (see api/audio_fingerprint.py)"""
+    __tablename__ = 'audio_fingerprints'
+    __table_args__ = (
+        db.Index('ix_audio_fingerprints_source', 'source_type', 'source_id'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # sha256 of file bytes
+    source_type = db.Column(db.String(20), nullable=False)               # 'track_release', 'beat', 'audio'
+    source_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
+    duration_seconds = db.Column(db.Float, nullable=True)
+    landmark_count = db.Column(db.Integer, default=0)
+    algorithm_version = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    landmarks = db.relationship('AudioFingerprintLandmark', backref='fingerprint', lazy='dynamic',
+                                cascade='all, delete-orphan', passive_deletes=True)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "content_hash": self.content_hash,
+            "source_type": self.source_type,
+            "source_id": self.source_id,
+            "user_id": self.user_id,
+            "duration_seconds": self.duration_seconds,
+            "landmark_count": self.landmark_count or 0,
+            "algorithm_version": self.algorithm_version,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class AudioFingerprintLandmark(db.Model):
+    """Inverted index: landmark hash → (fingerprint, time offset in frames)"""
+    __tablename__ = 'audio_fingerprint_landmarks'
+    __table_args__ = {'extend_existing': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    hash = db.Column(db.Integer, nullable=False, index=True)
+    fingerprint_id = db.Column(db.Integer, db.ForeignKey('audio_fingerprints.id', ondelete='CASCADE'),
+                               nullable=False, index=True)
+    time_offset = db.Column(db.Integer, nullable=False)
+
 # Add these to your models.py file
 
 class AudioLike(db.Model):
@@ -4771,6 +4948,7 @@ class TrackRelease(db.Model):
     status = db.Column(db.String(50), default='pending')  # 'pending', 'live', 'rejected', etc.
     platform_links = db.Column(JSON, nullable=True)  # Example: {"spotify": "...", "apple": "..."}
     external_id = db.Column(db.String(120))  # ID returned from Revelator
+    audio_hash = db.Column(db.String(64), nullable=True, index=True)  # sha256 of the uploaded file
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def serialize(self):
@@ -6722,8 +6900,17 @@ class StemSeparationJob(db.Model):
     other_url = db.Column(db.String(500), nullable=True)
 
     # Status
-    status = db.Column(db.String(20), default='completed')         # processing, completed, error
+    status = db.Column(db.String(20), default='completed')         # queued, running, uploading, done, error
     error_message = db.Column(db.String(500), nullable=True)
+    progress_pct = db.Column(db.Integer, default=0)
+    celery_task_id = db.Column(db.String(64), nullable=True)
+    input_path = db.Column(db.String(500), nullable=True)          # spooled upload awaiting the worker
+
+    # Dedup (see api/stem_cache.py)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)   # sha256 of the source bytes
+    output_format = db.Column(db.String(10), default='flac')            # master format; variants via stem_variants
+    source_job_id = db.Column(db.Integer, nullable=True, index=True)     # in-flight job this one waits on
+    cache_status = db.Column(db.String(10), nullable=True)               # miss, hit, coalesced
 
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -6757,9 +6944,74 @@ class StemSeparationJob(db.Model):
             'stem_count': self.stem_count,
             'stems': stems,
             'status': self.status,
+            'progress_pct': self.progress_pct or 0,
+            'error_message': self.error_message,
+            'output_format': self.output_format,
+            'cache_status': self.cache_status,
+            'source_job_id': self.source_job_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
         }
 
+class StemCacheEntry(db.Model):
+    """Finished stems keyed by source content hash, model and format (see api/stem_cache.py)"""
+    __tablename__ = 'stem_cache_entries'
+    __table_args__ = (
+        db.UniqueConstraint('content_hash', 'model_name', 'output_format', name='uq_stem_cache_key'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    model_name = db.Column(db.String(50), nullable=False)
+    output_format = db.Column(db.String(10), nullable=False)
+    stems = db.Column(db.JSON, nullable=False)                     # {stem: {url, name, icon, color, size_mb}}
+    duration_seconds = db.Column(db.Float, nullable=True)
+    source_job_id = db.Column(db.Integer, nullable=True)           # job that computed it
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_hit_at = db.Column(db.DateTime, nullable=True)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "content_hash": self.content_hash,
+            "model_name": self.model_name,
+            "output_format": self.output_format,
+            "stems": self.stems,
+            "duration_seconds": self.duration_seconds,
+            "source_job_id": self.source_job_id,
+            "hit_count": self.hit_count or 0,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "last_hit_at": self.last_hit_at.isoformat() if self.last_hit_at else None,
+        }
+
+
+class StemVariant(db.Model):
+    """Lazily transcoded copy of a lossless stem master (see api/stem_variants.py)"""
+    __tablename__ = 'stem_variants'
+    __table_args__ = (
+        db.UniqueConstraint('master_url', 'output_format', name='uq_stem_variant_master_format'),
+        {'extend_existing': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    master_url = db.Column(db.String(500), nullable=False, index=True)
+    output_format = db.Column(db.String(10), nullable=False)       # mp3, ogg, wav
+    url = db.Column(db.String(500), nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "master_url": self.master_url,
+            "output_format": self.output_format,
+            "url": self.url,
+            "size_bytes": self.size_bytes,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
 class MicSimPreset(db.Model):
     """Custom mic simulator presets created by users"""
     __tablename__ = 'mic_sim_presets'
@@ -6,7 +6,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import os
 from api.models import db, TrackRelease  # ✅ FIX: was "from models import db, TrackRelease"
-from api.utils.audio_filters import validate_uploaded_audio, get_file_hash
+from api.utils.audio_filters import validate_uploaded_stream
+from api.audio_fingerprint import fingerprint_stream, find_duplicate, index_fingerprint
 
 # ✅ FIX: Renamed from 'api' to 'music_upload_bp' to avoid blueprint name collision
 # R2 primary storage
@@ -22,6 +23,13 @@ UPLOAD_FOLDER = "static/uploads/music"
 ALLOWED_EXTENSIONS = {"mp3", "wav", "flac"}
 
 
+class _KnownTrackHashes:
+    """Duplicate-hash membership via the indexed audio_hash column (no full table load)."""
+
+    def __contains__(self, audio_hash):
+        return db.session.query(TrackRelease.id).filter_by(audio_hash=audio_hash).first() is not None
+
+
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -38,23 +46,29 @@ def upload_track():
     if not file or not allowed_file(file.filename):
         return jsonify({"error": "Invalid or missing audio file"}), 400
 
+    # Run filters straight off the upload stream (hash comes from the same read)
+    is_valid, reason, scan = validate_uploaded_stream(file.stream, _KnownTrackHashes())
+    if not is_valid:
+        return jsonify({"error": reason}), 400
+
+    audio_hash = scan["hash"]
+
+    # Perceptual duplicate check (re-encoded / trimmed copies)
+    fingerprint = None
+    try:
+        fingerprint = fingerprint_stream(file.stream)
+        match = find_duplicate(fingerprint, content_hash=audio_hash)
+        if match:
+            return jsonify({"error": "Duplicate audio detected", "match": match}), 400
+    except Exception as e:
+        print(f"⚠️ Fingerprint check skipped: {e}")
+
     filename = secure_filename(file.filename)
     filepath = os.path.join(UPLOAD_FOLDER, filename)
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    file.stream.seek(0)
     file.save(filepath)
 
-    # Pull all known hashes
-    known_hashes = [t.audio_hash for t in TrackRelease.query.with_entities(TrackRelease.audio_hash).all() if t.audio_hash]
-
-    # Run filters
-    is_valid, reason = validate_uploaded_audio(filepath, known_hashes)
-    if not is_valid:
-        os.remove(filepath)
-        return jsonify({"error": reason}), 400
-
-    # Hash it for future deduplication
-    audio_hash = get_file_hash(filepath)
-
     # Save to DB
     new_track = TrackRelease(
         user_id=user_id,
@@ -68,4 +82,13 @@ def upload_track():
     db.session.add(new_track)
     db.session.commit()
 
+    if fingerprint is not None:
+        try:
+            index_fingerprint(fingerprint, "track_release", new_track.id,
+                              user_id=user_id, content_hash=audio_hash)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️ Fingerprint indexing failed for track {new_track.id}: {e}")
+
     return jsonify({"message": "Track uploaded successfully", "track_id": new_track.id}), 201
\ No newline at end of file
@@ -343,7 +343,8 @@ def magic_audio():
     - De-essing (sibilance reduction)
     - Compression (dynamic range control)
 
-    Uses ffmpeg audio filters for processing.
+    Uses ffmpeg audio filters for cleanup; loudness is measured and
+    normalized in one pass by api.loudness (no ffmpeg loudnorm).
     """
     user_id = get_jwt_identity()
     data = request.get_json()
@@ -453,23 +454,17 @@ def magic_audio():
                 f":attack=10:release=100:makeup=2"
             )
 
-            # 9. Loudness normalization (LUFS)
-            filters.append(
-                f"loudnorm=I={config['target_lufs']}:TP=-1.5:LRA=11"
-            )
-
-            # 10. Limiter (prevent clipping)
-            filters.append("alimiter=limit=0.95:attack=5:release=50")
-
             filter_string = ','.join(filters)
 
+            # Float intermediate — loudness/limiting happen below in one pass
+            processed_path = os.path.join(tmpdir, 'processed.wav')
             cmd = [
                 'ffmpeg', '-y',
                 '-i', source_path,
                 '-af', filter_string,
-                '-c:a', 'pcm_s24le',
+                '-c:a', 'pcm_f32le',
                 '-ar', '48000',
-                output_path
+                processed_path
             ]
 
             result = subprocess.run(cmd, capture_output=True, timeout=300)
@@ -480,6 +475,13 @@ def magic_audio():
                     "details": result.stderr.decode()
                 }), 500
 
+            # 9-10. Loudness normalization (BS.1770 LUFS) + true-peak limiting
+            from api.loudness import normalize_file
+            loudness = normalize_file(
+                processed_path, output_path,
+                target_lufs=config['target_lufs'], ceiling_db=-1.5,
+            )
+
             enhanced_url = _upload_to_storage(
                 output_path,
                 f'podcast_enhanced_{episode_id}_{preset}_{int(datetime.utcnow().timestamp())}.wav'
@@ -502,6 +504,8 @@ def magic_audio():
                 "processing": {
                     "noise_reduction": True,
                     "normalization": f"{config['target_lufs']} LUFS",
+                    "measured_lufs": loudness["after"]["integrated_lufs"],
+                    "true_peak_dbtp": loudness["after"]["true_peak_dbtp"],
                     "compression": f"{config['compressor_ratio']}:1",
                     "eq": "voice optimized",
                     "de_essing": True,
@@ -0,0 +1,327 @@
+# src/api/radio_break_scheduler.py
+# =====================================================
+# AI DJ BREAK LOOK-AHEAD — StreamPireX
+# =====================================================
+# Talk breaks (script → TTS → upload) take seconds to make,
+# so rendering them when the transition arrives leaves dead
+# air. Stations that opt in (dj_config.prerender_breaks) get
+# their NEXT break rendered on the IO pool ahead of time by
+# an APScheduler job walking the loop timeline
+# (RadioStation.upcoming_transitions). Each render is a paid
+# LLM + TTS call, so it is charged to the station owner's
+# AI credits when rendered and skipped when they run out.
+# RADIO_BREAK_LOOKAHEAD=0 turns the job off entirely.
+#
+# Ready breaks sit in a per-station queue keyed by the
+# transition's offset on the loop:
+#   - each entry expires after RADIO_BREAK_TTL seconds
+#     (scripts mention the time of day / listener count)
+#   - the queue carries a playlist signature; any change to
+#     tracks, loop start or DJ voice drops it
+#   - breaks dropped unused have their upload deleted
+#
+# trigger_next_break takes the ready break for the coming
+# transition and falls back to rendering on demand.
+# =====================================================
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from api.models import db, RadioStation
+from api.audio_workers import submit_io
+
+# Only the next transition is ever rendered; 0 disables look-ahead
+LOOKAHEAD_BREAKS = min(int(os.environ.get("RADIO_BREAK_LOOKAHEAD", "1")), 1)
+LOOKAHEAD_INTERVAL = int(os.environ.get("RADIO_BREAK_SCHEDULER_INTERVAL", "30"))
+BREAK_TTL = int(os.environ.get("RADIO_BREAK_TTL", "900"))
+
+_queues = {}     # station_id -> {"signature": str, "breaks": {key: entry}}
+_pending = set()  # (station_id, signature, key) being rendered
+_lock = threading.Lock()
+
+
+# =====================================================
+# STATION STATE
+# =====================================================
+
+def _dj_config(station):
+    return (station.playlist_schedule or {}).get("dj_config", {}) or {}
+
+
+def dj_enabled(station):
+    return bool(station.is_loop_enabled and _dj_config(station).get("enabled"))
+
+
+def prerender_enabled(station):
+    return dj_enabled(station) and bool(_dj_config(station).get("prerender_breaks"))
+
+
+def playlist_signature(station):
+    """Changes whenever a pre-rendered break could be wrong for the station."""
+    schedule = station.playlist_schedule or {}
+    dj_config = _dj_config(station)
+    payload = {
+        "tracks": [
+            [t.get("id"), t.get("audio_file_id"), t.get("duration"), t.get("file_url"), t.get("title")]
+            for t in schedule.get("tracks", [])
+        ],
+        "loop_mode": schedule.get("loop_mode", True),
+        "loop_started_at": station.loop_started_at.isoformat() if station.loop_started_at else None,
+        "persona": dj_config.get("persona"),
+        "voice": dj_config.get("custom_voice_id"),
+        "rules": dj_config.get("rules"),
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _key(transition):
+    return str(int(transition["offset_seconds"]))
+
+
+def _planned_break_type(dj_config):
+    from api.ai_radio_dj import get_next_break_type
+    try:
+        return get_next_break_type(dj_config) or dj_config.get("default_break_type", "song_intro")
+    except Exception:
+        return "song_intro"
+
+
+# =====================================================
+# QUEUE
+# =====================================================
+
+def _delete_uploads(urls):
+    try:
+        from api.r2_storage_setup import deleteFile
+    except ImportError:
+        return  # Cloudinary fallback has no delete helper
+    for url in urls:
+        deleteFile(url)
+
+
+def _discard(entries):
+    """Delete the uploaded audio of breaks that will never be played."""
+    urls = [e["segment"].get("audio_url") for e in entries if e["segment"].get("audio_url")]
+    if urls:
+        submit_io(_delete_uploads, urls)
+
+
+def _queue_for(station_id, signature, dropped):
+    """Station's queue, reset if the playlist changed. Call with _lock held."""
+    queue = _queues.get(station_id)
+    if queue is None or queue["signature"] != signature:
+        if queue is not None and queue["breaks"]:
+            print(f"🔄 Station {station_id} playlist changed — dropped {len(queue['breaks'])} ready break(s)")
+            dropped.extend(queue["breaks"].values())
+        queue = _queues[station_id] = {"signature": signature, "breaks": {}, "served": set()}
+    return queue
+
+
+def invalidate(station_id):
+    """Drop every ready break for a station."""
+    with _lock:
+        queue = _queues.pop(station_id, None)
+    if queue:
+        _discard(queue["breaks"].values())
+
+
+def take_break(station, break_type=None, now=None):
+    """
+    Pop the ready break for the station's next transition and mark the
+    transition served, so look-ahead doesn't render it again. A queued
+    break of another type than an explicitly requested `break_type` is
+    discarded. Returns the segment dict, or None if nothing usable is queued.
+    """
+    transitions = station.upcoming_transitions(1, now=now)
+    if not transitions:
+        return None
+    now = now or datetime.utcnow()
+
+    key = _key(transitions[0])
+    dropped = []
+    with _lock:
+        queue = _queue_for(station.id, playlist_signature(station), dropped)
+        entry = queue["breaks"].pop(key, None)
+        if entry and ((break_type and entry["break_type"] != break_type) or entry["expires_at"] <= now):
+            dropped.append(entry)
+            entry = None
+        if entry:
+            queue["served"].add(key)
+    _discard(dropped)
+
+    return entry["segment"] if entry else None
+
+
+def mark_served(station, now=None):
+    """A break was rendered on demand for the next transition — don't pre-render it too."""
+    transitions = station.upcoming_transitions(1, now=now)
+    if not transitions:
+        return
+    dropped = []
+    with _lock:
+        queue = _queue_for(station.id, playlist_signature(station), dropped)
+        queue["served"].add(_key(transitions[0]))
+    _discard(dropped)
+
+
+def queue_status(station_id, now=None):
+    now = now or datetime.utcnow()
+    with _lock:
+        queue = _queues.get(station_id)
+        entries = list(queue["breaks"].items()) if queue else []
+        pending = sum(1 for p in _pending if p[0] == station_id)
+    return {
+        "station_id": station_id,
+        "ready": [
+            {
+                "offset_seconds": int(key),
+                "starts_at": entry["starts_at"].isoformat(),
+                "break_type": entry["break_type"],
+                "next_track": entry["segment"].get("next_track", {}).get("title"),
+                "expires_in": max(int((entry["expires_at"] - now).total_seconds()), 0),
+            }
+            for key, entry in sorted(entries, key=lambda item: int(item[0]))
+        ],
+        "rendering": pending,
+        "lookahead": LOOKAHEAD_BREAKS,
+    }
+
+
+# =====================================================
+# LOOK-AHEAD RENDERING
+# =====================================================
+
+def _render(app, station_id, owner_id, signature, key, transition, persona_key, break_type, listener_count):
+    from api.ai_radio_dj import generate_break_segment, _check_radio_credits
+    try:
+        with app.app_context():
+            if not _check_radio_credits(owner_id, 'ai_radio_dj_tts'):
+                print(f"💳 Station {station_id} owner out of AI DJ credits — skipping pre-render")
+                return
+            segment = generate_break_segment(
+                station_id=station_id,
+                persona_key=persona_key,
+                break_type=break_type,
+                last_track_info=transition["last_track"],
+                next_track_info=transition["next_track"],
+                listener_count=listener_count,
+            )
+        if not segment:
+            return
+        segment["next_track"] = transition["next_track"]
+
+        with _lock:
+            queue = _queues.get(station_id)
+            stale = queue is None or queue["signature"] != signature
+            if not stale:
+                queue["breaks"][key] = {
+                    "segment": segment,
+                    "break_type": break_type,
+                    "starts_at": transition["starts_at"],
+                    "expires_at": min(
+                        datetime.utcnow() + timedelta(seconds=BREAK_TTL),
+                        transition["starts_at"] + timedelta(seconds=LOOKAHEAD_INTERVAL),
+                    ),
+                }
+        if stale:
+            _discard([{"segment": segment}])  # playlist changed while rendering
+            return
+        print(f"🎙️ Pre-rendered break for station {station_id} @ {transition['starts_at'].isoformat()}")
+    except Exception as e:
+        print(f"⚠️ Break pre-render failed for station {station_id}: {e}")
+    finally:
+        with _lock:
+            _pending.discard((station_id, signature, key))
+
+
+def fill_station(station, now=None):
+    """Queue a render for the station's next transition if it opted in. Returns renders started."""
+    if LOOKAHEAD_BREAKS <= 0 or not prerender_enabled(station):
+        invalidate(station.id)
+        return 0
+
+    now = now or datetime.utcnow()
+    dj_config = _dj_config(station)
+    signature = playlist_signature(station)
+    transitions = station.upcoming_transitions(LOOKAHEAD_BREAKS, now=now)
+    wanted = {_key(t): t for t in transitions}
+
+    to_render, dropped = [], []
+    with _lock:
+        queue = _queue_for(station.id, signature, dropped)
+        for key in list(queue["breaks"]):
+            if key not in wanted or queue["breaks"][key]["expires_at"] <= now:
+                dropped.append(queue["breaks"].pop(key))
+        queue["served"] &= set(wanted)
+        for key, transition in wanted.items():
+            job = (station.id, signature, key)
+            if key in queue["breaks"] or key in queue["served"] or job in _pending:
+                continue
+            _pending.add(job)
+            to_render.append((key, transition))
+    _discard(dropped)
+
+    if not to_render:
+        return 0
+
+    app = current_app._get_current_object()
+    persona_key = dj_config.get("persona", "auto_dj")
+    break_type = _planned_break_type(dj_config)
+    for key, transition in to_render:
+        submit_io(_render, app, station.id, station.user_id, signature, key, transition,
+                  persona_key, break_type, station.followers_count or 0)
+    return len(to_render)
+
+
+def run_lookahead(app):
+    """Scheduler tick: pre-render the next break for live stations that opted in."""
+    with app.app_context():
+        try:
+            stations = RadioStation.query.filter(
+                RadioStation.is_live == True,
+                RadioStation.is_loop_enabled == True,
+                RadioStation.playlist_schedule.isnot(None),
+            ).all()
+        except Exception as e:
+            print(f"⚠️ Break look-ahead query failed: {e}")
+            db.session.rollback()
+            return
+
+        active = set()
+        started = 0
+        for station in stations:
+            if not prerender_enabled(station):
+                continue
+            active.add(station.id)
+            try:
+                started += fill_station(station)
+            except Exception as e:
+                print(f"⚠️ Break look-ahead failed for station {station.id}: {e}")
+
+        for station_id in [s for s in list(_queues) if s not in active]:
+            invalidate(station_id)
+
+        if started:
+            print(f"🎙️ Break look-ahead: rendering {started} break(s) across {len(active)} station(s)")
+
+
+def init_break_scheduler(app, scheduler):
+    """Register the look-ahead tick on the app's APScheduler."""
+    if LOOKAHEAD_BREAKS <= 0:
+        print("⏸️ AI DJ break look-ahead disabled (RADIO_BREAK_LOOKAHEAD=0)")
+        return
+    scheduler.add_job(
+        id="radio_break_lookahead",
+        func=run_lookahead,
+        args=[app],
+        trigger="interval",
+        seconds=LOOKAHEAD_INTERVAL,
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
@@ -0,0 +1,290 @@
+# src/api/radio_directory.py
+# =====================================================
+# RADIO STATION DIRECTORY — StreamPireX
+# =====================================================
+# Browse pages (/radio-stations, /radio-stations/<genre>,
+# /radio/genres, /radio/stations/detailed) are served from one
+# materialized snapshot held in the Flask cache instead of
+# querying + serializing every RadioStation row per hit:
+#
+#   - built with one station query + one creator query
+#   - genre facets (counts + ordered ids) precomputed
+#   - cursor pagination over a fixed newest-first order
+#   - dropped whenever a committed write touches a field the
+#     directory shows (mapper events + after_commit)
+#   - now-playing advanced in place at track boundaries from
+#     the schedules stored in the snapshot — no DB read
+#   - RADIO_DIRECTORY_TTL is only a safety net
+# =====================================================
+
+import base64
+import bisect
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from api.cache import cache
+from api.models import RadioStation, User
+
+DIRECTORY_TTL = int(os.environ.get("RADIO_DIRECTORY_TTL", "600"))
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+CACHE_KEY = "radio_directory:snapshot"
+DEFAULT_GENRE = "Music"
+
+# Columns the directory renders — writes to anything else (plays, revenue…) keep the snapshot
+DIRECTORY_FIELDS = {
+    "name", "description", "is_public", "is_live", "logo_url", "cover_image_url",
+    "followers_count", "created_at", "creator_name", "genres", "preferred_genres",
+    "submission_guidelines", "audio_file_name", "user_id",
+    "playlist_schedule", "playlist_timeline", "is_loop_enabled", "loop_started_at",
+}
+SCHEDULE_TRACK_FIELDS = ("title", "artist", "album", "duration", "artwork_url")
+
+_build_lock = threading.Lock()
+
+
+# =====================================================
+# BUILD
+# =====================================================
+
+def _genre_key(genre):
+    return (genre or "").strip().lower()
+
+
+def _sort_key(entry):
+    return (entry["created_at"] or "", entry["id"])
+
+
+def _ordered_list(entries, ids):
+    """Newest-first ids plus ascending sort keys for cursor lookups."""
+    ids = sorted(ids, key=lambda i: _sort_key(entries[i]), reverse=True)
+    return {"ids": ids, "asc_keys": [_sort_key(entries[i]) for i in reversed(ids)]}
+
+
+def _trimmed_schedule(station):
+    from api.radio_now_playing import schedule_for
+    schedule = schedule_for(station)
+    schedule["tracks"] = [
+        {field: track.get(field) for field in SCHEDULE_TRACK_FIELDS}
+        for track in schedule["tracks"]
+    ]
+    return schedule
+
+
+def build_directory(now=None):
+    from api.radio_now_playing import compute_snapshot
+
+    now = now or datetime.utcnow()
+    stations = RadioStation.query.all()
+    user_ids = {s.user_id for s in stations if s.user_id}
+    usernames = dict(
+        User.query.with_entities(User.id, User.username).filter(User.id.in_(user_ids)).all()
+    ) if user_ids else {}
+
+    entries, schedules = {}, {}
+    facets = {}
+    public_ids = []
+    for station in stations:
+        genres = [g for g in (station.genres or []) if g and g.strip()]
+        entry = {
+            "id": station.id,
+            "name": station.name,
+            "description": station.description or "A great radio station",
+            "genre": genres[0] if genres else DEFAULT_GENRE,
+            "genres": genres,
+            "preferred_genres": station.preferred_genres or [],
+            "image": station.logo_url,
+            "cover_art_url": station.cover_image_url,
+            "cover_image_url": station.cover_image_url,
+            "logo_url": station.logo_url,
+            "creator_name": station.creator_name or usernames.get(station.user_id, "Unknown"),
+            "created_at": station.created_at.isoformat() if station.created_at else None,
+            "is_public": bool(station.is_public),
+            "is_live": bool(station.is_live),
+            "followers_count": station.followers_count or 0,
+            "submission_guidelines": station.submission_guidelines,
+            "file_url": f"/uploads/station_mixes/{station.audio_file_name}" if station.audio_file_name else None,
+            "now_playing": None,
+            "now_playing_ends_at": None,
+        }
+        entries[station.id] = entry
+
+        if station.is_live:
+            schedule = _trimmed_schedule(station)
+            schedules[station.id] = schedule
+            playing = compute_snapshot(schedule, now=now)
+            entry["now_playing"] = playing["now_playing"]
+            entry["now_playing_ends_at"] = playing["ends_at"]
+
+        if not station.is_public:
+            continue
+        public_ids.append(station.id)
+        for key, genre in {_genre_key(g): g.strip() for g in reversed(genres)}.items():
+            facet = facets.setdefault(key, {"name": genre, "ids": [], "live": 0})
+            facet["ids"].append(station.id)
+            facet["live"] += 1 if station.is_live else 0
+
+    snapshot = {
+        "built_at": now.isoformat(),
+        "entries": entries,
+        "schedules": schedules,
+        "all": _ordered_list(entries, entries.keys()),
+        "public": _ordered_list(entries, public_ids),
+        "facets": {
+            key: {"name": facet["name"], "live_count": facet["live"], **_ordered_list(entries, facet["ids"])}
+            for key, facet in facets.items()
+        },
+        "next_boundary": _next_boundary(entries),
+    }
+    return snapshot
+
+
+def _next_boundary(entries):
+    ends = [e["now_playing_ends_at"] for e in entries.values() if e["now_playing_ends_at"]]
+    return min(ends) if ends else None
+
+
+# =====================================================
+# READ / REFRESH
+# =====================================================
+
+def _advance_now_playing(snapshot, now):
+    """Track boundary passed: recompute only the stations whose track ended."""
+    from api.radio_now_playing import compute_snapshot
+
+    stamp = now.isoformat()
+    for station_id, schedule in snapshot["schedules"].items():
+        entry = snapshot["entries"][station_id]
+        if entry["now_playing_ends_at"] and entry["now_playing_ends_at"] <= stamp:
+            playing = compute_snapshot(schedule, now=now)
+            entry["now_playing"] = playing["now_playing"]
+            entry["now_playing_ends_at"] = playing["ends_at"]
+    snapshot["next_boundary"] = _next_boundary(snapshot["entries"])
+
+
+def get_directory(now=None):
+    """Current snapshot — built at most once per invalidation, advanced at track boundaries."""
+    now = now or datetime.utcnow()
+    snapshot = cache.get(CACHE_KEY)
+    if snapshot is None:
+        with _build_lock:
+            snapshot = cache.get(CACHE_KEY)
+            if snapshot is None:
+                snapshot = build_directory(now)
+                cache.set(CACHE_KEY, snapshot, timeout=DIRECTORY_TTL)
+                print(f"📡 Radio directory built: {len(snapshot['entries'])} stations, "
+                      f"{len(snapshot['facets'])} genres")
+                return snapshot
+
+    if snapshot["next_boundary"] and snapshot["next_boundary"] <= now.isoformat():
+        _advance_now_playing(snapshot, now)
+        cache.set(CACHE_KEY, snapshot, timeout=DIRECTORY_TTL)
+    return snapshot
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+
+
+# =====================================================
+# PAGINATION / FACETS
+# =====================================================
+
+def encode_cursor(entry):
+    created_at, station_id = _sort_key(entry)
+    return base64.urlsafe_b64encode(f"{created_at}|{station_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, station_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return (created_at, int(station_id))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def page(snapshot, listing, cursor=None, limit=PAGE_SIZE):
+    """
+    Slice a newest-first listing after `cursor`.
+    Returns (entries, next_cursor); raises ValueError on a malformed cursor.
+    """
+    ids = listing["ids"]
+    start = 0
+    if cursor:
+        key = decode_cursor(cursor)
+        if key is None:
+            raise ValueError("Invalid cursor")
+        # Items sorting below the cursor key come after it in newest-first order
+        start = len(ids) - bisect.bisect_left(listing["asc_keys"], key)
+
+    limit = max(1, min(limit or PAGE_SIZE, MAX_PAGE_SIZE))
+    entries = [snapshot["entries"][i] for i in ids[start:start + limit]]
+    next_cursor = encode_cursor(entries[-1]) if entries and start + limit < len(ids) else None
+    return entries, next_cursor
+
+
+def listing_payload(snapshot, listing, cursor=None, limit=None):
+    """
+    Plain array when no paging args are given (what existing pages expect),
+    otherwise {stations, next_cursor, total}.
+    """
+    if cursor is None and limit is None:
+        return [snapshot["entries"][i] for i in listing["ids"]]
+    entries, next_cursor = page(snapshot, listing, cursor=cursor, limit=limit)
+    return {"stations": entries, "next_cursor": next_cursor, "total": len(listing["ids"])}
+
+
+def facet_listing(snapshot, genre):
+    return snapshot["facets"].get(_genre_key(genre), {"ids": [], "asc_keys": []})
+
+
+def genre_facets(snapshot):
+    facets = [
+        {"genre": facet["name"], "slug": key, "count": len(facet["ids"]), "live_count": facet["live_count"]}
+        for key, facet in snapshot["facets"].items()
+    ]
+    return sorted(facets, key=lambda f: (-f["count"], f["genre"].lower()))
+
+
+# =====================================================
+# INVALIDATION ON WRITE
+# =====================================================
+
+def _touches_directory(station):
+    state = inspect(station)
+    return any(state.attrs[field].history.has_changes() for field in DIRECTORY_FIELDS)
+
+
+def _mark_dirty(mapper, connection, station):
+    session = Session.object_session(station)
+    if session is not None:
+        session.info["radio_directory_dirty"] = True
+
+
+def _mark_dirty_if_changed(mapper, connection, station):
+    if _touches_directory(station):
+        _mark_dirty(mapper, connection, station)
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop("radio_directory_dirty", False):
+        try:
+            invalidate()
+        except Exception as e:
+            print(f"⚠️ Radio directory invalidation failed: {e}")
+
+
+def _discard_after_rollback(session, previous_transaction):
+    session.info.pop("radio_directory_dirty", None)
+
+
+event.listen(RadioStation, "after_insert", _mark_dirty)
+event.listen(RadioStation, "after_delete", _mark_dirty)
+event.listen(RadioStation, "after_update", _mark_dirty_if_changed)
+event.listen(Session, "after_commit", _invalidate_after_commit)
+event.listen(Session, "after_soft_rollback", _discard_after_rollback)
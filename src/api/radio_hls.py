@@ -0,0 +1,530 @@
+# src/api/radio_hls.py
+# =====================================================
+# RADIO HLS PLAYOUT — StreamPireX
+# =====================================================
+# Live stations are served as one shared HLS stream
+# instead of every listener fetching whole track files:
+#
+#   - The station's loop timeline (RadioStation.timeline)
+#     is cut into fixed RADIO_HLS_SEGMENT_SECONDS segments
+#     numbered from loop_started_at, so the live playlist is
+#     a pure function of the wall clock — every listener
+#     gets the same window and stays time-aligned
+#   - Each segment is encoded once by ffmpeg and kept in a
+#     bounded memory + disk cache. Segments own whole AAC
+#     frames on one global 1024-sample grid; each encode
+#     starts HLS_PREROLL_FRAMES early and the priming/pre-roll
+#     frames are trimmed, so consecutive segments splice
+#     without the encoder-delay gap MPEG-TS can't signal
+#   - Concurrent requests for a segment wait on a single
+#     encode; the next few segments are prefetched on the
+#     IO pool whenever the playlist is polled
+#
+# Segment URLs carry a playlist signature, so a playlist
+# change never serves stale audio and segments can be
+# cached by browsers/CDNs as immutable.
+#
+# Register: app.register_blueprint(radio_hls_bp)
+# =====================================================
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, jsonify
+
+from api.models import Audio, RadioStation
+from api.analysis_cache import LRUCache
+from api.audio_workers import submit_io
+
+radio_hls_bp = Blueprint('radio_hls', __name__)
+
+HLS_SEGMENT_SECONDS = int(os.environ.get("RADIO_HLS_SEGMENT_SECONDS", "6"))
+HLS_WINDOW_SEGMENTS = int(os.environ.get("RADIO_HLS_WINDOW_SEGMENTS", "5"))
+HLS_PREFETCH_SEGMENTS = int(os.environ.get("RADIO_HLS_PREFETCH_SEGMENTS", "2"))
+HLS_BITRATE = os.environ.get("RADIO_HLS_BITRATE", "128k")
+HLS_MEMORY_SEGMENTS = int(os.environ.get("RADIO_HLS_MEMORY_SEGMENTS", "256"))
+HLS_DISK_BYTES = int(os.environ.get("RADIO_HLS_DISK_MB", "512")) * 1024 * 1024
+HLS_CACHE_DIR = os.environ.get("RADIO_HLS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "streampirex_hls")
+HLS_ENCODE_TIMEOUT = int(os.environ.get("RADIO_HLS_ENCODE_TIMEOUT", "30"))
+PLAYOUT_REFRESH_SECONDS = int(os.environ.get("RADIO_HLS_PLAYOUT_REFRESH", "10"))
+
+HLS_SAMPLE_RATE = 44100
+AAC_FRAME = 1024             # samples per AAC-LC frame
+AAC_PRIMING_FRAMES = 1       # ffmpeg's aac encoder delay (1024 samples)
+HLS_PREROLL_FRAMES = 2       # real audio encoded ahead of the segment, then dropped
+HLS_POSTROLL_FRAMES = 2      # so the last kept frame isn't encoded against padding
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, HEAD, OPTIONS',
+    'Access-Control-Allow-Headers': 'Range, Content-Type',
+}
+
+
+# =====================================================
+# SEGMENT CACHE (memory LRU in front of a bounded disk dir)
+# =====================================================
+
+class SegmentCache:
+    """Encoded segments by key: hot ones in memory, the rest on disk up to max_bytes."""
+
+    def __init__(self, directory, max_bytes, memory_segments):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(memory_segments)
+        self._files = OrderedDict()  # filename -> size, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".ts") and os.path.isfile(path):
+                entries.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+
+    @staticmethod
+    def _filename(key):
+        return "_".join(str(part) for part in key) + ".ts"
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+        name = self._filename(key)
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+        self.memory.put(key, data)
+        return data
+
+    def contains(self, key):
+        if self.memory.get(key) is not None:
+            return True
+        with self._lock:
+            return self._filename(key) in self._files
+
+    def put(self, key, data):
+        self.memory.put(key, data)
+        name = self._filename(key)
+        path = os.path.join(self.directory, name)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ HLS segment disk write failed: {e}")
+            return
+        with self._lock:
+            self._bytes += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._files:
+            name, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            disk = {"segments": len(self._files), "bytes": self._bytes, "max_bytes": self.max_bytes}
+        return {"memory": self.memory.stats(), "disk": disk}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_segment_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SegmentCache(HLS_CACHE_DIR, HLS_DISK_BYTES, HLS_MEMORY_SEGMENTS)
+    return _cache
+
+
+# =====================================================
+# PLAYOUT (station timeline, refreshed every few seconds)
+# =====================================================
+
+_playouts = {}  # station_id -> playout dict
+_playouts_lock = threading.Lock()
+
+
+def _local_source(file_url):
+    """Map a stored local file_url to a path ffmpeg can open (same layout as stream_radio_station)."""
+    if file_url.startswith('/uploads/station_mixes/'):
+        filename = file_url.replace('/uploads/station_mixes/', '')
+        return os.path.join('src', 'static', 'uploads', 'station_mixes', filename)
+    return file_url[1:] if file_url.startswith('/') else file_url
+
+
+def _build_playout(station):
+    if not station or not station.is_live or not station.loop_started_at:
+        return None
+
+    schedule = station.playlist_schedule or {}
+    tracks = schedule.get("tracks", []) if station.is_loop_enabled else []
+    if tracks:
+        timeline = station.timeline
+        audio_ids = [t.get("audio_file_id") for t in tracks if not t.get("file_url") and t.get("audio_file_id")]
+        audio_urls = {}
+        if audio_ids:
+            audio_urls = {a.id: a.file_url for a in Audio.query.filter(Audio.id.in_(audio_ids)).all()}
+        sources = [t.get("file_url") or audio_urls.get(t.get("audio_file_id")) for t in tracks]
+        ends, loop_seconds = list(timeline["ends"]), timeline["loop_seconds"]
+        loop_mode = schedule.get("loop_mode", True)
+    elif station.loop_audio_url and station.loop_duration_minutes:
+        sources = [station.loop_audio_url]
+        ends = [station.loop_duration_minutes * 60]
+        loop_seconds = ends[0]
+        loop_mode = True
+    else:
+        return None
+
+    if loop_seconds <= 0 or not any(sources):
+        return None
+
+    sources = [(_local_source(s) if s and not s.startswith('http') else s) for s in sources]
+    signature = hashlib.sha1(json.dumps(
+        [sources, ends, loop_mode, station.loop_started_at.isoformat(), HLS_SEGMENT_SECONDS, HLS_BITRATE]
+    ).encode()).hexdigest()[:12]
+
+    return {
+        "station_id": station.id,
+        "signature": signature,
+        "sources": sources,
+        "ends": ends,
+        "loop_seconds": loop_seconds,
+        "loop_mode": loop_mode,
+        "loop_started_at": station.loop_started_at,
+        "loaded_at": time.monotonic(),
+    }
+
+
+def get_playout(station_id):
+    """Cached playout for a live station (DB read at most every PLAYOUT_REFRESH_SECONDS)."""
+    with _playouts_lock:
+        playout = _playouts.get(station_id)
+    if playout and time.monotonic() - playout["loaded_at"] < PLAYOUT_REFRESH_SECONDS:
+        return playout
+
+    playout = _build_playout(RadioStation.query.get(station_id))
+    with _playouts_lock:
+        if playout:
+            _playouts[station_id] = playout
+        else:
+            _playouts.pop(station_id, None)
+    return playout
+
+
+def invalidate_playout(station_id):
+    with _playouts_lock:
+        _playouts.pop(station_id, None)
+
+
+def live_sequence(playout, now=None):
+    """Index of the segment airing now (counted from loop_started_at)."""
+    elapsed = ((now or datetime.utcnow()) - playout["loop_started_at"]).total_seconds()
+    return max(int(elapsed // HLS_SEGMENT_SECONDS), 0)
+
+
+def segment_pieces(playout, seq):
+    """
+    [(source, offset_in_track, seconds)] making up segment `seq` (source
+    None = silence); [] past the end of a non-looping playlist.
+    """
+    return timeline_pieces(playout, seq * HLS_SEGMENT_SECONDS, HLS_SEGMENT_SECONDS)
+
+
+def timeline_pieces(playout, start, seconds):
+    """[(source, offset_in_track, seconds)] covering `seconds` from `start` on the timeline."""
+    ends, loop_seconds = playout["ends"], playout["loop_seconds"]
+    if not playout["loop_mode"] and start >= loop_seconds:
+        return []
+
+    pieces = []
+    position = start % loop_seconds
+    needed = float(seconds)
+    index = next(i for i, end in enumerate(ends) if end > position)
+    while needed > 0.001:
+        track_start = ends[index - 1] if index else 0
+        take = min(needed, ends[index] - position)
+        pieces.append((playout["sources"][index], position - track_start, take))
+        needed -= take
+        position += take
+        if position >= ends[index]:
+            index += 1
+            if index == len(ends):
+                if not playout["loop_mode"]:
+                    break
+                index, position = 0, 0
+    return pieces
+
+
+# =====================================================
+# ENCODE (single-flight per segment)
+# =====================================================
+
+_inflight = {}
+_prefetching = set()   # keys queued on the I/O pool that haven't finished yet
+_inflight_lock = threading.Lock()
+
+
+def segment_frames(seq):
+    """[first, last) global AAC frame indices owned by segment `seq`."""
+    per_segment = HLS_SEGMENT_SECONDS * HLS_SAMPLE_RATE
+    first = -(-seq * per_segment // AAC_FRAME)
+    last = -(-(seq + 1) * per_segment // AAC_FRAME)
+    return first, last
+
+
+def _adts_frames(data):
+    """Split an ADTS stream into its frames."""
+    frames, pos = [], 0
+    while pos + 7 <= len(data):
+        if data[pos] != 0xFF or (data[pos + 1] & 0xF0) != 0xF0:
+            raise RuntimeError("lost ADTS sync")
+        length = ((data[pos + 3] & 0x03) << 11) | (data[pos + 4] << 3) | (data[pos + 5] >> 5)
+        if length < 7:
+            raise RuntimeError("bad ADTS frame")
+        frames.append(data[pos:pos + length])
+        pos += length
+    return frames
+
+
+def _encode_aac(pieces, seconds):
+    """ADTS/AAC for the given timeline pieces, padded with silence to `seconds`."""
+    pieces = pieces or [(None, 0, seconds)]
+    cmd = ["ffmpeg", "-v", "error"]
+    for source, offset, length in pieces:
+        if source:
+            cmd += ["-ss", f"{offset:.6f}", "-t", f"{length:.6f}", "-i", source]
+        else:
+            cmd += ["-f", "lavfi", "-t", f"{length:.6f}", "-i", f"anullsrc=r={HLS_SAMPLE_RATE}:cl=stereo"]
+
+    chains = "".join(
+        f"[{i}:a]aformat=sample_rates={HLS_SAMPLE_RATE}:channel_layouts=stereo[p{i}];"
+        for i in range(len(pieces))
+    )
+    inputs = "".join(f"[p{i}]" for i in range(len(pieces)))
+    graph = f"{chains}{inputs}concat=n={len(pieces)}:v=0:a=1,apad[out]"
+
+    cmd += [
+        "-filter_complex", graph, "-map", "[out]",
+        "-t", f"{seconds:.6f}",
+        "-c:a", "aac", "-b:a", HLS_BITRATE,
+        "-f", "adts", "pipe:1",
+    ]
+    result = subprocess.run(cmd, capture_output=True, timeout=HLS_ENCODE_TIMEOUT)
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(result.stderr.decode(errors="replace")[:300] or "empty segment")
+    return result.stdout
+
+
+def encode_segment(playout, seq):
+    """
+    MPEG-TS/AAC bytes for one segment, timestamped at its place on the
+    timeline. Encodes from HLS_PREROLL_FRAMES before the segment's first
+    frame and keeps only the frames the segment owns.
+    """
+    first, last = segment_frames(seq)
+    preroll = min(HLS_PREROLL_FRAMES, first)
+    encode_from = first - preroll
+    total_frames = (last - encode_from) + HLS_POSTROLL_FRAMES
+
+    start = encode_from * AAC_FRAME / HLS_SAMPLE_RATE
+    seconds = total_frames * AAC_FRAME / HLS_SAMPLE_RATE
+    frames = _adts_frames(_encode_aac(timeline_pieces(playout, start, seconds), seconds))
+
+    # Output frame j decodes input frame j - AAC_PRIMING_FRAMES
+    keep = frames[preroll + AAC_PRIMING_FRAMES: preroll + AAC_PRIMING_FRAMES + (last - first)]
+    if len(keep) != last - first:
+        raise RuntimeError(f"encoder returned {len(frames)} frames, needed {last - encode_from + AAC_PRIMING_FRAMES}")
+
+    result = subprocess.run([
+        "ffmpeg", "-v", "error",
+        "-f", "aac", "-i", "pipe:0",
+        "-c:a", "copy",
+        "-muxdelay", "0", "-muxpreload", "0",
+        "-output_ts_offset", f"{first * AAC_FRAME / HLS_SAMPLE_RATE:.6f}",
+        "-f", "mpegts", "pipe:1",
+    ], input=b"".join(keep), capture_output=True, timeout=HLS_ENCODE_TIMEOUT)
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(result.stderr.decode(errors="replace")[:300] or "empty segment")
+    return result.stdout
+
+
+def get_segment(playout, seq):
+    """Encoded bytes for segment `seq` of `playout`, encoding it at most once."""
+    key = (playout["station_id"], playout["signature"], seq)
+    cache = get_segment_cache()
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+
+    if not leader:
+        event.wait(HLS_ENCODE_TIMEOUT)
+        return cache.get(key)
+
+    try:
+        data = encode_segment(playout, seq)
+        cache.put(key, data)
+        return data
+    except Exception as e:
+        print(f"❌ HLS segment {key} failed: {e}")
+        return None
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+def _prefetch_segment(playout, seq, key):
+    try:
+        get_segment(playout, seq)
+    finally:
+        with _inflight_lock:
+            _prefetching.discard(key)
+
+
+def _prefetch(playout, first_seq):
+    """Queue upcoming segments — each key at most once until its encode finishes."""
+    cache = get_segment_cache()
+    for seq in range(first_seq, first_seq + HLS_PREFETCH_SEGMENTS):
+        key = (playout["station_id"], playout["signature"], seq)
+        if cache.contains(key):
+            continue
+        with _inflight_lock:
+            if key in _inflight or key in _prefetching:
+                continue
+            _prefetching.add(key)
+        try:
+            submit_io(_prefetch_segment, playout, seq, key)
+        except Exception:
+            with _inflight_lock:
+                _prefetching.discard(key)
+            raise
+
+
+# =====================================================
+# PLAYLIST
+# =====================================================
+
+def build_playlist(playout, now=None):
+    now = now or datetime.utcnow()
+    live = live_sequence(playout, now)
+    first = max(live - HLS_WINDOW_SEGMENTS + 1, 0)
+    if not playout["loop_mode"]:
+        last_seq = -(-playout["loop_seconds"] // HLS_SEGMENT_SECONDS) - 1
+        live = min(live, last_seq)
+        first = min(first, live)
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{HLS_SEGMENT_SECONDS}",
+        f"#EXT-X-MEDIA-SEQUENCE:{first}",
+    ]
+    for seq in range(first, live + 1):
+        frame_first, frame_last = segment_frames(seq)
+        starts_at = playout["loop_started_at"] + timedelta(seconds=frame_first * AAC_FRAME / HLS_SAMPLE_RATE)
+        lines.append(f"#EXT-X-PROGRAM-DATE-TIME:{starts_at.isoformat(timespec='milliseconds')}Z")
+        lines.append(f"#EXTINF:{(frame_last - frame_first) * AAC_FRAME / HLS_SAMPLE_RATE:.3f},")
+        lines.append(f"{playout['signature']}/{seq}.ts")
+    if not playout["loop_mode"] and live_sequence(playout, now) > live:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n", live
+
+
+# =====================================================
+# ROUTES
+# =====================================================
+
+@radio_hls_bp.route('/api/radio/<int:station_id>/hls/live.m3u8', methods=['GET'])
+def station_hls_playlist(station_id):
+    """Shared live HLS playlist for a station."""
+    if not shutil.which("ffmpeg"):
+        return jsonify({"error": "HLS playout unavailable"}), 503
+
+    playout = get_playout(station_id)
+    if not playout:
+        return jsonify({"error": "Station is not live"}), 404
+
+    body, live = build_playlist(playout)
+    _prefetch(playout, live + 1)
+
+    return Response(body, mimetype="application/vnd.apple.mpegurl", headers={
+        **CORS_HEADERS,
+        "Cache-Control": f"public, max-age={max(HLS_SEGMENT_SECONDS // 2, 1)}",
+    })
+
+
+@radio_hls_bp.route('/api/radio/<int:station_id>/hls/<signature>/<int:seq>.ts', methods=['GET'])
+def station_hls_segment(station_id, signature, seq):
+    """One encoded segment (immutable — the URL changes with the playlist)."""
+    cache = get_segment_cache()
+    data = cache.get((station_id, signature, seq))
+
+    if data is None:
+        playout = get_playout(station_id)
+        if not playout or playout["signature"] != signature:
+            return jsonify({"error": "Segment expired"}), 404
+        live = live_sequence(playout)
+        # Only the live window and a little ahead — never arbitrary encodes
+        if not (live - 2 * HLS_WINDOW_SEGMENTS <= seq <= live + HLS_PREFETCH_SEGMENTS + 1):
+            return jsonify({"error": "Segment out of range"}), 404
+        data = get_segment(playout, seq)
+        if data is None:
+            return jsonify({"error": "Segment unavailable"}), 503
+
+    return Response(data, mimetype="video/mp2t", headers={
+        **CORS_HEADERS,
+        "Cache-Control": "public, max-age=86400, immutable",
+    })
+
+
+@radio_hls_bp.route('/api/radio/hls/stats', methods=['GET'])
+def hls_stats():
+    """Segment cache and playout stats."""
+    with _playouts_lock:
+        stations = len(_playouts)
+    with _inflight_lock:
+        encoding = len(_inflight)
+    return jsonify({
+        "stations": stations,
+        "encoding": encoding,
+        "segment_seconds": HLS_SEGMENT_SECONDS,
+        "cache": get_segment_cache().stats(),
+    }), 200
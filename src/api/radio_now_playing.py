@@ -0,0 +1,277 @@
+# src/api/radio_now_playing.py
+# =====================================================
+# RADIO NOW-PLAYING PUSH — StreamPireX
+# =====================================================
+# Listeners join the Socket.IO room `radio:<station_id>`
+# (events radio_join / radio_leave in api.socketio) instead
+# of polling GET /radio/<id>/now-playing.
+#
+#   - Each station's schedule (tracks + compiled timeline +
+#     loop start) is read from the DB once and reused for
+#     NOW_PLAYING_REFRESH seconds by every listener, poll and
+#     timer
+#   - One green thread per station with listeners sleeps
+#     until the current track's end and pushes `now_playing`
+#     to the room exactly at the boundary
+#   - Late joiners get the cached snapshot immediately
+#   - Writes (playlist applied, loop started/stopped, manual
+#     now-playing updates) call publish_station(), which
+#     reloads and pushes at once
+#   - A manual now-playing override is kept per station and
+#     applied until the next track boundary (or until the
+#     next publish, when the station has no timeline)
+# =====================================================
+
+import bisect
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from api.models import RadioStation, track_at_position
+from api.socketio import socketio
+
+NOW_PLAYING_REFRESH = int(os.environ.get("RADIO_NOW_PLAYING_REFRESH", "60"))
+BOUNDARY_SLACK_SECONDS = 0.05
+
+_schedules = {}   # station_id -> schedule dict
+_snapshots = {}   # station_id -> last pushed payload
+_listeners = {}   # station_id -> set(sid)
+_timers = {}      # station_id -> generation of the running boundary loop
+_overrides = {}   # station_id -> {"fields": {...}, "until": datetime | None}
+_lock = threading.Lock()
+
+
+def room_name(station_id):
+    return f"radio:{station_id}"
+
+
+# =====================================================
+# SCHEDULE (one DB read per station per refresh)
+# =====================================================
+
+def schedule_for(station):
+    """Schedule dict for an already-loaded station row."""
+    schedule = station.playlist_schedule or {}
+    tracks = schedule.get("tracks", []) if station.is_loop_enabled else []
+    with _lock:
+        override = _overrides.get(station.id)
+    return {
+        "station_id": station.id,
+        "is_live": bool(station.is_live),
+        "tracks": tracks,
+        "ends": list(station.timeline["ends"]) if tracks else [],
+        "loop_mode": schedule.get("loop_mode", True),
+        "loop_started_at": station.loop_started_at,
+        "override": override,
+        "loaded_at": datetime.utcnow(),
+    }
+
+
+def _load_schedule(station_id):
+    station = RadioStation.query.get(station_id)
+    return schedule_for(station) if station else None
+
+
+def get_schedule(station_id, refresh=False):
+    with _lock:
+        schedule = _schedules.get(station_id)
+    stale = schedule is None or \
+        (datetime.utcnow() - schedule["loaded_at"]).total_seconds() > NOW_PLAYING_REFRESH
+    if refresh or stale:
+        schedule = _load_schedule(station_id)
+        with _lock:
+            if schedule:
+                _schedules[station_id] = schedule
+            else:
+                _schedules.pop(station_id, None)
+    return schedule
+
+
+# =====================================================
+# SNAPSHOT
+# =====================================================
+
+def _active_override(schedule, now):
+    override = schedule.get("override")
+    if override and (override["until"] is None or now < override["until"]):
+        return override["fields"]
+    return None
+
+
+def compute_snapshot(schedule, now=None):
+    """
+    GET /now-playing payload for `now`, plus ends_at — when the next
+    push is due (None when nothing will change on its own).
+    """
+    now = now or datetime.utcnow()
+    if not schedule["is_live"]:
+        return {"station_id": schedule["station_id"], "now_playing": None,
+                "message": "Station is offline", "ends_at": None}
+
+    track, ends_at = None, None
+    tracks, ends = schedule["tracks"], schedule["ends"]
+    if tracks and schedule["loop_started_at"]:
+        loop_seconds = ends[-1]
+        elapsed = (now - schedule["loop_started_at"]).total_seconds()
+        if elapsed > loop_seconds and (not schedule["loop_mode"] or loop_seconds <= 0):
+            track = tracks[0]
+        else:
+            position = elapsed % loop_seconds if elapsed > loop_seconds else elapsed
+            track = track_at_position(tracks, ends, position)
+            index = min(bisect.bisect_left(ends, position), len(ends) - 1)
+            ends_at = now + timedelta(seconds=max(ends[index] - position, 0))
+
+    track = {**(track or {}), **(_active_override(schedule, now) or {})}
+    started = schedule["loop_started_at"]
+    return {
+        "station_id": schedule["station_id"],
+        "now_playing": {
+            "title": track.get("title") or "Unknown",
+            "artist": track.get("artist") or "Unknown",
+            "album": track.get("album"),
+            "duration": track.get("duration"),
+            "artwork_url": track.get("artwork_url"),
+            "started_at": started.isoformat() if started else None,
+        },
+        "ends_at": ends_at.isoformat() if ends_at else None,
+    }
+
+
+def get_now_playing(station_id):
+    """Snapshot for a poll or late joiner — no DB hit while the schedule is fresh."""
+    schedule = get_schedule(station_id)
+    if not schedule:
+        return None
+    with _lock:
+        cached = _snapshots.get(station_id)
+    # No ends_at: nothing changes until the next publish_station
+    if cached and (not cached["ends_at"] or datetime.fromisoformat(cached["ends_at"]) > datetime.utcnow()):
+        return cached
+    return compute_snapshot(schedule)
+
+
+# =====================================================
+# PUSH
+# =====================================================
+
+def _emit(station_id, snapshot):
+    with _lock:
+        _snapshots[station_id] = snapshot
+    socketio.emit("now_playing", snapshot, to=room_name(station_id))
+
+
+def _changed(old, new):
+    """New track (or the same track restarting) since `old` was pushed."""
+    if not old or old.get("now_playing") != new.get("now_playing"):
+        return True
+    if bool(old.get("ends_at")) != bool(new.get("ends_at")):
+        return True
+    if not new.get("ends_at"):
+        return False
+    moved = datetime.fromisoformat(new["ends_at"]) - datetime.fromisoformat(old["ends_at"])
+    return abs(moved.total_seconds()) > 1
+
+
+def _boundary_loop(app, station_id, generation):
+    """Sleep to each track boundary and push the new track while anyone listens."""
+    while True:
+        with _lock:
+            if _timers.get(station_id) != generation or not _listeners.get(station_id):
+                if _timers.get(station_id) == generation:
+                    _timers.pop(station_id, None)
+                return
+            snapshot = _snapshots.get(station_id)
+
+        wait = NOW_PLAYING_REFRESH
+        if snapshot and snapshot.get("ends_at"):
+            until = (datetime.fromisoformat(snapshot["ends_at"]) - datetime.utcnow()).total_seconds()
+            wait = min(max(until, 0) + BOUNDARY_SLACK_SECONDS, NOW_PLAYING_REFRESH)
+        socketio.sleep(wait)
+
+        try:
+            with app.app_context():
+                schedule = get_schedule(station_id)
+            if not schedule:
+                continue
+            fresh = compute_snapshot(schedule)
+            if _changed(snapshot, fresh):
+                _emit(station_id, fresh)
+            else:
+                with _lock:
+                    _snapshots[station_id] = fresh
+        except Exception as e:
+            print(f"⚠️ Now-playing push failed for station {station_id}: {e}")
+
+
+def _ensure_timer(station_id, restart=False):
+    with _lock:
+        if not _listeners.get(station_id):
+            return
+        if station_id in _timers and not restart:
+            return
+        generation = _timers.get(station_id, 0) + 1
+        _timers[station_id] = generation
+    socketio.start_background_task(_boundary_loop, current_app._get_current_object(), station_id, generation)
+
+
+def add_listener(station_id, sid):
+    """Register a room member; returns the snapshot to send them."""
+    with _lock:
+        _listeners.setdefault(station_id, set()).add(sid)
+    snapshot = get_now_playing(station_id)
+    if snapshot:
+        with _lock:
+            _snapshots.setdefault(station_id, snapshot)
+    _ensure_timer(station_id)
+    return snapshot
+
+
+def remove_listener(station_id, sid):
+    with _lock:
+        members = _listeners.get(station_id)
+        if members:
+            members.discard(sid)
+            if not members:
+                del _listeners[station_id]
+
+
+def remove_sid(sid):
+    """Disconnect cleanup: drop sid from every radio room."""
+    with _lock:
+        station_ids = [s for s, members in _listeners.items() if sid in members]
+    for station_id in station_ids:
+        remove_listener(station_id, sid)
+
+
+def publish_station(station_id, override=None):
+    """
+    Station metadata changed: reload its schedule and push to listeners now.
+    `override` (e.g. {"title": ...}) replaces the current track's fields
+    until its boundary; any publish without one clears the previous one.
+    """
+    try:
+        with _lock:
+            _overrides.pop(station_id, None)
+        schedule = get_schedule(station_id, refresh=True)
+        if not schedule:
+            with _lock:
+                _snapshots.pop(station_id, None)
+            return
+        if override:
+            ends_at = compute_snapshot(schedule)["ends_at"]
+            entry = {"fields": dict(override),
+                     "until": datetime.fromisoformat(ends_at) if ends_at else None}
+            with _lock:
+                _overrides[station_id] = entry
+            schedule["override"] = entry
+        _emit(station_id, compute_snapshot(schedule))
+        _ensure_timer(station_id, restart=True)
+    except Exception as e:
+        print(f"⚠️ Now-playing publish failed for station {station_id}: {e}")
+
+
+def listener_count(station_id):
+    with _lock:
+        return len(_listeners.get(station_id, ()))
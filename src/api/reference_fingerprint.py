@@ -0,0 +1,311 @@
+# src/api/reference_fingerprint.py
+# =====================================================
+# REFERENCE FINGERPRINTS — StreamPireX
+# =====================================================
+# A reference track is analyzed once into a compact
+# fingerprint (mid/side spectrum curves on a 1/6-octave
+# grid, loud-section RMS, stereo width, peak). Reference
+# masters then only analyze the target and match it to
+# the stored numbers:
+#
+#   1. Mid/side EQ — linear-phase FIR from the curve diff
+#   2. Stereo width — scale side to the reference ratio
+#   3. Loudness — match loud-section RMS
+#   4. Limiter + safety normalization
+#
+# Persistence:
+#   - Built-in references (static/references) get a JSON
+#     sidecar next to the WAV, usable from worker processes
+#   - Everything else goes through analysis_cache (content
+#     hash → audio_analysis row) when an app context exists
+#   - Both sit behind an in-process LRU
+# =====================================================
+
+import json
+import os
+import traceback
+
+import numpy as np
+import soundfile as sf
+from scipy import signal
+from flask import has_app_context
+
+from api.analysis_cache import LRUCache, cached_analysis, hash_file
+from api.audio_loader import load_audio
+from api.loudness import PeakLimiter
+
+FINGERPRINT_ANALYZER = "reference_fingerprint"
+FINGERPRINT_VERSION = "1"
+
+WELCH_NPERSEG = 4096
+BANDS_PER_OCTAVE = 6
+BAND_MIN_HZ = 20.0
+BAND_MAX_HZ = 20000.0
+LOUD_FRAME_SECONDS = 0.4
+LOUD_FRACTION = 0.2
+FIR_TAPS = 4097
+MAX_EQ_DB = 12.0
+
+_memory = LRUCache(int(os.environ.get("REFERENCE_FINGERPRINT_CACHE_SIZE", "64")))
+
+
+# =====================================================
+# ANALYSIS
+# =====================================================
+
+def _load(path):
+    """(channels, samples) float32 + sample rate."""
+    decoded = load_audio(path)
+    return decoded.data, decoded.sample_rate
+
+
+def _mid_side(audio):
+    if audio.shape[0] < 2:
+        return audio[0], None
+    left, right = audio[0], audio[1]
+    return (left + right) * 0.5, (left - right) * 0.5
+
+
+def band_centers():
+    n = int(np.floor(BANDS_PER_OCTAVE * np.log2(BAND_MAX_HZ / BAND_MIN_HZ))) + 1
+    return BAND_MIN_HZ * 2.0 ** (np.arange(n) / BANDS_PER_OCTAVE)
+
+
+def spectrum_curve(x, sr):
+    """Welch PSD averaged into 1/6-octave bands, in dB (list aligned to band_centers())."""
+    centers = band_centers()
+    if x is None or len(x) == 0:
+        return [-120.0] * len(centers)
+    freqs, psd = signal.welch(x, fs=sr, nperseg=min(WELCH_NPERSEG, len(x)))
+    half = 2.0 ** (0.5 / BANDS_PER_OCTAVE)
+    curve = []
+    last = -120.0
+    for fc in centers:
+        mask = (freqs >= fc / half) & (freqs < fc * half)
+        if np.any(mask):
+            last = float(10 * np.log10(np.mean(psd[mask]) + 1e-20))
+        # bands above Nyquist (or narrower than a bin) repeat the last value
+        curve.append(round(last, 3))
+    return curve
+
+
+def loud_rms(audio, sr):
+    """RMS of the loudest LOUD_FRACTION of LOUD_FRAME_SECONDS frames."""
+    frame = max(1, int(sr * LOUD_FRAME_SECONDS))
+    mono_sq = np.mean(np.square(audio, dtype=np.float64), axis=0)
+    n_frames = len(mono_sq) // frame
+    if n_frames < 1:
+        return float(np.sqrt(np.mean(mono_sq))) if len(mono_sq) else 0.0
+    frames = np.sqrt(mono_sq[:n_frames * frame].reshape(n_frames, frame).mean(axis=1))
+    k = max(1, int(np.ceil(n_frames * LOUD_FRACTION)))
+    return float(np.mean(np.sort(frames)[-k:]))
+
+
+def _stereo_width(mid, side):
+    if side is None:
+        return 0.0
+    mid_rms = float(np.sqrt(np.mean(np.square(mid, dtype=np.float64))))
+    side_rms = float(np.sqrt(np.mean(np.square(side, dtype=np.float64))))
+    return side_rms / mid_rms if mid_rms > 1e-10 else 0.0
+
+
+def compute_fingerprint(path):
+    """Analyze a reference file into a JSON-serializable fingerprint."""
+    audio, sr = _load(path)
+    mid, side = _mid_side(audio)
+    return {
+        "version": FINGERPRINT_VERSION,
+        "sample_rate": int(sr),
+        "channels": int(audio.shape[0]),
+        "duration_seconds": round(audio.shape[1] / sr, 2) if sr else 0.0,
+        "bands_per_octave": BANDS_PER_OCTAVE,
+        "band_min_hz": BAND_MIN_HZ,
+        "mid_curve": spectrum_curve(mid, sr),
+        "side_curve": spectrum_curve(side, sr) if side is not None else None,
+        "rms": round(float(np.sqrt(np.mean(np.square(audio, dtype=np.float64)))), 6),
+        "loud_rms": round(loud_rms(audio, sr), 6),
+        "stereo_width": round(_stereo_width(mid, side), 4),
+        "peak": round(float(np.max(np.abs(audio))) if audio.size else 0.0, 4),
+    }
+
+
+# =====================================================
+# STORE / LOOKUP
+# =====================================================
+
+def _sidecar_path(path):
+    return os.path.splitext(path)[0] + ".fingerprint.json"
+
+
+def _is_builtin_reference(path):
+    from api.ai_mastering import REFERENCE_TRACKS_DIR
+    ref_dir = os.path.realpath(REFERENCE_TRACKS_DIR)
+    return os.path.realpath(path).startswith(ref_dir + os.sep)
+
+
+def _read_sidecar(path, stat):
+    try:
+        with open(_sidecar_path(path)) as f:
+            data = json.load(f)
+        if (data.get("version") == FINGERPRINT_VERSION
+                and data.get("source_size") == stat.st_size
+                and data.get("source_mtime") == int(stat.st_mtime)):
+            return data["fingerprint"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _write_sidecar(path, stat, fingerprint):
+    try:
+        with open(_sidecar_path(path), "w") as f:
+            json.dump({
+                "version": FINGERPRINT_VERSION,
+                "source_size": stat.st_size,
+                "source_mtime": int(stat.st_mtime),
+                "fingerprint": fingerprint,
+            }, f)
+    except OSError as e:
+        print(f"⚠️ Could not write reference fingerprint sidecar: {e}")
+
+
+def get_reference_fingerprint(path):
+    """
+    Fingerprint for a reference file, computed at most once per
+    file content. Returns (fingerprint, was_cached).
+    """
+    stat = os.stat(path)
+
+    if _is_builtin_reference(path):
+        key = ("builtin", os.path.realpath(path), stat.st_size, int(stat.st_mtime))
+        hit = _memory.get(key)
+        if hit is not None:
+            return hit, True
+        fingerprint = _read_sidecar(path, stat)
+        was_cached = fingerprint is not None
+        if fingerprint is None:
+            fingerprint = compute_fingerprint(path)
+            _write_sidecar(path, stat, fingerprint)
+        _memory.put(key, fingerprint)
+        return fingerprint, was_cached
+
+    content_hash = hash_file(path)
+    key = ("hash", content_hash)
+    hit = _memory.get(key)
+    if hit is not None:
+        return hit, True
+
+    if has_app_context():
+        fingerprint, _, was_cached = cached_analysis(
+            FINGERPRINT_ANALYZER, FINGERPRINT_VERSION, path, compute_fingerprint,
+            content_hash=content_hash,
+        )
+    else:
+        fingerprint, was_cached = compute_fingerprint(path), False
+    _memory.put(key, fingerprint)
+    return fingerprint, was_cached
+
+
+# =====================================================
+# MATCHING
+# =====================================================
+
+def _shape(curve):
+    """Curve relative to its own mean over the 60 Hz – 12 kHz body."""
+    arr = np.asarray(curve, dtype=np.float64)
+    centers = band_centers()
+    body = (centers >= 60) & (centers <= 12000)
+    return arr - np.mean(arr[body])
+
+
+def _eq_fir(ref_curve, target_curve, sr):
+    """Linear-phase FIR that moves target_curve's shape onto ref_curve's."""
+    diff_db = _shape(ref_curve) - _shape(target_curve)
+    diff_db = np.convolve(diff_db, np.ones(3) / 3, mode="same")
+    diff_db = np.clip(diff_db, -MAX_EQ_DB, MAX_EQ_DB)
+
+    nyquist = sr / 2.0
+    centers = band_centers()
+    keep = centers < nyquist
+    freq = np.concatenate(([0.0], centers[keep] / nyquist, [1.0]))
+    gain_db = np.concatenate(([diff_db[keep][0]], diff_db[keep], [diff_db[keep][-1]]))
+    return signal.firwin2(FIR_TAPS, freq, 10 ** (gain_db / 20.0))
+
+
+def match_to_fingerprint(target_path, fingerprint, output_path):
+    """Master target_path toward a reference fingerprint. Returns the stats dict."""
+    audio, sr = _load(target_path)
+    peak_before = float(np.max(np.abs(audio))) if audio.size else 0.0
+    rms_before = float(np.sqrt(np.mean(np.square(audio, dtype=np.float64)))) if audio.size else 0.0
+    channels = int(audio.shape[0])
+
+    mid, side = _mid_side(audio)
+
+    # 1. Spectral match (mid and side separately)
+    mid = signal.oaconvolve(mid, _eq_fir(fingerprint["mid_curve"], spectrum_curve(mid, sr), sr), mode="same")
+    if side is not None and fingerprint.get("side_curve"):
+        side = signal.oaconvolve(side, _eq_fir(fingerprint["side_curve"], spectrum_curve(side, sr), sr),
+                                 mode="same")
+
+    # 2. Stereo width
+    if side is not None and fingerprint.get("stereo_width"):
+        width = _stereo_width(mid, side)
+        if width > 1e-6:
+            side = side * float(np.clip(fingerprint["stereo_width"] / width, 0.25, 4.0))
+
+    if side is None:
+        matched = mid.reshape(1, -1)
+    else:
+        matched = np.stack([mid + side, mid - side])
+        if channels > 2:
+            matched = np.concatenate([matched, audio[2:]])
+
+    # 3. Loudness
+    target_loud = loud_rms(matched, sr)
+    if target_loud > 1e-10 and fingerprint.get("loud_rms"):
+        matched = matched * (fingerprint["loud_rms"] / target_loud)
+
+    # 4. Peak limiter at the reference's ceiling (unity gain below it)
+    ceiling_db = 20 * np.log10(max(min(fingerprint.get("peak") or 1.0, 1.0), 1e-3))
+    limiter = PeakLimiter(sr, matched.shape[0], min(float(ceiling_db), -0.1))
+    mastered = np.concatenate((limiter.process(matched), limiter.flush()), axis=1).astype(np.float32)
+
+    peak_after = float(np.max(np.abs(mastered))) if mastered.size else 0.0
+    rms_after = float(np.sqrt(np.mean(np.square(mastered, dtype=np.float64)))) if mastered.size else 0.0
+    if peak_after > 1.0:
+        mastered = mastered / peak_after * 0.99
+        peak_after = 0.99
+
+    sf.write(output_path, mastered.T, sr, subtype='PCM_24')
+
+    loudness_increase_db = 0.0
+    if rms_before > 1e-10 and rms_after > 1e-10:
+        loudness_increase_db = round(20 * np.log10(rms_after / rms_before), 2)
+
+    return {
+        "duration_seconds": round(audio.shape[1] / sr, 2) if sr else 0.0,
+        "sample_rate": int(sr),
+        "channels": channels,
+        "peak_before": round(peak_before, 4),
+        "peak_after": round(peak_after, 4),
+        "rms_before": round(rms_before, 6),
+        "rms_after": round(rms_after, 6),
+        "loudness_increase_db": loudness_increase_db,
+    }
+
+
+def master_to_reference(target_path, reference_path, output_path):
+    """
+    Fingerprint the reference (cached) and match the target to it.
+    Returns the stats dict with fingerprint_cached, or None on failure
+    so callers can fall back to Matchering.
+    """
+    try:
+        fingerprint, was_cached = get_reference_fingerprint(reference_path)
+        stats = match_to_fingerprint(target_path, fingerprint, output_path)
+        stats["fingerprint_cached"] = was_cached
+        return stats
+    except Exception as e:
+        print(f"⚠️ Fingerprint reference match failed: {e}")
+        traceback.print_exc()
+        return None
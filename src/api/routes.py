@@ -19,7 +19,7 @@ import stripe
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
 import hashlib
 import random
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, safe_join
 from werkzeug.security import generate_password_hash,check_password_hash
 from datetime import datetime, timedelta
 from .socketio import socketio
@@ -140,6 +140,8 @@ from decimal import Decimal
 # ✅ FIXED: Only import the functions you need, not the SocketIO class
 from flask_socketio import join_room, emit, leave_room
 from api.cache import cache  # Assuming Flask-Caching is set up
+from api.media_responder import send_media
+from api import radio_directory
 from apscheduler.schedulers.background import BackgroundScheduler
 scheduler = APScheduler()
 
@@ -2264,46 +2266,22 @@ def track_radio_share():
 
 @api.route('/radio-stations', methods=['GET'])
 def get_all_radio_stations():
-    """Get all public radio stations for Browse Radio Stations page"""
+    """
+    Get all public radio stations for Browse Radio Stations page.
+    Served from the cached station directory (api.radio_directory);
+    pass ?limit=&cursor= for cursor pagination.
+    """
     try:
-        # Get all public stations, newest first
-        stations = RadioStation.query.filter_by(is_public=True).order_by(RadioStation.created_at.desc()).all()
-        
-        stations_data = []
-        for station in stations:
-            # Get creator info
-            creator = User.query.get(station.user_id)
-            
-            # Determine genre - your model uses 'genres' array
-            genre = "Music"  # Default
-            if station.genres and len(station.genres) > 0:
-                genre = station.genres[0]  # Use first genre
-            
-            # Construct file_url from audio_file_name
-            file_url = None
-            if station.audio_file_name:
-                file_url = f"/uploads/station_mixes/{station.audio_file_name}"
-            
-            # Build station data for frontend
-            station_data = {
-                "id": station.id,
-                "name": station.name,
-                "description": station.description or "A great radio station",
-                "genre": genre,  # BrowseRadioStations expects this field
-                "image": station.logo_url,  # For compatibility with frontend
-                "cover_art_url": station.cover_image_url,
-                "logo_url": station.logo_url,
-                "creator_name": station.creator_name or (creator.username if creator else "Unknown"),
-                "created_at": station.created_at.isoformat() if station.created_at else None,
-                "is_live": station.is_live,
-                "followers_count": station.followers_count,
-                "file_url": file_url  # ✅ Added file_url from audio_file_name
-            }
-            stations_data.append(station_data)
-        
-        print(f"📡 Returning {len(stations_data)} radio stations to frontend")
-        return jsonify(stations_data), 200
-        
+        snapshot = radio_directory.get_directory()
+        payload = radio_directory.listing_payload(
+            snapshot, snapshot["public"],
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+        )
+        return jsonify(payload), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"❌ Error fetching radio stations: {e}")
         return jsonify([]), 200  # Return empty array on error
@@ -5920,11 +5898,9 @@ def update_now_playing(station_id):
     data = request.json
     track_title = data.get("track_title")
 
-    # 🔄 Notify WebSocket
-    requests.post("http://localhost:5000/track-update", json={
-        "stationId": station_id,
-        "track": {"title": track_title}
-    })
+    # 🔄 Push to listeners in the station's Socket.IO room
+    from api.radio_now_playing import publish_station
+    publish_station(station_id, override={"title": track_title} if track_title else None)
 
     return jsonify({"message": "Now Playing updated!"}), 200
 
@@ -7803,6 +7779,7 @@ def get_all_radio_stations_admin():
     try:
         # Get ALL stations (public and private) for admin
         stations = RadioStation.query.order_by(RadioStation.created_at.desc()).all()
+        now_playing = RadioStation.current_tracks(stations)
         
         stations_data = []
         for station in stations:
@@ -7860,7 +7837,7 @@ def get_all_radio_stations_admin():
                 "loop_started_at": station.loop_started_at.isoformat() if station.loop_started_at else None,
                 
                 # Current Status
-                "now_playing": station.get_current_track(),
+                "now_playing": now_playing.get(station.id),
                 "status": "Live" if station.is_live else "Offline"
             }
             stations_data.append(station_data)
@@ -7903,76 +7880,35 @@ def is_admin(user_id):
 
 @api.route('/radio-stations', methods=['GET'])
 def get_all_radio_stations_public():
-    """Public endpoint to get all radio stations for Browse Radio Stations page"""
-    try:
-        # Get all public stations, newest first
-        stations = RadioStation.query.filter_by(is_public=True).order_by(RadioStation.created_at.desc()).all()
-        
-        stations_data = []
-        for station in stations:
-            # Get creator info
-            creator = User.query.get(station.user_id)
-            
-            # Determine genre from your genres array
-            genre = "Music"  # Default
-            if station.genres and len(station.genres) > 0:
-                genre = station.genres[0]  # Use first genre
-            
-            # Build station data compatible with your frontend
-            station_data = {
-                "id": station.id,
-                "name": station.name,
-                "description": station.description or "A great radio station",
-                "genre": genre,  # BrowseRadioStations.js expects this field
-                "image": station.logo_url,  # Frontend looks for this
-                "cover_art_url": station.cover_image_url,
-                "logo_url": station.logo_url,
-                "creator_name": station.creator_name or (creator.username if creator else "Unknown"),
-                "created_at": station.created_at.isoformat() if station.created_at else None,
-                "is_live": station.is_live,
-                "followers_count": station.followers_count,
-                "genres": station.genres or []
-            }
-            stations_data.append(station_data)
-        
-        print(f"📡 Public API: Returning {len(stations_data)} radio stations")
-        return jsonify(stations_data), 200
-        
-    except Exception as e:
-        print(f"❌ Error in public radio stations API: {e}")
-        return jsonify([]), 200  # Return empty array on error
+    """Public endpoint to get all radio stations (same directory as get_all_radio_stations)"""
+    return get_all_radio_stations()
 
 @api.route('/radio/genres', methods=['GET'])
 def get_radio_genres():
-    url = "https://www.radio-browser.info/webservice/json/stations"
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        stations = response.json()
-
-        # Extract unique genres from the stations list
-        genres = set()
-        for station in stations:
-            if 'genre' in station and station['genre']:
-                genre_list = station['genre'].split(',')  # Some genres might be comma-separated
-                for genre in genre_list:
-                    genres.add(genre.strip())  # Clean and add genre
-
-        return jsonify(list(genres))  # Return unique genres as a list
-    else:
-        return jsonify({"error": "Failed to fetch data from Radio Browser API"}), 500
-
+    """Genre facets of our public stations, precomputed in the station directory"""
+    try:
+        snapshot = radio_directory.get_directory()
+        return jsonify(radio_directory.genre_facets(snapshot)), 200
+    except Exception as e:
+        print(f"❌ Error fetching radio genres: {e}")
+        return jsonify([]), 200
 
 
 @api.route('/radio-stations/<genre>', methods=['GET'])
 def get_radio_stations_by_genre(genre):
-    url = f"https://www.radio-browser.info/webservice/json/stations/bygenre/{genre}"
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        stations = response.json()
-        return jsonify(stations)
-    else:
+    """Public stations in a genre (case-insensitive); ?limit=&cursor= paginates"""
+    try:
+        snapshot = radio_directory.get_directory()
+        payload = radio_directory.listing_payload(
+            snapshot, radio_directory.facet_listing(snapshot, genre),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int),
+        )
+        return jsonify(payload), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error fetching {genre} stations: {e}")
         return jsonify({"error": "Failed to fetch stations for this genre"}), 500
 
 @api.route('/delete_video/<int:video_id>', methods=['DELETE'])
@@ -10343,21 +10279,23 @@ def get_crossplay_games():
 # Enhanced station endpoint
 @api.route('/radio/stations/detailed', methods=['GET'])
 def get_detailed_stations():
-    stations = RadioStation.query.all()
+    snapshot = radio_directory.get_directory()
+    stations = [snapshot["entries"][i] for i in snapshot["all"]["ids"]]
     return jsonify([{
-        "id": station.id,
-        "name": station.name,
-        "description": station.description,
-        "genres": station.genres or [],  # ✅ Correct field name
-        "preferred_genres": station.preferred_genres or [],  # ✅ Alternative field
-        "followers": station.followers_count,  # ✅ Correct field name
-        "submission_guidelines": station.submission_guidelines,  # ✅ Correct field name
-        "creator_name": station.creator_name,
-        "is_public": station.is_public,
-        "is_live": station.is_live,
-        "logo_url": station.logo_url,
-        "cover_image_url": station.cover_image_url,
-        "created_at": station.created_at.isoformat() if station.created_at else None
+        "id": station["id"],
+        "name": station["name"],
+        "description": station["description"],
+        "genres": station["genres"],
+        "preferred_genres": station["preferred_genres"],
+        "followers": station["followers_count"],
+        "submission_guidelines": station["submission_guidelines"],
+        "creator_name": station["creator_name"],
+        "is_public": station["is_public"],
+        "is_live": station["is_live"],
+        "logo_url": station["logo_url"],
+        "cover_image_url": station["cover_image_url"],
+        "created_at": station["created_at"],
+        "now_playing": station["now_playing"],
     } for station in stations])
 
 # Get Artist Profile (specific route)
@@ -10924,6 +10862,8 @@ def start_radio_loop(station_id):
         'message': f'{station.name} loop started!',
         'now_playing': station.get_current_track()
     })
+    from api.radio_now_playing import publish_station
+    publish_station(station_id)
     
     return jsonify({
         "message": "Radio loop started!",
@@ -10952,6 +10892,8 @@ def stop_radio_loop(station_id):
         'station_id': station_id,
         'message': f'{station.name} stopped broadcasting'
     })
+    from api.radio_now_playing import publish_station
+    publish_station(station_id)
     
     return jsonify({"message": "Radio loop stopped"}), 200
 
@@ -11340,6 +11282,7 @@ def stream_radio_station(station_id):
         
         # ✅ UPDATED: Handle both Cloudinary URLs and local files
         audio_url = None
+        current_track_info = station.get_current_track() if station.playlist_schedule else None
         
         # Priority 1: Check for direct Cloudinary URLs in station
         if station.loop_audio_url and station.loop_audio_url.startswith('http'):
@@ -11348,7 +11291,6 @@ def stream_radio_station(station_id):
         
         # Priority 2: Check current track for Cloudinary URL
         elif station.playlist_schedule and station.playlist_schedule.get("tracks"):
-            current_track_info = station.get_current_track()
             if current_track_info and current_track_info.get("file_url"):
                 file_url = current_track_info.get("file_url")
                 if file_url.startswith('http'):
@@ -11357,7 +11299,6 @@ def stream_radio_station(station_id):
         
         # Priority 3: Check Audio table for Cloudinary URL
         if not audio_url and station.playlist_schedule:
-            current_track_info = station.get_current_track()
             if current_track_info:
                 track_id = current_track_info.get("id")
                 audio = Audio.query.get(track_id) if track_id else None
@@ -11378,7 +11319,6 @@ def stream_radio_station(station_id):
         
         # ✅ FALLBACK: Handle local files (for backward compatibility)
         if station.playlist_schedule and station.playlist_schedule.get("tracks"):
-            current_track_info = station.get_current_track()
             if current_track_info:
                 track_id = current_track_info.get("id")
                 audio = Audio.query.get(track_id) if track_id else None
@@ -11411,44 +11351,9 @@ def stream_radio_station(station_id):
 
 
 def stream_local_file(file_path, station_name):
-    """Helper function to stream local files"""
+    """Helper function to stream local files (Range / conditional aware)"""
     try:
-        # Get MIME type
-        import mimetypes
-        mimetype, _ = mimetypes.guess_type(file_path)
-        if not mimetype:
-            mimetype = 'audio/mpeg'
-        
-        # Create streaming response for local files
-        def generate_audio():
-            try:
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(8192)  # 8KB chunks
-                        if not chunk:
-                            break
-                        yield chunk
-            except Exception as e:
-                print(f"❌ Local streaming error: {e}")
-        
-        # Create response with proper headers
-        response = Response(
-            generate_audio(),
-            mimetype=mimetype,
-            headers={
-                'Accept-Ranges': 'bytes',
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, HEAD, OPTIONS',
-                'Access-Control-Allow-Headers': 'Range, Content-Type',
-                'Content-Disposition': f'inline; filename="{os.path.basename(file_path)}"'
-            }
-        )
-        
-        return response
-        
+        return send_media(file_path)
     except Exception as e:
         print(f"❌ Local file streaming error: {e}")
         return jsonify({"error": "Local file streaming error"}), 500
@@ -11481,6 +11386,7 @@ def get_station_audio_url(station_id):
         
         # Get the direct Cloudinary URL
         audio_url = None
+        current_track_info = station.get_current_track() if station.playlist_schedule else None
         
         # Priority 1: Station's loop_audio_url (Cloudinary)
         if station.loop_audio_url and station.loop_audio_url.startswith('http'):
@@ -11488,7 +11394,6 @@ def get_station_audio_url(station_id):
         
         # Priority 2: Current track URL (Cloudinary)
         elif station.playlist_schedule:
-            current_track_info = station.get_current_track()
             if current_track_info and current_track_info.get("file_url"):
                 file_url = current_track_info.get("file_url")
                 if file_url.startswith('http'):
@@ -11496,7 +11401,6 @@ def get_station_audio_url(station_id):
         
         # Priority 3: Audio record URL (Cloudinary)
         if not audio_url and station.playlist_schedule:
-            current_track_info = station.get_current_track()
             if current_track_info:
                 track_id = current_track_info.get("id")
                 audio = Audio.query.get(track_id) if track_id else None
@@ -11511,7 +11415,7 @@ def get_station_audio_url(station_id):
             "station_name": station.name,
             "audio_url": audio_url,
             "is_live": station.is_live,
-            "current_track": station.get_current_track()
+            "current_track": current_track_info
         }), 200
         
     except Exception as e:
@@ -11870,31 +11774,19 @@ def get_radio_station(station_id):
 @api.route('/radio/<int:station_id>/now-playing', methods=['GET'])
 @handle_db_errors
 def get_now_playing(station_id):
-    """Get now playing information with proper error handling"""
+    """
+    Get now playing information. Served from the shared per-station
+    snapshot (api.radio_now_playing) — live pages subscribe to the
+    `radio:<id>` Socket.IO room and only fall back to this poll.
+    """
+    from api.radio_now_playing import get_now_playing as now_playing_snapshot
     try:
-        station = RadioStation.query.get(station_id)
+        snapshot = now_playing_snapshot(station_id)
         
-        if not station:
+        if not snapshot:
             return jsonify({"error": "Station not found"}), 404
         
-        if not station.is_live:
-            return jsonify({
-                "now_playing": None,
-                "message": "Station is offline"
-            }), 200
-        
-        # Get current track info using your model's method
-        current_track = station.get_current_track()
-        
-        return jsonify({
-            "now_playing": {
-                "title": current_track.get("title") if current_track else "Unknown",
-                "artist": current_track.get("artist") if current_track else "Unknown", 
-                "album": current_track.get("album") if current_track else None,
-                "duration": current_track.get("duration") if current_track else None,
-                "started_at": station.loop_started_at.isoformat() if station.loop_started_at else None
-            }
-        }), 200
+        return jsonify(snapshot), 200
         
     except Exception as e:
         current_app.logger.error(f"Error fetching now playing for station {station_id}: {str(e)}")
@@ -12172,8 +12064,10 @@ def uploaded_audio(filename):
 @api.route('/uploads/station_mixes/<filename>')
 def serve_station_mix(filename):
     directory = os.path.join('src', 'static', 'uploads', 'station_mixes')
-    print("🎧 Serving mix from:", directory)
-    return send_from_directory(directory, filename)
+    file_path = safe_join(directory, filename)
+    if not file_path:
+        return jsonify({"error": "File not found"}), 404
+    return send_media(file_path)
 
 @api.route('/radio/<int:station_id>/stream')
 def stream_station_audio(station_id):
@@ -12189,9 +12083,11 @@ def stream_station_audio(station_id):
     # Add src/static as base path
     full_directory = os.path.join("src", "static", directory)
 
-    print(f"🎧 Serving from: {full_directory}/{filename}")
-    
-    return send_from_directory(full_directory, filename, mimetype="audio/mpeg")
+    file_path = safe_join(full_directory, filename)
+    if not file_path:
+        return jsonify({"error": "File not found"}), 404
+
+    return send_media(file_path, mimetype="audio/mpeg")
 
 # ✅ Create a Group
 @api.route("/groups", methods=["POST"])
@@ -1,5 +1,6 @@
 # src/api/socketio.py
 
+import os
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
 from datetime import datetime
@@ -129,6 +130,10 @@ def _remove_sid_from_podcast_rooms(sid: str):
 
             print(f"🎙️ {user_name} removed from podcast collab room {room_id} via disconnect")
 
+def _remove_sid_from_radio_rooms(sid: str):
+    from api.radio_now_playing import remove_sid
+    remove_sid(sid)
+
 
 # -----------------------------------------------------------------------------
 # Core connect/disconnect
@@ -149,6 +154,7 @@ def handle_disconnect():
     _remove_sid_from_chat_rooms(sid)
     _remove_sid_from_team_rooms(sid)
     _remove_sid_from_podcast_rooms(sid)
+    _remove_sid_from_radio_rooms(sid)
 
 
 # -----------------------------------------------------------------------------
@@ -1010,6 +1016,39 @@ def on_daw_chat(data):
         emit('daw:chat', data, room=session_id, include_self=False)
 
 
+# -----------------------------------------------------------------------------
+# 6) Radio now-playing (server pushes `now_playing` at track boundaries)
+# -----------------------------------------------------------------------------
+
+def _station_id(data):
+    try:
+        return int((data or {}).get("stationId"))
+    except (TypeError, ValueError):
+        return None
+
+@socketio.on("radio_join")
+def handle_radio_join(data):
+    from api.radio_now_playing import room_name, add_listener
+    station_id = _station_id(data)
+    if not station_id:
+        return
+
+    join_room(room_name(station_id))
+    snapshot = add_listener(station_id, request.sid)
+    if snapshot:
+        emit("now_playing", snapshot)
+
+@socketio.on("radio_leave")
+def handle_radio_leave(data):
+    from api.radio_now_playing import room_name, remove_listener
+    station_id = _station_id(data)
+    if not station_id:
+        return
+
+    leave_room(room_name(station_id))
+    remove_listener(station_id, request.sid)
+
+
 # -----------------------------------------------------------------------------
 # init
 # -----------------------------------------------------------------------------
@@ -1023,6 +1062,8 @@ def init_socketio(app):
         logger=True,
         engineio_logger=True,
         manage_session=False,
+        # Redis URL lets Celery workers emit to connected clients (e.g. stem job progress)
+        message_queue=os.environ.get("SOCKETIO_MESSAGE_QUEUE"),
         # IMPORTANT:
         # If you can install eventlet, use async_mode="eventlet" for best websocket support.
         # If not, threading works but can be less reliable under load.
@@ -0,0 +1,168 @@
+# src/api/stem_cache.py
+# =====================================================
+# STEM OUTPUT CACHE — StreamPireX
+# =====================================================
+# Finished stems keyed by (sha256 of the source bytes,
+# Demucs model, output format). A repeat separation of
+# the same file — same Audio row or a copy uploaded to
+# another project — reuses the stored stem URLs instead
+# of running Demucs again.
+#
+# Concurrent identical jobs are coalesced: the lowest-id
+# in-flight job with the same key computes, later ones
+# record it as source_job_id and are filled in when it
+# finishes (see ai_stem_separation.run_stem_separation_job).
+#
+# Every job records cache_status (miss / hit / coalesced),
+# so the hit rate survives restarts and spans workers.
+# =====================================================
+
+from datetime import datetime
+
+from sqlalchemy import func
+
+from api.models import db, AudioAnalysis, StemSeparationJob, StemCacheEntry
+
+IN_FLIGHT_STATUSES = ("queued", "running", "uploading")
+DONE_STATUSES = ("done", "completed")
+
+
+# =====================================================
+# LOOKUPS
+# =====================================================
+
+def lookup(content_hash, model_name, output_format):
+    """Return the cached stems dict ({stem: {url, ...}}) or None."""
+    if not content_hash:
+        return None
+    try:
+        entry = StemCacheEntry.query.filter_by(
+            content_hash=content_hash, model_name=model_name, output_format=output_format
+        ).first()
+        if not entry:
+            return None
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_hit_at = datetime.utcnow()
+        db.session.commit()
+        return dict(entry.stems)
+    except Exception as e:
+        print(f"⚠️ Stem cache lookup failed: {e}")
+        db.session.rollback()
+        return None
+
+
+def hash_for_audio(audio):
+    """
+    Content hash of an Audio row's current file without downloading it:
+    from an earlier stem job or analysis of the same file_url.
+    """
+    if audio is None or not audio.file_url:
+        return None
+    try:
+        job = StemSeparationJob.query.filter(
+            StemSeparationJob.audio_id == audio.id,
+            StemSeparationJob.original_url == audio.file_url,
+            StemSeparationJob.content_hash.isnot(None),
+        ).order_by(StemSeparationJob.id.desc()).first()
+        if job:
+            return job.content_hash
+
+        row = AudioAnalysis.query.filter_by(audio_id=audio.id, source_url=audio.file_url).first()
+        return row.content_hash if row else None
+    except Exception as e:
+        print(f"⚠️ Stem cache hash lookup failed: {e}")
+        db.session.rollback()
+        return None
+
+
+def find_in_flight(job):
+    """
+    The job this one should wait on: the lowest-id queued/running job
+    with the same key that is computing itself. Ordering by id makes
+    two racing jobs agree on a single leader.
+    """
+    if not job.content_hash:
+        return None
+    return StemSeparationJob.query.filter(
+        StemSeparationJob.content_hash == job.content_hash,
+        StemSeparationJob.model_used == job.model_used,
+        StemSeparationJob.output_format == job.output_format,
+        StemSeparationJob.status.in_(IN_FLIGHT_STATUSES),
+        StemSeparationJob.source_job_id.is_(None),
+        StemSeparationJob.id < job.id,
+    ).order_by(StemSeparationJob.id.asc()).first()
+
+
+def followers(job):
+    """Jobs coalesced onto `job` that are still waiting."""
+    return StemSeparationJob.query.filter(
+        StemSeparationJob.source_job_id == job.id,
+        StemSeparationJob.status.in_(IN_FLIGHT_STATUSES),
+    ).all()
+
+
+# =====================================================
+# STORE
+# =====================================================
+
+def store(content_hash, model_name, output_format, stems, duration=None, source_job_id=None):
+    """Persist finished stems under their key (first writer wins)."""
+    if not content_hash or not stems:
+        return
+    try:
+        entry = StemCacheEntry.query.filter_by(
+            content_hash=content_hash, model_name=model_name, output_format=output_format
+        ).first()
+        if entry is None:
+            db.session.add(StemCacheEntry(
+                content_hash=content_hash,
+                model_name=model_name,
+                output_format=output_format,
+                stems=stems,
+                duration_seconds=duration,
+                source_job_id=source_job_id,
+                hit_count=0,
+            ))
+            db.session.commit()
+    except Exception as e:
+        print(f"⚠️ Stem cache store failed: {e}")
+        db.session.rollback()
+
+
+def invalidate(content_hash, model_name=None):
+    """Drop cached stems for a source (e.g. after the stem files were deleted)."""
+    try:
+        query = StemCacheEntry.query.filter_by(content_hash=content_hash)
+        if model_name:
+            query = query.filter_by(model_name=model_name)
+        query.delete()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def cache_stats():
+    """Hit rate over all jobs that went through the dedup layer."""
+    try:
+        counts = dict(
+            db.session.query(StemSeparationJob.cache_status, func.count(StemSeparationJob.id))
+            .filter(StemSeparationJob.cache_status.isnot(None))
+            .group_by(StemSeparationJob.cache_status)
+            .all()
+        )
+        entries = db.session.query(func.count(StemCacheEntry.id)).scalar() or 0
+    except Exception as e:
+        print(f"⚠️ Stem cache stats failed: {e}")
+        db.session.rollback()
+        return {}
+
+    hits = counts.get("hit", 0)
+    coalesced = counts.get("coalesced", 0)
+    total = hits + coalesced + counts.get("miss", 0)
+    return {
+        "entries": entries,
+        "hits": hits,
+        "coalesced": coalesced,
+        "misses": counts.get("miss", 0),
+        "hit_rate": round((hits + coalesced) / total, 3) if total else 0.0,
+    }
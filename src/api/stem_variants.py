@@ -0,0 +1,187 @@
+# src/api/stem_variants.py
+# =====================================================
+# STEM FORMAT VARIANTS — StreamPireX
+# =====================================================
+# Separation uploads one lossless master per stem
+# (24-bit FLAC). Delivery formats are produced lazily:
+#
+#   - First request for (master, format) starts a build on
+#     the I/O pool (download master, transcode on the CPU
+#     pool, upload to R2) and returns at once; clients poll
+#     until the URL exists
+#   - The URL is recorded in stem_variants, so every job
+#     sharing that master (cache hits, coalesced jobs)
+#     reuses it
+#   - Concurrent requests for the same variant in one
+#     process share a single build
+#
+# Internal consumers (mixing, mastering, sampler) read the
+# master directly and skip a lossy decode.
+# =====================================================
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from flask import current_app
+import numpy as np
+import requests
+import soundfile as sf
+from sqlalchemy.exc import IntegrityError
+
+from api.models import db, StemVariant
+from api.audio_workers import submit_cpu, submit_io
+try:
+    from api.r2_storage_setup import uploadFile
+except ImportError:
+    from api.cloudinary_setup import uploadFile
+
+MASTER_FORMAT = "flac"
+MP3_BITRATE = 320
+VARIANT_TIMEOUT = int(os.environ.get("STEM_VARIANT_TIMEOUT", "300"))
+
+# soundfile settings per delivery format; ffmpeg args when it's installed
+VARIANT_FORMATS = {
+    "mp3": {"format": "MP3", "subtype": "MPEG_LAYER_III",
+            "ffmpeg": ["-codec:a", "libmp3lame", "-b:a", f"{MP3_BITRATE}k"]},
+    "ogg": {"format": "OGG", "subtype": "VORBIS",
+            "ffmpeg": ["-codec:a", "libvorbis", "-q:a", "6"]},
+    "wav": {"format": "WAV", "subtype": "PCM_16",
+            "ffmpeg": ["-codec:a", "pcm_s16le"]},
+}
+
+_building = set()  # (master_url, fmt) with a build queued or running
+_failures = {}     # (master_url, fmt) -> error from the last failed build
+_inflight_lock = threading.Lock()
+
+
+# =====================================================
+# TRANSCODE (runs on the CPU pool)
+# =====================================================
+
+def transcode(src_path, dst_path, fmt):
+    """Encode a lossless master to a delivery format. Returns dst_path."""
+    spec = VARIANT_FORMATS[fmt]
+    if shutil.which("ffmpeg"):
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-v", "error", "-i", src_path, *spec["ffmpeg"], dst_path],
+            capture_output=True, text=True, timeout=VARIANT_TIMEOUT
+        )
+        if result.returncode == 0:
+            return dst_path
+        print(f"⚠️ ffmpeg transcode failed, using soundfile: {result.stderr[:200]}")
+
+    extra = {}
+    if fmt == "mp3":
+        # compression_level 0 → highest constant bitrate libsndfile offers
+        extra = {"compression_level": 0.0, "bitrate_mode": "CONSTANT"}
+    with sf.SoundFile(src_path) as src, \
+            sf.SoundFile(dst_path, "w", src.samplerate, src.channels,
+                         format=spec["format"], subtype=spec["subtype"], **extra) as dst:
+        for block in src.blocks(blocksize=1 << 16, dtype="float32", always_2d=True):
+            dst.write(np.clip(block, -1.0, 1.0))
+    return dst_path
+
+
+# =====================================================
+# LOOKUP / BUILD
+# =====================================================
+
+def known_variants(master_urls):
+    """{master_url: {format: url}} for already-built variants."""
+    urls = [u for u in master_urls if u]
+    if not urls:
+        return {}
+    found = {}
+    try:
+        for row in StemVariant.query.filter(StemVariant.master_url.in_(urls)).all():
+            found.setdefault(row.master_url, {})[row.output_format] = row.url
+    except Exception as e:
+        print(f"⚠️ Stem variant lookup failed: {e}")
+        db.session.rollback()
+    return found
+
+
+def _variant_name(master_url, fmt):
+    base = os.path.splitext(os.path.basename(master_url.split('?')[0]))[0] or "stem"
+    return f"{base}.{fmt}"
+
+
+def _build(master_url, fmt):
+    temp_dir = tempfile.mkdtemp()
+    try:
+        src_path = os.path.join(temp_dir, f"master.{MASTER_FORMAT}")
+        response = requests.get(master_url, stream=True, timeout=120)
+        response.raise_for_status()
+        with open(src_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+
+        dst_path = os.path.join(temp_dir, _variant_name(master_url, fmt))
+        submit_cpu(transcode, src_path, dst_path, fmt).result(timeout=VARIANT_TIMEOUT)
+
+        with open(dst_path, 'rb') as f:
+            url = uploadFile(f, os.path.basename(dst_path))
+        size = os.path.getsize(dst_path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    try:
+        db.session.add(StemVariant(master_url=master_url, output_format=fmt, url=url, size_bytes=size))
+        db.session.commit()
+    except IntegrityError:
+        # Another process built it first — serve theirs
+        db.session.rollback()
+        row = StemVariant.query.filter_by(master_url=master_url, output_format=fmt).first()
+        if row:
+            url = row.url
+    print(f"🎚️ Stem variant {fmt}: {url}")
+    return url
+
+
+def find_variant(master_url, fmt):
+    """URL of `master_url` in `fmt` if it already exists (the master serves its own format), else None."""
+    if fmt == MASTER_FORMAT or os.path.splitext(master_url.split('?')[0])[1].lstrip('.').lower() == fmt:
+        return master_url
+    if fmt not in VARIANT_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    row = StemVariant.query.filter_by(master_url=master_url, output_format=fmt).first()
+    return row.url if row else None
+
+
+def _build_in_app(app, master_url, fmt):
+    key = (master_url, fmt)
+    try:
+        with app.app_context():
+            _build(master_url, fmt)
+    except Exception as e:
+        print(f"❌ Stem variant {fmt} failed for {master_url}: {e}")
+        with _inflight_lock:
+            _failures[key] = str(e)
+    finally:
+        with _inflight_lock:
+            _building.discard(key)
+
+
+def request_variant(master_url, fmt):
+    """
+    Queue a build of `master_url` in `fmt` on the I/O pool unless one is
+    already running. Returns the error of the previous failed build (and
+    forgets it, so the next request retries), else None.
+    """
+    key = (master_url, fmt)
+    with _inflight_lock:
+        error = _failures.pop(key, None)
+        if error or key in _building:
+            return error
+        _building.add(key)
+    try:
+        submit_io(_build_in_app, current_app._get_current_object(), master_url, fmt)
+    except Exception:
+        with _inflight_lock:
+            _building.discard(key)
+        raise
+    return None
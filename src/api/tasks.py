@@ -1,5 +1,17 @@
 from datetime import datetime
-from src.celery_app import celery
+try:
+    from src.celery_app import celery
+except ImportError:  # web process runs with src/ itself on sys.path
+    from celery_app import celery
+
+
+def _get_app():
+    try:
+        from app import app
+    except ImportError:
+        from src.app import app
+    return app
+
 
 @celery.task(bind=True)
 def run_ai_job(self, job_id, feature, payload=None):
@@ -17,3 +29,14 @@ def run_ai_job(self, job_id, feature, payload=None):
         "provider": payload.get("provider", "stub"),
         "completed_at": datetime.utcnow().isoformat(),
     }
+
+
+# Explicit name: the web tier imports this module as api.tasks, the
+# worker as src.api.tasks — both must agree on the task name.
+@celery.task(bind=True, name="stems.separate")
+def separate_stems_task(self, job_id):
+    """Download → Demucs → concurrent stem uploads for one StemSeparationJob."""
+    app = _get_app()
+    with app.app_context():
+        from api.ai_stem_separation import run_stem_separation_job
+        return run_stem_separation_job(job_id, task_id=self.request.id)
@@ -1,56 +1,209 @@
 # ✅ StreampireX Upload Filters (to use in your Flask route)
-import os
+import io
 import hashlib
-import wave
-import contextlib
-from pydub import AudioSegment
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+import soundfile as sf
+
+from api.audio_loader import probe_audio_info
 
 # --- Config
 MIN_DURATION_SECONDS = 30
 MAX_DURATION_SECONDS = 600  # 10 min
 SILENCE_THRESHOLD_DB = -50.0  # Silence threshold in dBFS
 SILENCE_PERCENT_LIMIT = 0.9  # Reject if 90% is silence
+SILENCE_FRAME_MS = 1  # Same 1 ms chunks pydub iterates
+HASH_CHUNK_BYTES = 1024 * 1024
+SCAN_BLOCK_FRAMES = 4096  # Silence frames per decoded block
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024  # Non-seekable uploads spill to disk past this
 
 # --- Check 1: Audio duration
 
 def get_audio_duration(path):
-    with contextlib.closing(wave.open(path, 'r')) as f:
-        frames = f.getnframes()
-        rate = f.getframerate()
-        return frames / float(rate)
+    # Container headers only — works for any format soundfile/ffprobe can read
+    info = probe_audio_info(path)
+    return info[2] if info else 0.0
 
 # --- Check 2: Detect silence percentage
 
+def _silent_frame_counts(block, frame_len, threshold_sq):
+    """(silent, total) full frames in a (samples, channels) block."""
+    n_frames = block.shape[0] // frame_len
+    if n_frames == 0:
+        return 0, 0
+    # Framed RMS matrix: one row per frame (all channels), compared as sum of squares
+    frames = block[:n_frames * frame_len].reshape(n_frames, frame_len * block.shape[1])
+    sum_sq = np.einsum("ij,ij->i", frames, frames)
+    return int(np.count_nonzero(sum_sq < threshold_sq * frames.shape[1])), n_frames
+
+
+def _silence_ratio(blocks, sample_rate):
+    frame_len = max(1, sample_rate * SILENCE_FRAME_MS // 1000)
+    threshold_sq = 10 ** (SILENCE_THRESHOLD_DB / 10.0)
+    silent = total = 0
+    for block in blocks:
+        s, t = _silent_frame_counts(block, frame_len, threshold_sq)
+        silent += s
+        total += t
+    return silent / total if total else 1.0
+
+
+def _ffmpeg_pcm(data):
+    """Fallback decode of raw bytes soundfile can't parse → (samples, 2) float32 at 44.1 kHz."""
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", "pipe:0", "-f", "f32le", "-acodec", "pcm_f32le",
+         "-ac", "2", "-ar", "44100", "pipe:1"],
+        input=data, capture_output=True, timeout=300
+    )
+    if result.returncode != 0 or not result.stdout:
+        return None
+    samples = np.frombuffer(result.stdout, dtype=np.float32)
+    return samples[: len(samples) - (len(samples) % 2)].reshape(-1, 2), 44100
+
+
+class _HashingReader:
+    """
+    Seekable stream wrapper that feeds bytes to SHA-256 in order as the
+    decoder reads them. Reads past the hashed prefix (e.g. a trailer
+    probed before decoding) aren't hashed; hexdigest() reads whatever
+    is still unhashed once decoding is done.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._hashed = stream.tell()
+        self._digest = hashlib.sha256()
+
+    def _catch_up(self, pos):
+        self._stream.seek(self._hashed)
+        while self._hashed < pos:
+            chunk = self._stream.read(min(HASH_CHUNK_BYTES, pos - self._hashed))
+            if not chunk:
+                break
+            self._digest.update(chunk)
+            self._hashed += len(chunk)
+        self._stream.seek(pos)
+
+    def read(self, size=-1):
+        pos = self._stream.tell()
+        data = self._stream.read(size)
+        end = pos + len(data)
+        if pos <= self._hashed < end:
+            self._digest.update(data[self._hashed - pos:])
+            self._hashed = end
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
+
+    def seekable(self):
+        return True
+
+    def hexdigest(self):
+        pos = self._stream.tell()
+        self._catch_up(self._stream.seek(0, io.SEEK_END))
+        self._stream.seek(pos)
+        return self._digest.hexdigest()
+
+
+def scan_audio(source):
+    """
+    One read of an upload (path or binary stream): the decoder's reads
+    feed the content hash, header duration comes from the container, and
+    silence ratio from a framed RMS matrix decoded block by block.
+    Non-seekable streams are spooled (to disk past SPOOL_MEMORY_BYTES);
+    seekable ones are rewound afterwards.
+    Returns {"hash", "duration", "sample_rate", "channels", "silence_ratio"}.
+    """
+    owned = isinstance(source, (str, bytes)) or hasattr(source, "__fspath__")
+    stream = source_stream = open(source, "rb") if owned else source
+    spool = None
+    try:
+        if not stream.seekable():
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+            shutil.copyfileobj(stream, spool, HASH_CHUNK_BYTES)
+            spool.seek(0)
+            stream = spool
+
+        start = stream.tell()
+        reader = _HashingReader(stream)
+        scan = {"hash": None, "duration": 0.0, "sample_rate": 0,
+                "channels": 0, "silence_ratio": 1.0}
+        try:
+            with sf.SoundFile(reader) as f:
+                sr = f.samplerate
+                scan.update(sample_rate=sr, channels=f.channels,
+                            duration=f.frames / float(sr) if sr else 0.0)
+                # Out-of-range durations are rejected before any decoding
+                if MIN_DURATION_SECONDS <= scan["duration"] <= MAX_DURATION_SECONDS:
+                    frame_len = max(1, sr * SILENCE_FRAME_MS // 1000)
+                    blocks = f.blocks(blocksize=frame_len * SCAN_BLOCK_FRAMES,
+                                      dtype="float32", always_2d=True)
+                    scan["silence_ratio"] = _silence_ratio(blocks, sr)
+        except (sf.LibsndfileError, RuntimeError):
+            reader.seek(start)
+            decoded = _ffmpeg_pcm(reader.read())
+            if decoded is not None:
+                samples, sr = decoded
+                scan.update(sample_rate=sr, channels=2, duration=samples.shape[0] / float(sr),
+                            silence_ratio=_silence_ratio([samples], sr))
+        scan["hash"] = reader.hexdigest()
+        stream.seek(start)
+        return scan
+    finally:
+        if spool is not None:
+            spool.close()
+        if owned:
+            source_stream.close()
+
+
 def is_mostly_silent(path):
-    audio = AudioSegment.from_file(path)
-    silent_chunks = [chunk for chunk in audio if chunk.dBFS < SILENCE_THRESHOLD_DB]
-    return len(silent_chunks) / len(audio) > SILENCE_PERCENT_LIMIT
+    return scan_audio(path)["silence_ratio"] > SILENCE_PERCENT_LIMIT
 
 # --- Check 3: File duplication via hash
 
 def get_file_hash(path):
     hash_md5 = hashlib.sha256()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
             hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
 # --- Main Validator
 
-def validate_uploaded_audio(file_path, uploaded_hashes):
-    duration = get_audio_duration(file_path)
+def _check_scan(scan, uploaded_hashes):
+    duration = scan["duration"]
     if duration < MIN_DURATION_SECONDS or duration > MAX_DURATION_SECONDS:
         return False, f"Invalid duration: {duration:.1f} sec"
 
-    if is_mostly_silent(file_path):
+    if scan["silence_ratio"] > SILENCE_PERCENT_LIMIT:
         return False, "Audio rejected: mostly silent"
 
-    track_hash = get_file_hash(file_path)
-    if track_hash in uploaded_hashes:
+    if scan["hash"] in uploaded_hashes:
         return False, "Duplicate audio detected"
 
     return True, "Audio passed all checks"
 
+
+def validate_uploaded_audio(file_path, uploaded_hashes):
+    return _check_scan(scan_audio(file_path), uploaded_hashes)
+
+
+def validate_uploaded_stream(stream, uploaded_hashes):
+    """
+    Validate straight from the upload stream (e.g. FileStorage.stream) —
+    nothing touches disk. Returns (is_valid, reason, scan); scan["hash"]
+    is the SHA-256 of the stream for dedup storage.
+    """
+    scan = scan_audio(stream)
+    is_valid, reason = _check_scan(scan, uploaded_hashes)
+    return is_valid, reason, scan
+
 # --- Example usage in Flask route:
-# is_valid, reason = validate_uploaded_audio(file_path, known_hashes_from_db)
+# is_valid, reason, scan = validate_uploaded_stream(file.stream, known_hashes_from_db)
 # if not is_valid: return jsonify({"error": reason}), 400
@@ -22,6 +22,7 @@ from api.academy_ai_routes import academy_ai_bp
 from api.advanced_ai_routes import advanced_ai_bp
 import api.advanced_ai_models
 from api.audio_routes import audio_bp
+from api.audio_fingerprint import audio_fingerprint_bp
 from api.music_upload import music_upload_bp
 from dotenv import load_dotenv
 
@@ -51,6 +52,8 @@ from flask.cli import with_appcontext
 from api.ai_mastering import ai_mastering_bp
 from api.ai_mastering_phase3 import ai_mastering_phase3_bp
 from api.ai_radio_dj import ai_radio_dj_bp
+from api.radio_break_scheduler import init_break_scheduler
+from api.radio_hls import radio_hls_bp
 from api.ai_content_routes import ai_content_bp
 from api.recording_studio_routes import recording_studio_bp
 from api.beat_store_routes import beat_store_bp
@@ -111,7 +114,11 @@ app = Flask(__name__)
 # Initialize scheduler
 scheduler = APScheduler()
 scheduler.init_app(app)
-scheduler.start()
+# Audio worker processes (api.audio_workers) re-import this module
+# as __mp_main__ in dev runs — only the real server schedules jobs.
+if __name__ != '__mp_main__':
+    init_break_scheduler(app, scheduler)
+    scheduler.start()
 
 init_mail(app)
 
@@ -328,6 +335,7 @@ app.register_blueprint(notifications_bp)
 app.register_blueprint(ai_mastering_bp)
 app.register_blueprint(ai_mastering_phase3_bp)
 app.register_blueprint(ai_radio_dj_bp)
+app.register_blueprint(radio_hls_bp)
 app.register_blueprint(ai_content_bp)
 app.register_blueprint(recording_studio_bp)
 app.register_blueprint(ai_mix_assistant_bp)
@@ -584,6 +592,7 @@ app.register_blueprint(academy_bp, url_prefix='/api/academy')
 app.register_blueprint(academy_ai_bp, url_prefix='/api/academy')
 app.register_blueprint(advanced_ai_bp)
 app.register_blueprint(audio_bp)
+app.register_blueprint(audio_fingerprint_bp)
 app.register_blueprint(music_upload_bp)
 # app.register_blueprint(printful_bp)  # duplicate removed
 if __name__ == '__main__':
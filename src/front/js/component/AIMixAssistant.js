@@ -7,7 +7,7 @@
 // Shows per-track suggestions with one-click apply buttons
 // =============================================================================
 
-import React, { useState, useCallback } from 'react';
+import React, { useState, useCallback, useRef } from 'react';
 import '../../styles/AIMixAssistant.css';
 
 const GENRES = [
@@ -242,6 +242,8 @@ const AIMixAssistant = ({
   const [appliedItems, setAppliedItems] = useState(new Set());
   const [useServer, setUseServer] = useState(false);
   const [error, setError] = useState('');
+  // Server remembers per-track analyses per session → re-runs only redo changed tracks
+  const mixSessionId = useRef(null);
 
   const markApplied = (key) => setAppliedItems(prev => new Set([...prev, key]));
 
@@ -260,10 +262,11 @@ const AIMixAssistant = ({
         const res = await fetch(`${bu}/api/ai/mix-assistant/analyze`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${tok}` },
-          body: JSON.stringify({ project_id: projectId, genre }),
+          body: JSON.stringify({ project_id: projectId, genre, session_id: mixSessionId.current }),
         });
         const data = await res.json();
         if (data.success) {
+          mixSessionId.current = data.session_id || mixSessionId.current;
           setResults(data);
         } else {
           throw new Error(data.error || 'Analysis failed');
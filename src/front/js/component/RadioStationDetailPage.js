@@ -1,6 +1,8 @@
 // src/front/js/component/RadioStationDetailPage.js - Enhanced with comprehensive audio error handling
 import React, { useState, useRef, useEffect, useCallback } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
+import Hls from "hls.js";
+import { io } from "socket.io-client";
 import { ErrorHandler, AuthErrorHandler } from '../utils/errorUtils';
 import "../../styles/RadioStationDetail.css";
 
@@ -59,7 +61,9 @@ const RadioStationDetailPage = () => {
 
   // Refs
   const audioRef = useRef(null);
+  const hlsRef = useRef(null);
   const nowPlayingIntervalRef = useRef(null);
+  const socketRef = useRef(null);
   const reconnectTimeoutRef = useRef(null);
 
   // Environment config
@@ -182,6 +186,54 @@ const RadioStationDetailPage = () => {
     return null;
   }, [station]);
 
+  // Shared server-side HLS stream for live playlist stations (all listeners time-aligned)
+  const getHlsUrl = useCallback(() => {
+    if (!station || !backendUrl || !station.is_live) return null;
+    const hasPlaylist = station.playlist_schedule?.tracks?.length > 0;
+    const hasLoop = station.loop_audio_url && station.loop_duration_minutes;
+    if (!hasPlaylist && !hasLoop) return null;
+    return `${backendUrl}/api/radio/${station.id}/hls/live.m3u8`;
+  }, [station, backendUrl]);
+
+  const destroyHls = useCallback(() => {
+    if (hlsRef.current) {
+      hlsRef.current.destroy();
+      hlsRef.current = null;
+    }
+  }, []);
+
+  // Attach the HLS stream when possible, falling back to the direct file URL
+  const attachSource = useCallback((audio) => {
+    const hlsUrl = getHlsUrl();
+    const fallBack = () => {
+      console.warn("⚠️ HLS unavailable, using direct audio URL");
+      destroyHls();
+      audio.src = getAudioUrl();
+      audio.load();
+      audio.play().catch(() => {});
+    };
+
+    if (hlsUrl && Hls.isSupported()) {
+      const hls = new Hls({ liveSyncDurationCount: 3 });
+      hls.on(Hls.Events.ERROR, (event, data) => {
+        if (data.fatal) fallBack();
+      });
+      hls.loadSource(hlsUrl);
+      hls.attachMedia(audio);
+      hlsRef.current = hls;
+      return;
+    }
+
+    if (hlsUrl && audio.canPlayType('application/vnd.apple.mpegurl')) {
+      // Safari plays HLS natively
+      audio.addEventListener('error', () => {
+        if (audio.src === hlsUrl) fallBack();
+      }, { once: true });
+      audio.src = hlsUrl;
+    }
+    audio.load();
+  }, [getHlsUrl, getAudioUrl, destroyHls]);
+
   // Enhanced audio error handling
   const handleAudioError = useCallback((e) => {
     const audio = audioRef.current;
@@ -430,12 +482,36 @@ const RadioStationDetailPage = () => {
     // Initial fetch
     fetchNowPlaying();
 
-    // Set up interval
+    // Fallback poll — the server pushes `now_playing` over the socket at track boundaries
     nowPlayingIntervalRef.current = setInterval(() => {
-      fetchNowPlaying();
+      if (!socketRef.current?.connected) {
+        fetchNowPlaying();
+      }
     }, 30000); // Update every 30 seconds
   }, [fetchNowPlaying]);
 
+  // Subscribe to the station's now-playing room
+  useEffect(() => {
+    if (!backendUrl || !id || type === 'static') return;
+
+    const socket = io(backendUrl, { transports: ["websocket", "polling"] });
+    socketRef.current = socket;
+
+    socket.on("connect", () => {
+      socket.emit("radio_join", { stationId: id });
+    });
+    socket.on("now_playing", (data) => {
+      setNowPlaying(data.now_playing);
+      console.log("📻 Now playing pushed:", data.now_playing);
+    });
+
+    return () => {
+      socket.emit("radio_leave", { stationId: id });
+      socket.disconnect();
+      socketRef.current = null;
+    };
+  }, [backendUrl, id, type]);
+
   // Retry audio connection
   const retryAudioConnection = useCallback(() => {
     if (audioRef.current && station) {
@@ -444,7 +520,11 @@ const RadioStationDetailPage = () => {
       setConnectionStatus('connecting');
 
       // Force reload the audio source
-      audioRef.current.load();
+      if (hlsRef.current) {
+        hlsRef.current.startLoad();
+      } else {
+        audioRef.current.load();
+      }
 
       // Try to play if it was playing before
       if (isPlaying) {
@@ -550,7 +630,7 @@ const RadioStationDetailPage = () => {
       // Check if audio is ready
       if (audioRef.current.readyState < 2) {
         console.log("Audio not ready, loading first...");
-        audioRef.current.load();
+        if (!hlsRef.current) audioRef.current.load();
 
         // Wait for canplay event
         await new Promise((resolve, reject) => {
@@ -626,6 +706,7 @@ const RadioStationDetailPage = () => {
       setAudioLoading(true);
 
       // Clean up existing audio only if we're starting fresh
+      destroyHls();
       if (audioRef.current) {
         audioRef.current.pause();
         audioRef.current.src = '';
@@ -646,7 +727,7 @@ const RadioStationDetailPage = () => {
 
       // Load and play with better error handling
       try {
-        audio.load();
+        attachSource(audio);
 
         // Wait a bit for the audio to be ready
         await new Promise((resolve, reject) => {
@@ -688,7 +769,7 @@ const RadioStationDetailPage = () => {
       setAudioLoading(false);
       setConnectionStatus('error');
     }
-  }, [station, isPlaying, getAudioUrl, setupAudioElement, type]);
+  }, [station, isPlaying, getAudioUrl, setupAudioElement, attachSource, destroyHls, type]);
 
   // Volume control
   const handleVolumeChangeInput = useCallback((e) => {
@@ -730,6 +811,10 @@ const RadioStationDetailPage = () => {
       if (reconnectTimeoutRef.current) {
         clearTimeout(reconnectTimeoutRef.current);
       }
+      if (hlsRef.current) {
+        hlsRef.current.destroy();
+        hlsRef.current = null;
+      }
     };
   }, [backendUrl, fetchStationData, fetchCurrentUser, type]);
 
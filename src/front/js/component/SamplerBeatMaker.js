@@ -9,6 +9,7 @@
 import React, { useState, useEffect, useRef, useCallback, useMemo } from 'react';
 import '../../styles/SamplerBeatMaker.css';
 import '../../styles/BeatMakerTab.css';
+import { waitForStemJob } from '../utils/stemJobs';
 import BeatMakerTab from './tabs/BeatMakerTab';
 import DrumPadTab from './tabs/DrumPadTab';
 import SamplerTab from './tabs/SamplerTab';
@@ -3707,7 +3708,9 @@ const SamplerBeatMaker = ({
                     });
 
                     if (!res.ok) { const err = await res.json().catch(() => ({})); throw new Error(err.error || `Server error ${res.status}`); }
-                    const data = await res.json();
+                    const data = await waitForStemJob(STEM_BACKEND, token, await res.json(), (job) => {
+                      setStemProgress(`Separating... ${job.progress_pct || 0}%`);
+                    });
 
                     if (data.stems) {
                       setStemResults(data.stems);
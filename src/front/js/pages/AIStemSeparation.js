@@ -17,6 +17,7 @@
 
 import React, { useState, useEffect, useRef, useCallback } from "react";
 import "../../styles/AIStemSeparation.css";
+import { waitForStemJob, waitForStemVariant } from "../utils/stemJobs";
 
 const BACKEND_URL =
   process.env.REACT_APP_BACKEND_URL ||
@@ -246,13 +247,22 @@ const AIStemSeparation = () => {
         body: fd,
       });
 
-      const data = await res.json();
-      stopProgress();
+      const queued = await res.json();
 
       if (!res.ok) {
-        throw new Error(data.error || "Separation failed");
+        throw new Error(queued.error || "Separation failed");
       }
 
+      // Queued job: switch from simulated to real progress
+      const data = await waitForStemJob(BACKEND_URL, token, queued, (job) => {
+        if (progressInterval.current) {
+          clearInterval(progressInterval.current);
+          progressInterval.current = null;
+        }
+        setProgress(job.progress_pct || 0);
+      });
+      stopProgress();
+
       setResult(data);
       setSuccess(data.message || "Stems separated successfully!");
       setStatusMessage("");
@@ -348,10 +358,20 @@ const AIStemSeparation = () => {
   // DOWNLOAD
   // =====================================================
 
-  const handleDownloadStem = (stemName, url) => {
+  const handleDownloadStem = async (stemName, url) => {
+    // Stems are stored as lossless masters; ask for an mp3 copy (built on first request)
+    const jobId = result?.job_id || result?.id;
+    if (jobId) {
+      try {
+        url = await waitForStemVariant(BACKEND_URL, token, jobId, stemName, "mp3");
+      } catch (e) {
+        console.warn("mp3 variant unavailable, downloading master:", e);
+      }
+    }
+    const ext = (url.split("?")[0].match(/\.([a-z0-9]+)$/i) || [])[1] || "mp3";
     const a = document.createElement("a");
     a.href = url;
-    a.download = `${result?.title || "track"}_${stemName}.mp3`;
+    a.download = `${result?.title || "track"}_${stemName}.${ext}`;
     a.target = "_blank";
     document.body.appendChild(a);
     a.click();
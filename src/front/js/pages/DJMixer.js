@@ -3,6 +3,7 @@ import { Context } from "../store/appContext";
 import "../../styles/DJMixer.css";
 import MidiHardwareInput from "../component/MidiHardwareInput";
 import DVSTimecode from "../component/DVSTimecode";
+import { waitForStemJob } from "../utils/stemJobs";
 
 const BACKEND = process.env.REACT_APP_BACKEND_URL || "";
 
@@ -802,8 +803,9 @@ export default function DJMixer(){
       const form=new FormData(); form.append("audio",blob,"deck_"+id+".wav"); form.append("model","htdemucs");
       const res=await fetch(`${BACKEND}/api/ai/stems/separate-upload`,{method:"POST",headers:{Authorization:`Bearer ${token}`},body:form});
       if(!res.ok) throw new Error("Stem separation failed — "+res.status);
-      const data=await res.json();
-      const stemUrls={drums:data.drums_url,bass:data.bass_url,vocals:data.vocals_url,other:data.other_url};
+      const data=await waitForStemJob(BACKEND,token,await res.json());
+      const js=data.stems||{};
+      const stemUrls={drums:js.drums?.url,bass:js.bass?.url,vocals:js.vocals?.url,other:js.other?.url};
       const stems={};
       const out=id==="A"?xgA.current:xgB.current;
       for(const [name,url] of Object.entries(stemUrls)){
@@ -0,0 +1,44 @@
+// src/front/js/utils/stemJobs.js
+// Stem separation runs as a background job: the POST returns 202 + job_id,
+// this polls /api/ai/stems/job/<id>/progress until the stems are ready.
+// Delivery formats (mp3, ogg, wav) are built on first request the same way.
+
+const POLL_INTERVAL_MS = 2000;
+
+export const waitForStemJob = async (backendUrl, token, queued, onProgress) => {
+  // Finished responses (cache hits, older synchronous API) already carry the stems;
+  // a coalesced job comes back queued with an empty stems object
+  const finished = queued?.status === "done" || queued?.status === "completed";
+  const hasStems = queued?.stems && Object.keys(queued.stems).length > 0;
+  if (!queued?.job_id || finished || (hasStems && !queued.status)) return queued;
+
+  const url = `${backendUrl}${queued.status_url || `/api/ai/stems/job/${queued.job_id}/progress`}`;
+  const headers = token ? { Authorization: `Bearer ${token}` } : {};
+
+  while (true) {
+    const res = await fetch(url, { headers });
+    const job = await res.json().catch(() => ({}));
+    if (!res.ok) throw new Error(job.error || `Server error ${res.status}`);
+
+    if (onProgress) onProgress(job);
+    if (job.status === "done" || job.status === "completed") return job;
+    if (job.status === "error") throw new Error(job.error_message || "Stem separation failed");
+
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+};
+
+export const waitForStemVariant = async (backendUrl, token, jobId, stemName, format = "mp3") => {
+  const url = `${backendUrl}/api/ai/stems/job/${jobId}/stems/${stemName}?format=${format}`;
+  const headers = token ? { Authorization: `Bearer ${token}` } : {};
+
+  while (true) {
+    const res = await fetch(url, { headers });
+    const data = await res.json().catch(() => ({}));
+    if (res.status !== 202) {
+      if (!res.ok || !data.url) throw new Error(data.error || `Server error ${res.status}`);
+      return data.url;
+    }
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+};